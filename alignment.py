@@ -0,0 +1,198 @@
+import re
+import struct
+import bisect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from seek_index import media_duration
+
+ALIGNMENT_SUFFIX = ".align"
+ALIGNMENT_MAGIC = b"TTSALGN1"
+ALIGNMENT_ENTRY = struct.Struct("<II")  # character offset, milliseconds
+
+# A sentence starts after terminal punctuation followed by whitespace
+SENTENCE_BREAK = re.compile(r"[.!?;]+[\"')\]]*\s+")
+
+
+def chunk_offsets(text, chunks):
+    """
+    Locates every chunk produced by split_text() in the text it came from.
+
+    Args:
+        text (str): The text as shown to the user.
+        chunks (list of str): Chunks in order, each a slice of `text`.
+
+    Returns:
+        list of int: The character offset of every chunk in `text`.
+    """
+    offsets = []
+    position = 0
+    for chunk in chunks:
+        found = text.find(chunk, position)
+        if found == -1:
+            found = position
+        offsets.append(found)
+        position = found + len(chunk)
+    return offsets
+
+
+def sentence_starts(chunk):
+    """Returns the offsets within a chunk at which a new sentence begins."""
+    return [0] + [
+        match.end()
+        for match in SENTENCE_BREAK.finditer(chunk)
+        if match.end() < len(chunk)
+    ]
+
+
+def build_alignment(
+    chunks, offsets, durations, trims=None, crossfade=0.0, to_source=None, pauses=None
+):
+    """
+    Maps the start of every sentence to its timestamp in the rendered audio.
+
+    Chunk start times come from the measured chunk durations; sentence times
+    inside a chunk are estimated in proportion to their character position.
+
+    Args:
+        chunks (list of str): Chunks in playback order.
+        offsets (list of int): Character offset of every chunk in the text.
+        durations (list of float): Duration of every chunk file in seconds.
+        trims (list of tuple, optional): (inpoint, outpoint) applied at the joins.
+        crossfade (float, optional): Crossfade applied at every seam, in seconds.
+        to_source (callable, optional): Maps offsets in the rendered text back to
+            the text shown to the user, when the render was normalized.
+        pauses (list of float, optional): Silence appended to every chunk file,
+            in seconds; sentences are spread over the speech before it.
+
+    Returns:
+        list of tuple: (character offset, time in seconds), sorted by both.
+    """
+    trims = trims or [(None, None)] * len(chunks)
+    pauses = pauses or [0.0] * len(chunks)
+    entries = []
+    start_time = 0.0
+    for chunk, offset, duration, (inpoint, outpoint), pause in zip(
+        chunks, offsets, durations, trims, pauses
+    ):
+        inpoint = inpoint or 0.0
+        end = outpoint if outpoint is not None else duration
+        length = max(end - inpoint, 0.0)
+        speech = max(length - pause, 0.0)
+        for relative in sentence_starts(chunk):
+            time = start_time + speech * relative / max(len(chunk), 1)
+            position = offset + relative
+            if to_source:
+                position = to_source(position)
+            if not entries or (time > entries[-1][1] and position > entries[-1][0]):
+                entries.append((position, time))
+        start_time += max(length - crossfade, 0.0)
+    return entries
+
+
+def write_alignment(path, entries):
+    """
+    Writes the alignment index next to a rendered output.
+
+    Args:
+        path (str): Path to the audio file.
+        entries (list of tuple): (character offset, time in seconds).
+
+    Returns:
+        str: Path of the index file.
+    """
+    index_path = path + ALIGNMENT_SUFFIX
+    with open(index_path, "wb") as file:
+        file.write(ALIGNMENT_MAGIC)
+        file.write(struct.pack("<I", len(entries)))
+        for offset, time in entries:
+            file.write(ALIGNMENT_ENTRY.pack(offset, int(round(time * 1000))))
+    logging.info(f"Wrote alignment index with {len(entries)} entries to {index_path}")
+    return index_path
+
+
+class AlignmentIndex:
+    """Character offset <-> audio timestamp index with bisect lookups."""
+
+    def __init__(self, offsets, times_ms):
+        self.offsets = offsets
+        self.times_ms = times_ms
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the alignment index of a rendered output.
+
+        Args:
+            path (str): Path to the audio file (not the index).
+
+        Returns:
+            AlignmentIndex: The index, or None if there is no valid index.
+        """
+        try:
+            with open(path + ALIGNMENT_SUFFIX, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if data[:8] != ALIGNMENT_MAGIC:
+            return None
+        (count,) = struct.unpack_from("<I", data, 8)
+        offsets, times_ms = [], []
+        for offset, time_ms in ALIGNMENT_ENTRY.iter_unpack(
+            data[12 : 12 + count * ALIGNMENT_ENTRY.size]
+        ):
+            offsets.append(offset)
+            times_ms.append(time_ms)
+        if not offsets:
+            return None
+        return cls(offsets, times_ms)
+
+    def time_for_offset(self, offset):
+        """Returns the start time, in seconds, of the sentence containing `offset`."""
+        position = max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+        return self.times_ms[position] / 1000
+
+    def offset_for_time(self, seconds):
+        """Returns the character offset of the sentence playing at `seconds`."""
+        position = max(bisect.bisect_right(self.times_ms, int(seconds * 1000)) - 1, 0)
+        return self.offsets[position]
+
+
+def align_render(
+    path,
+    chunks,
+    offsets,
+    chunk_files,
+    trims=None,
+    crossfade=0.0,
+    to_source=None,
+    pauses=None,
+):
+    """
+    Builds and writes the alignment index of a render from its chunk files.
+
+    Must be called while the chunk files still exist, before concatenation
+    moves or cleanup deletes them.
+
+    Args:
+        path (str): Path to the rendered output.
+        chunks (list of str): Chunks in playback order.
+        offsets (list of int): Character offset of every chunk in the text.
+        chunk_files (list of str): The audio file of every chunk.
+        trims (list of tuple, optional): (inpoint, outpoint) applied at the joins.
+        crossfade (float, optional): Crossfade applied at every seam, in seconds.
+        to_source (callable, optional): Maps rendered-text offsets to the source.
+        pauses (list of float, optional): Silence appended to every chunk file.
+
+    Returns:
+        str: Path of the index file, or None if a duration is unknown.
+    """
+    with ThreadPoolExecutor(thread_name_prefix="align") as executor:
+        durations = list(executor.map(media_duration, chunk_files))
+    if any(duration is None for duration in durations):
+        logging.error("Cannot align render: unknown chunk duration")
+        return None
+    entries = build_alignment(
+        chunks, offsets, durations, trims, crossfade, to_source, pauses
+    )
+    return write_alignment(path, entries)
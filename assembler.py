@@ -0,0 +1,193 @@
+import os
+import logging
+import threading
+
+from containers import parse_wav, wav_header
+
+# Formats whose chunks are raw samples that can be placed without decoding
+ASSEMBLY_FORMATS = ("wav", "pcm")
+# Bytes read to find the sample data of a WAV chunk
+WAV_HEADER_PROBE = 4096
+COPY_BLOCK = 1024 * 1024
+HEADER_SIZE = 44
+
+
+def _copy_range(source_fd, destination_fd, count, source_offset, destination_offset):
+    """
+    Copies `count` bytes between two files at explicit offsets, in the kernel
+    where the platform supports it and with pread/pwrite blocks otherwise.
+    Neither file position is used, so copies into one file can run in parallel.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while count > 0:
+                copied = os.copy_file_range(
+                    source_fd, destination_fd, count, source_offset, destination_offset
+                )
+                if copied == 0:
+                    break
+                count -= copied
+                source_offset += copied
+                destination_offset += copied
+            if count == 0:
+                return
+        except OSError:
+            # e.g. across file systems on older kernels; finish in user space
+            pass
+    while count > 0:
+        block = os.pread(source_fd, min(COPY_BLOCK, count), source_offset)
+        if not block:
+            raise OSError(f"Chunk ended {count} bytes early")
+        written = os.pwrite(destination_fd, block, destination_offset)
+        count -= written
+        source_offset += written
+        destination_offset += written
+
+
+class PcmAssembler:
+    """
+    Assembles a WAV or raw PCM output by writing every chunk's samples straight
+    to its final position, without ffmpeg.
+
+    A chunk's position is the sum of the sizes of the chunks before it, so it
+    is placed as soon as it and all earlier chunks have been downloaded; the
+    chunks after it are placed right away when their prefix becomes known.
+    Placement copies the samples with positional writes, so chunks handed over
+    by different worker threads are written concurrently. The file is
+    preallocated from an estimate, and the WAV header is written once at the
+    end, when the data size is known.
+    """
+
+    def __init__(self, path, response_format, chunk_count, expected_size=None):
+        """
+        Args:
+            path (str): Final output file.
+            response_format (str): One of ASSEMBLY_FORMATS.
+            chunk_count (int): Number of chunks in the render.
+            expected_size (int, optional): Estimated output size in bytes, used
+                to preallocate the file.
+        """
+        if response_format not in ASSEMBLY_FORMATS:
+            raise ValueError(f"{response_format} output cannot be assembled")
+        self.path = path
+        self.response_format = response_format
+        self.chunk_count = chunk_count
+        self.lock = threading.Lock()
+        self.sources = {}  # index -> (chunk path, sample offset, sample bytes)
+        self.offsets = [None] * chunk_count
+        self.placed = 0  # chunks whose offset is known, in order
+        self.writing = set()
+        self.idle = threading.Condition(self.lock)
+        self.failed = False
+        self.wav_fmt = None
+        self.header_size = HEADER_SIZE if response_format == "wav" else 0
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        if expected_size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.fd, 0, self.header_size + expected_size)
+            except OSError as e:
+                logging.debug(f"Could not preallocate {path}: {e}")
+
+    def _probe(self, chunk_path):
+        """Returns (sample offset, sample bytes) of a chunk, or None if invalid."""
+        size = os.path.getsize(chunk_path)
+        if self.response_format == "pcm":
+            return 0, size - size % 2
+        with open(chunk_path, "rb") as file:
+            fmt, offset = parse_wav(file.read(WAV_HEADER_PROBE))
+        if offset is None or fmt is None:
+            return None
+        with self.lock:
+            if self.wav_fmt is None:
+                self.wav_fmt = fmt
+            elif fmt[:16] != self.wav_fmt[:16]:
+                logging.error(f"Chunk {chunk_path} has a different sample format")
+                return None
+        block_align = max(int.from_bytes(fmt[12:14], "little"), 1)
+        # Streamed WAV headers carry no usable size; the samples run to the end
+        data_size = size - offset
+        return offset, data_size - data_size % block_align
+
+    def add(self, index, chunk_path):
+        """
+        Hands over a downloaded chunk and places every chunk that can be placed.
+        Handing over the same chunk again has no effect.
+
+        Args:
+            index (int): Position of the chunk in playback order.
+            chunk_path (str): Path to the chunk file.
+        """
+        with self.lock:
+            if index in self.sources or self.failed:
+                return
+            self.sources[index] = None
+        probe = self._probe(chunk_path)
+        with self.lock:
+            if probe is None:
+                logging.error(f"Chunk {chunk_path} cannot be assembled")
+                self.failed = True
+                self.idle.notify_all()
+                return
+            self.sources[index] = (chunk_path, *probe)
+            ready = []
+            while (
+                self.placed < self.chunk_count
+                and self.sources.get(self.placed) is not None
+            ):
+                i = self.placed
+                offset = self.header_size
+                if i:
+                    previous_offset, previous_size = self.offsets[i - 1]
+                    offset = previous_offset + previous_size
+                self.offsets[i] = (offset, self.sources[i][2])
+                ready.append(i)
+                self.placed += 1
+            self.writing.update(ready)
+        for i in ready:
+            self._write(i)
+
+    def _write(self, index):
+        chunk_path, source_offset, size = self.sources[index]
+        offset = self.offsets[index][0]
+        try:
+            source_fd = os.open(chunk_path, os.O_RDONLY)
+            try:
+                _copy_range(source_fd, self.fd, size, source_offset, offset)
+            finally:
+                os.close(source_fd)
+            logging.debug(f"Placed chunk {index} ({size} bytes) at {offset}")
+        except OSError as e:
+            logging.error(f"Failed to place chunk {index} in {self.path}: {e}")
+            self.failed = True
+        finally:
+            with self.lock:
+                self.writing.discard(index)
+                self.idle.notify_all()
+
+    def close(self):
+        """
+        Waits for the running copies, writes the header and trims the file.
+
+        Returns:
+            bool: True if every chunk was placed.
+        """
+        with self.lock:
+            while self.writing:
+                self.idle.wait()
+            complete = not self.failed and self.placed == self.chunk_count
+        data_size = 0
+        if self.placed:
+            last_offset, last_size = self.offsets[self.placed - 1]
+            data_size = last_offset + last_size - self.header_size
+        try:
+            os.ftruncate(self.fd, self.header_size + data_size)
+            if self.header_size and self.wav_fmt is not None:
+                os.pwrite(self.fd, wav_header(self.wav_fmt, data_size), 0)
+        finally:
+            os.close(self.fd)
+        if not complete:
+            logging.error(
+                f"Assembly of {self.path} stopped after {self.placed} of "
+                f"{self.chunk_count} chunks"
+            )
+        return complete
@@ -3,6 +3,8 @@ from pydub.playback import play
 from PyQt6.QtCore import pyqtSignal, QObject
 from threading import Thread, Event as ThreadEvent
 
+from streaming import PcmSink
+
 class AudioPlayer(QObject):
     """
     Audio player with playback controls and state management.
@@ -59,6 +61,38 @@ class AudioPlayer(QObject):
                 self.playback_finished.emit()
                 self.state_changed.emit(False)
 
+    def play_stream(self, pcm_blocks):
+        """Play PCM blocks while they are still being downloaded and decoded"""
+        sink = None
+        try:
+            self.audio = pcm_blocks
+            self.pause_event.clear()
+            self.abort_event.clear()
+            self.playing = True
+            self.playback_started.emit()
+            self.state_changed.emit(True)
+
+            sink = PcmSink()
+            for block in pcm_blocks:
+                # While paused, stop feeding the player and let it run dry
+                while self.pause_event.is_set() and not self.abort_event.is_set():
+                    time.sleep(0.05)
+                if self.abort_event.is_set() or not sink.write(block):
+                    break
+            sink.close(abort=self.abort_event.is_set())
+        except Exception as e:
+            self.playback_error.emit(str(e))
+            if sink:
+                sink.close(abort=True)
+        finally:
+            # Stops the download and the decoder if playback ended early
+            if hasattr(pcm_blocks, "close"):
+                pcm_blocks.close()
+            self.playing = False
+            if not self.abort_event.is_set():
+                self.playback_finished.emit()
+                self.state_changed.emit(False)
+
     def pause(self):
         """Pause audio playback"""
         if self.playing:
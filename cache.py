@@ -0,0 +1,139 @@
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+# Default location of the on-disk synthesis cache
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "openai_tts_cache")
+# Least recently used entries are evicted beyond this size
+MAX_CACHE_BYTES = 1024**3
+
+
+def cache_key(text, model, voice, speed, response_format):
+    """
+    Builds the cache key of a synthesis request.
+
+    Args:
+        text (str): Text of the chunk.
+        model (str): TTS model name.
+        voice (str): Voice ID.
+        speed (float): Speech speed multiplier.
+        response_format (str): Audio format.
+
+    Returns:
+        str: A hex digest identifying the request.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{digest}-{model}-{voice}-{float(speed):g}-{response_format}"
+
+
+class SingleFlight:
+    """
+    Table of the synthesis requests in flight, keyed like the cache.
+
+    The first caller of a key leads and makes the request; callers of the same
+    key arriving meanwhile wait for it to land and then read its result from
+    the cache, so identical chunks requested at the same time by different
+    jobs cost one upstream call.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}  # key -> Event set when the leader lands
+
+    def lead(self, key):
+        """
+        Returns:
+            threading.Event: None if the caller leads and must call land(key),
+            otherwise an event that is set when the leading request lands.
+        """
+        with self.lock:
+            landed = self.flights.get(key)
+            if landed is None:
+                self.flights[key] = threading.Event()
+            return landed
+
+    def land(self, key):
+        """Ends the flight of `key`, successful or not, and wakes its followers."""
+        with self.lock:
+            landed = self.flights.pop(key)
+        landed.set()
+
+
+class SynthesisCache:
+    """
+    Content-addressed on-disk cache of synthesized chunks.
+
+    Identical requests (same text, model, voice, speed and format) are served
+    from disk instead of being billed and downloaded again. The cache is shared
+    by every job in the process and trimmed to `max_bytes` by last access.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, destination):
+        """
+        Copies a cached entry to `destination`.
+
+        Returns:
+            bool: True on a cache hit.
+        """
+        path = self.path_for(key)
+        try:
+            shutil.copyfile(path, destination)
+            os.utime(path)  # mark as recently used
+            logging.debug(f"Synthesis cache hit for {key[:16]}")
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logging.error(f"Failed to read cache entry {key[:16]}: {e}")
+            return False
+
+    def put(self, key, source):
+        """Stores a copy of a freshly synthesized chunk."""
+        path = self.path_for(key)
+        partial = f"{path}.{threading.get_ident()}.part"
+        try:
+            shutil.copyfile(source, partial)
+            os.replace(partial, path)
+        except OSError as e:
+            logging.error(f"Failed to store cache entry {key[:16]}: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return
+        self.evict()
+
+    def discard(self, key):
+        """Removes an entry, if present."""
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Deletes the least recently used entries beyond the size limit."""
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,71 @@
+import logging
+import threading
+
+
+class CancelledError(Exception):
+    """Raised inside a job once its cancellation token has been triggered."""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation token shared by a job and everything it starts.
+
+    Long-running code checks the token between steps, and blocking resources
+    (HTTP responses, ffmpeg processes) register a callback that aborts them, so
+    a cancel takes effect within a bounded time even mid-transfer.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.next_handle = 0
+
+    def cancel(self):
+        """Triggers the token and aborts every registered resource."""
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks = list(self.callbacks.values())
+            self.callbacks.clear()
+        logging.info("Cancellation requested")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.debug(f"Error while aborting a resource: {e}")
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        """Sleeps up to `timeout` seconds; returns True early if cancelled."""
+        return self.event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        """Raises CancelledError if the token has been triggered."""
+        if self.event.is_set():
+            raise CancelledError()
+
+    def register(self, callback):
+        """
+        Registers a callback that aborts a resource on cancel. If the token is
+        already triggered, the callback runs immediately.
+
+        Returns:
+            int: A handle for unregister().
+        """
+        with self.lock:
+            if not self.event.is_set():
+                handle = self.next_handle
+                self.next_handle += 1
+                self.callbacks[handle] = callback
+                return handle
+        callback()
+        return None
+
+    def unregister(self, handle):
+        """Forgets a callback once its resource has been released."""
+        with self.lock:
+            self.callbacks.pop(handle, None)
@@ -0,0 +1,124 @@
+import zlib
+import struct
+
+# MPEG audio layer III bitrates in kbit/s, indexed by the header bitrate field
+MP3_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+MP3_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+def parse_mp3_header(header):
+    """
+    Parses a 4-byte MPEG audio layer III frame header.
+
+    Args:
+        header (bytes): The first four bytes of a frame.
+
+    Returns:
+        dict: Frame properties (version, sample_rate, bitrate, channels,
+        frame_size, samples), or None if the bytes are not a valid header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits != 1:
+        return None
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    divisor = {3: 1, 2: 2, 0: 4}[version_bits]
+    sample_rate = MP3_SAMPLE_RATES[rate_index] // divisor
+    bitrate = (MP3_BITRATES_V1 if mpeg1 else MP3_BITRATES_V2)[bitrate_index] * 1000
+    padding = (header[2] >> 1) & 0x01
+    coefficient = 144 if mpeg1 else 72
+    return {
+        "version": version_bits,
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+        "channels": 1 if (header[3] >> 6) == 3 else 2,
+        "frame_size": coefficient * bitrate // sample_rate + padding,
+        "samples": 1152 if mpeg1 else 576,
+    }
+
+
+def id3v2_size(data):
+    """Returns the total size of a leading ID3v2 tag, or 0 if there is none."""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def strip_id3(data):
+    """Removes a leading ID3v2 tag and a trailing ID3v1 tag from MP3/AAC bytes."""
+    data = data[id3v2_size(data) :]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def is_mp3_info_frame(frame):
+    """Tells whether an MP3 frame is a Xing/Info/VBRI header rather than audio."""
+    return b"Xing" in frame[:64] or b"Info" in frame[:64] or b"VBRI" in frame[:64]
+
+
+# Every byte value with its bits in reverse order
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def ogg_crc(data):
+    """
+    Computes the CRC32 variant used by Ogg pages: polynomial 0x04C11DB7, not
+    reflected, no initial or final XOR.
+
+    zlib computes the reflected CRC32 of the same polynomial in C, so the bits
+    of every input byte are mirrored going in and those of the result coming
+    out, instead of running a per-byte loop in Python.
+    """
+    crc = zlib.crc32(data.translate(_REVERSED_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{crc:032b}"[::-1], 2)
+
+
+def parse_wav(data):
+    """
+    Locates the format and sample data of a WAV file.
+
+    Args:
+        data (bytes): At least the header of the file.
+
+    Returns:
+        tuple: (fmt chunk payload, offset of the sample data), or (None, None).
+    """
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None, None
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos : pos + 4]
+        size = struct.unpack("<I", data[pos + 4 : pos + 8])[0]
+        if chunk_id == b"fmt ":
+            fmt = data[pos + 8 : pos + 8 + size]
+        elif chunk_id == b"data":
+            return fmt, pos + 8
+        pos += 8 + size + (size & 1)
+    return fmt, None
+
+
+def wav_header(fmt, data_size):
+    """Builds a canonical 44-byte WAV header from a PCM fmt chunk payload."""
+    return (
+        b"RIFF"
+        + struct.pack("<I", 36 + data_size)
+        + b"WAVEfmt "
+        + struct.pack("<I", 16)
+        + fmt[:16]
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
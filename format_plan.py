@@ -0,0 +1,139 @@
+import logging
+
+from progress import EST_BYTES_PER_CHAR
+from assembler import ASSEMBLY_FORMATS
+from transcode import TRANSCODE_FORMATS
+
+# Formats the API can return, and those that lose nothing
+UPSTREAM_FORMATS = ("mp3", "opus", "aac", "flac", "wav", "pcm")
+LOSSLESS_FORMATS = ("flac", "wav", "pcm")
+# Assumed download rate in bytes per second; TTS_BANDWIDTH overrides it
+BANDWIDTH = 4 * 1024 * 1024
+# Speech rate the byte estimates are based on, in characters per second
+SPEECH_CHARS_PER_SECOND = 15
+# Single-threaded ffmpeg CPU seconds per second of audio
+DECODE_COST = {
+    "mp3": 0.004,
+    "opus": 0.006,
+    "aac": 0.005,
+    "flac": 0.002,
+    "wav": 0.0005,
+    "pcm": 0.0005,
+}
+ENCODE_COST = {
+    "mp3": 0.025,
+    "opus": 0.02,
+    "aac": 0.03,
+    "flac": 0.008,
+    "wav": 0.0005,
+    "pcm": 0.0005,
+}
+# Starting one ffmpeg process per chunk and format, in seconds
+TRANSCODE_OVERHEAD = 0.03
+CHUNK_CHARS = 4096
+
+
+class FormatPlan:
+    """
+    The upstream format of a render and its estimated cost: the bytes to
+    download and the CPU seconds spent encoding the deliverables that are not
+    in that format. Every deliverable is joined with a stream copy, since the
+    others are encoded chunk by chunk before the join.
+    """
+
+    def __init__(self, upstream, deliverables, transfer_bytes, cpu_seconds, cost):
+        self.upstream = upstream
+        self.deliverables = deliverables
+        self.transfer_bytes = transfer_bytes
+        self.cpu_seconds = cpu_seconds
+        self.cost = cost
+
+    @property
+    def transcoded(self):
+        return [fmt for fmt in self.deliverables if fmt != self.upstream]
+
+
+def estimate_plan(upstream, deliverables, chars, bandwidth=BANDWIDTH):
+    """
+    Estimates the cost of requesting `upstream` for a render.
+
+    Args:
+        upstream (str): Format requested from the API.
+        deliverables (list of str): Formats written, the primary output first.
+        chars (int): Characters to synthesize.
+        bandwidth (float, optional): Download rate in bytes per second.
+
+    Returns:
+        FormatPlan: The plan; its cost is in seconds of transfer plus CPU.
+    """
+    audio_seconds = chars / SPEECH_CHARS_PER_SECOND
+    chunks = max(-(-chars // CHUNK_CHARS), 1)
+    transfer_bytes = chars * EST_BYTES_PER_CHAR[upstream]
+    cpu_seconds = sum(
+        audio_seconds * (DECODE_COST[upstream] + ENCODE_COST[fmt])
+        + chunks * TRANSCODE_OVERHEAD
+        for fmt in deliverables
+        if fmt != upstream
+    )
+    cost = transfer_bytes / bandwidth + cpu_seconds
+    return FormatPlan(upstream, deliverables, transfer_bytes, cpu_seconds, cost)
+
+
+def _allowed(upstream, deliverables):
+    """
+    Only plans that cost no quality and that ffmpeg can carry out are
+    candidates: the primary output is never re-encoded from a lossy format
+    other than its own, and raw PCM, which has no container, is neither
+    encoded from nor into. Extra outputs may still be encoded from the primary
+    format, as they always were.
+    """
+    if upstream == deliverables[0]:
+        return all(fmt in TRANSCODE_FORMATS for fmt in deliverables[1:])
+    return upstream in LOSSLESS_FORMATS and all(
+        fmt in TRANSCODE_FORMATS for fmt in (upstream, *deliverables)
+    )
+
+
+def plan_formats(deliverables, chars, fixed=False, bandwidth=BANDWIDTH):
+    """
+    Picks the upstream format that delivers the outputs at the lowest cost and
+    logs the choice with its savings over requesting the primary format.
+
+    Args:
+        deliverables (list of str): Formats to write, the primary output first.
+        chars (int): Characters to synthesize.
+        fixed (bool, optional): Whether the chunks must be in the primary
+            format, e.g. for progressive output, which appends them as they are.
+            WAV and PCM outputs are always requested as they are, since their
+            chunks are assembled in place without decoding or ffmpeg.
+        bandwidth (float, optional): Download rate in bytes per second.
+
+    Returns:
+        FormatPlan: The cheapest plan.
+    """
+    deliverables = list(dict.fromkeys(deliverables))
+    primary = deliverables[0]
+    fixed = fixed or primary in ASSEMBLY_FORMATS
+    baseline = estimate_plan(primary, deliverables, chars, bandwidth)
+    best = baseline
+    for upstream in () if fixed else UPSTREAM_FORMATS:
+        if upstream != primary and _allowed(upstream, deliverables):
+            plan = estimate_plan(upstream, deliverables, chars, bandwidth)
+            if plan.cost < best.cost:
+                best = plan
+    if best.upstream == primary:
+        logging.info(
+            f"Format plan: requesting {primary} for {', '.join(deliverables)} "
+            f"(~{best.transfer_bytes / 2**20:.1f} MiB, "
+            f"~{best.cpu_seconds:.1f} s of encoding)"
+        )
+    else:
+        logging.info(
+            f"Format plan: requesting {best.upstream} and encoding "
+            f"{', '.join(best.transcoded)} per chunk "
+            f"(~{best.transfer_bytes / 2**20:.1f} MiB, "
+            f"~{best.cpu_seconds:.1f} s of encoding); saves an estimated "
+            f"{(baseline.transfer_bytes - best.transfer_bytes) / 2**20:.1f} MiB "
+            f"and {baseline.cost - best.cost:.1f} s over requesting {primary}"
+        )
+    return best
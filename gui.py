@@ -1,3 +1,4 @@
+import os
 from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -13,30 +14,74 @@ from PyQt6.QtWidgets import (
     QMenuBar,
     QMenu,
     QInputDialog,
+    QDialog,
+    QDialogButtonBox,
+    QListWidget,
+    QListWidgetItem,
+    QCheckBox,
 )
-from PyQt6.QtCore import pyqtSignal, pyqtSlot
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QAction
-from threading import Thread
-
-from tts import create_tts, stream_tts
-from utils import split_text, estimate_price, read_api_key, write_api_key
+from threading import Thread, Event
+
+from tts import (
+    create_tts,
+    stream_tts,
+    key_pool,
+    make_progress_callback,
+    prewarm_connection,
+    render_scheduler,
+)
+from matrix import make_variant, render_matrix
+from ingest import render_document, iter_sections, section_text, INGEST_EXTENSIONS
+from cancel import CancelToken
+from profiling import JobProfiler
+from transcode import TRANSCODE_FORMATS
+from streaming import STREAM_FORMAT
+from utils import (
+    split_text,
+    estimate_price,
+    read_api_key,
+    write_api_key,
+    play_audio,
+)
+from alignment import AlignmentIndex
+from normalize import (
+    normalize_text,
+    preview_diff,
+    read_boilerplate_patterns,
+    compile_boilerplate,
+)
+from pauses import plan_pauses, MARKER_PAUSE, PARAGRAPH_PAUSE, MAX_PAUSE
 from audio_player import AudioPlayer
 
+# Typing pause after which the counts are refreshed, in milliseconds
+COUNT_DELAY_MS = 300
+
 
 class TTSWindow(QWidget):
     """TTSWindow is a QWidget-based class that provides a GUI for a Text-to-Speech application using OpenAI's API."""
 
     progress_updated = pyqtSignal(int)
+    eta_updated = pyqtSignal(str)
     show_message_signal = pyqtSignal(str)  # New signal for messages
+    batch_started = pyqtSignal(object)
+    batch_finished = pyqtSignal()
+    document_counted = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
         self.api_key = read_api_key()
         self.player = None
         self.playback_control = None
+        self.cursor_playback_stop = None
+        self.batch_cancel_token = None
+        self.boilerplate = compile_boilerplate(read_boilerplate_patterns())
         self.initUI()
         self.check_api_key()
         self.set_dark_theme()
+        if self.prewarm_action.isChecked():
+            self.prewarm()
 
         # Connect message signal to slot
         self.show_message_signal.connect(self.show_message_slot)
@@ -74,22 +119,28 @@ class TTSWindow(QWidget):
         self.speed_input.setText("1.0")
 
         self.format_combo = QComboBox(self)
-        self.format_combo.addItems(["mp3", "opus", "aac", "flac"])
+        self.format_combo.addItems(["mp3", "opus", "aac", "flac", "wav"])
 
         self.path_entry = QLineEdit(self)
         self.select_path_button = QPushButton("Select Path", self)
 
         self.progress_bar = QProgressBar(self)
+        self.eta_label = QLabel("ETA: --", self)
 
         # Action buttons
         self.create_button = QPushButton("Create TTS", self)
+        self.matrix_button = QPushButton("Render Matrix", self)
+        self.document_button = QPushButton("Render Document", self)
         self.stream_button = QPushButton("Stream and Play", self)
         self.play_pause_button = QPushButton("Play", self)
         self.abort_button = QPushButton("Abort", self)
+        self.play_cursor_button = QPushButton("Play from Cursor", self)
+        self.cancel_render_button = QPushButton("Cancel", self)
 
         # Initially hide playback controls
         self.play_pause_button.hide()
         self.abort_button.hide()
+        self.cancel_render_button.hide()
 
         # Layout arrangement
         self.layout.addWidget(QLabel("Text for TTS:"))
@@ -118,13 +169,20 @@ class TTSWindow(QWidget):
         path_layout.addWidget(self.select_path_button)
         self.layout.addLayout(path_layout)
 
-        self.layout.addWidget(self.progress_bar)
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.eta_label)
+        progress_layout.addWidget(self.cancel_render_button)
+        self.layout.addLayout(progress_layout)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.create_button)
+        button_layout.addWidget(self.matrix_button)
+        button_layout.addWidget(self.document_button)
         button_layout.addWidget(self.stream_button)
         button_layout.addWidget(self.play_pause_button)
         button_layout.addWidget(self.abort_button)
+        button_layout.addWidget(self.play_cursor_button)
         self.layout.addLayout(button_layout)
 
         # Menu setup
@@ -147,6 +205,74 @@ class TTSWindow(QWidget):
         )
         settings_menu.addAction(self.retain_files_checkbox_action)
 
+        self.normalize_loudness_action = QAction(
+            "Normalize loudness across chunks", self, checkable=True
+        )
+        settings_menu.addAction(self.normalize_loudness_action)
+
+        self.trim_joins_action = QAction(
+            "Trim silence at chunk joins", self, checkable=True
+        )
+        settings_menu.addAction(self.trim_joins_action)
+
+        self.crossfade_joins_action = QAction(
+            "Crossfade chunk joins", self, checkable=True
+        )
+        settings_menu.addAction(self.crossfade_joins_action)
+
+        self.progressive_output_action = QAction(
+            "Playable while rendering", self, checkable=True
+        )
+        settings_menu.addAction(self.progressive_output_action)
+
+        self.seek_index_action = QAction("Write seek index", self, checkable=True)
+        settings_menu.addAction(self.seek_index_action)
+
+        self.alignment_index_action = QAction(
+            "Write text alignment index", self, checkable=True
+        )
+        settings_menu.addAction(self.alignment_index_action)
+
+        self.normalize_text_action = QAction(
+            "Normalize text before rendering", self, checkable=True
+        )
+        settings_menu.addAction(self.normalize_text_action)
+
+        self.insert_pauses_action = QAction(
+            "Insert silence for pauses and blank lines", self, checkable=True
+        )
+        settings_menu.addAction(self.insert_pauses_action)
+        self.marker_pause = MARKER_PAUSE
+        self.paragraph_pause = PARAGRAPH_PAUSE
+        pause_lengths_action = QAction("Pause lengths...", self)
+        settings_menu.addAction(pause_lengths_action)
+
+        export_menu = QMenu("Also export as", self)
+        settings_menu.addMenu(export_menu)
+        self.export_format_actions = []
+        for fmt in TRANSCODE_FORMATS:
+            action = QAction(fmt, self, checkable=True)
+            export_menu.addAction(action)
+            self.export_format_actions.append(action)
+
+        self.prewarm_action = QAction("Pre-warm API connection", self, checkable=True)
+        self.prewarm_action.setChecked(os.getenv("OPENAI_TTS_PREWARM") == "1")
+        settings_menu.addAction(self.prewarm_action)
+
+        self.speculative_action = QAction(
+            "Synthesize first chunk during confirmation", self, checkable=True
+        )
+        self.speculative_action.setChecked(os.getenv("OPENAI_TTS_PREWARM") == "1")
+        settings_menu.addAction(self.speculative_action)
+
+        self.profile_action = QAction(
+            "Profile renders (writes .pstats and report)", self, checkable=True
+        )
+        settings_menu.addAction(self.profile_action)
+
+        preview_normalization_action = QAction("Preview text normalization", self)
+        settings_menu.addAction(preview_normalization_action)
+
         api_key_menu = QMenu("API Key", self)
         settings_menu.addMenu(api_key_menu)
 
@@ -156,15 +282,34 @@ class TTSWindow(QWidget):
         api_key_menu.addAction(set_custom_action)
 
         # Connect signals
-        self.text_edit.textChanged.connect(self.update_counts)
+        # Normalizing a long text on every keystroke would stall typing, so
+        # the counts wait for a pause
+        self.count_timer = QTimer(self)
+        self.count_timer.setSingleShot(True)
+        self.count_timer.setInterval(COUNT_DELAY_MS)
+        self.count_timer.timeout.connect(self.update_counts)
+        self.text_edit.textChanged.connect(self.count_timer.start)
         self.select_path_button.clicked.connect(self.select_path)
         self.create_button.clicked.connect(self.create_tts)
+        self.matrix_button.clicked.connect(self.create_matrix)
+        self.document_button.clicked.connect(self.create_document)
         self.stream_button.clicked.connect(self.stream_tts)
+        self.play_cursor_button.clicked.connect(self.play_from_cursor)
+        self.cancel_render_button.clicked.connect(self.cancel_render)
+        self.normalize_text_action.toggled.connect(self.update_counts)
+        self.insert_pauses_action.toggled.connect(self.update_counts)
+        pause_lengths_action.triggered.connect(self.set_pause_lengths)
+        self.prewarm_action.toggled.connect(self.prewarm)
+        preview_normalization_action.triggered.connect(self.preview_normalization)
         light_action.triggered.connect(self.set_light_theme)
         dark_action.triggered.connect(self.set_dark_theme)
         use_system_action.triggered.connect(self.use_system_api_key)
         set_custom_action.triggered.connect(self.set_custom_api_key)
         self.progress_updated.connect(self.update_progress)
+        self.eta_updated.connect(self.update_eta)
+        self.batch_started.connect(self.on_batch_started)
+        self.batch_finished.connect(self.on_batch_finished)
+        self.document_counted.connect(self.confirm_document)
 
         # Connect playback control buttons
         self.play_pause_button.clicked.connect(self.on_play_pause_clicked)
@@ -181,6 +326,10 @@ class TTSWindow(QWidget):
         """Clean up resources before closing"""
         if self.player:
             self.player.cleanup()
+        if self.cursor_playback_stop:
+            self.cursor_playback_stop.set()
+        if self.batch_cancel_token:
+            self.batch_cancel_token.cancel()
         if self.playback_control:
             self.playback_control = None
         event.accept()
@@ -199,7 +348,7 @@ class TTSWindow(QWidget):
                 "text_box": self.text_edit.toPlainText(),
                 "model_var": self.model_combo.currentText(),
                 "voice_var": self.voice_combo.currentText(),
-                "format_var": "wav",  # Force WAV for streaming
+                "format_var": STREAM_FORMAT,
                 "speed_var": self.speed_input.text(),
             }
 
@@ -218,6 +367,28 @@ class TTSWindow(QWidget):
             self.show_message_signal.emit(f"Error: {str(e)}")
             self.reset_playback_ui()
 
+    @pyqtSlot()
+    def play_from_cursor(self):
+        """Play the rendered file from the sentence under the text cursor"""
+        path = self.path_entry.text()
+        index = AlignmentIndex.load(path)
+        if index is None:
+            self.show_message(
+                "No alignment index found for this output yet. Enable "
+                "Settings > Write text alignment index and render it again."
+            )
+            return
+        start = index.time_for_offset(self.text_edit.textCursor().position())
+
+        if self.cursor_playback_stop:
+            self.cursor_playback_stop.set()
+        self.cursor_playback_stop = Event()
+        Thread(
+            target=play_audio,
+            args=(path, start, self.cursor_playback_stop),
+            daemon=True,
+        ).start()
+
     @pyqtSlot()
     def on_play_pause_clicked(self):
         """Handle play/pause button clicks"""
@@ -240,6 +411,38 @@ class TTSWindow(QWidget):
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
+    @pyqtSlot(str)
+    def update_eta(self, eta):
+        self.eta_label.setText(f"ETA: {eta}")
+
+    def prewarm(self, enabled=True):
+        """Open the upstream connection in the background"""
+        if enabled:
+            Thread(target=prewarm_connection, daemon=True).start()
+
+    @pyqtSlot(object)
+    def on_batch_started(self, cancel_token):
+        self.batch_cancel_token = cancel_token
+        self.create_button.setEnabled(False)
+        self.matrix_button.setEnabled(False)
+        self.document_button.setEnabled(False)
+        self.cancel_render_button.setEnabled(True)
+        self.cancel_render_button.show()
+
+    @pyqtSlot()
+    def on_batch_finished(self):
+        self.batch_cancel_token = None
+        self.create_button.setEnabled(True)
+        self.matrix_button.setEnabled(True)
+        self.document_button.setEnabled(True)
+        self.cancel_render_button.hide()
+
+    def cancel_render(self):
+        """Cancels the running batch render; finished chunks are kept for resuming."""
+        if self.batch_cancel_token:
+            self.cancel_render_button.setEnabled(False)
+            self.batch_cancel_token.cancel()
+
     def check_api_key(self):
         if not self.api_key:
             self.show_message(
@@ -280,6 +483,7 @@ class TTSWindow(QWidget):
         )
         if ok:
             self.api_key = api_key
+            key_pool.add_key(api_key)
             if write_api_key(api_key):
                 QMessageBox.information(self, "Key", "Custom API key set.")
             else:
@@ -290,18 +494,94 @@ class TTSWindow(QWidget):
         char_count = len(text)
         chunks = split_text(text)
         num_chunks = len(chunks)
+        char_label = f"Character Count: {char_count}"
+        chunk_label = f"Number of Chunks: {num_chunks}"
+        if self.normalize_text_action.isChecked() and text:
+            normalized = normalize_text(text, self.boilerplate).text
+            normalized_chunks = len(split_text(normalized))
+            char_label = f"Character Count: {len(normalized)} (saves {char_count - len(normalized)})"
+            chunk_label = f"Number of Chunks: {normalized_chunks} (saves {num_chunks - normalized_chunks})"
+            char_count = len(normalized)
+            text = normalized
+        if self.insert_pauses_action.isChecked() and text:
+            plan = plan_pauses(text, self.marker_pause, self.paragraph_pause)
+            billed = sum(len(chunk) for chunk in plan.chunks)
+            char_label += f", {billed} billed with pauses"
+            chunk_label = f"Number of Chunks: {len(plan.chunks)} (pauses: {plan.total_pause:.1f} s)"
+            char_count = billed
         hd = "hd" in self.model_combo.currentText()
         price = estimate_price(char_count, hd)
-        self.char_count_label.setText(f"Character Count: {char_count}")
-        self.chunk_count_label.setText(f"Number of Chunks: {num_chunks}")
+        self.char_count_label.setText(char_label)
+        self.chunk_count_label.setText(chunk_label)
         self.price_label.setText(f"Estimated Price: ${price:.3f}")
 
+    def set_pause_lengths(self):
+        """Ask for the silence inserted for [pause] markers and blank lines"""
+        marker, ok = QInputDialog.getDouble(
+            self,
+            "Pause Lengths",
+            "Seconds of silence for [pause] (markers like [pause 2s] set their own):",
+            self.marker_pause,
+            0.0,
+            MAX_PAUSE,
+            2,
+        )
+        if not ok:
+            return
+        paragraph, ok = QInputDialog.getDouble(
+            self,
+            "Pause Lengths",
+            "Seconds of silence for a blank line (0 keeps blank lines as text):",
+            self.paragraph_pause,
+            0.0,
+            MAX_PAUSE,
+            2,
+        )
+        if ok:
+            self.marker_pause = marker
+            self.paragraph_pause = paragraph
+            self.update_counts()
+
+    def preview_normalization(self):
+        """Show what text normalization would change and offer to apply it"""
+        text = self.text_edit.toPlainText()
+        normalized = normalize_text(text, self.boilerplate)
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Text Normalization Preview")
+        dialog.resize(700, 500)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(
+            QLabel(
+                f"Saves {normalized.chars_saved} of {len(text)} characters and "
+                f"{len(split_text(text)) - len(split_text(normalized.text))} chunks. "
+                f"Dropped {sum(normalized.dropped_lines.values())} boilerplate lines.",
+                dialog,
+            )
+        )
+        diff_view = QTextEdit(dialog)
+        diff_view.setReadOnly(True)
+        diff_view.setPlainText(preview_diff(text, self.boilerplate) or "No changes.")
+        layout.addWidget(diff_view)
+        buttons = QDialogButtonBox(dialog)
+        apply_button = buttons.addButton(
+            "Apply to Text", QDialogButtonBox.ButtonRole.AcceptRole
+        )
+        buttons.addButton(QDialogButtonBox.StandardButton.Close)
+        apply_button.clicked.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.text_edit.setPlainText(normalized.text)
+
     def select_path(self):
         format_map = {
             "mp3": "MP3 Files (*.mp3)",
             "opus": "Opus Files (*.opus)",
             "aac": "AAC Files (*.aac)",
             "flac": "FLAC Files (*.flac)",
+            "wav": "WAV Files (*.wav)",
         }
         selected_format = self.format_combo.currentText()
         file_filter = format_map.get(selected_format, "All Files (*.*)")
@@ -324,6 +604,225 @@ class TTSWindow(QWidget):
             "format_var": self.format_combo.currentText(),
             "speed_var": self.speed_input.text(),
             "retain_files": self.retain_files_checkbox_action.isChecked(),
+            "normalize_loudness": self.normalize_loudness_action.isChecked(),
+            "trim_joins": self.trim_joins_action.isChecked(),
+            "crossfade_joins": self.crossfade_joins_action.isChecked(),
+            "progressive_output": self.progressive_output_action.isChecked(),
+            "seek_index": self.seek_index_action.isChecked(),
+            "alignment_index": self.alignment_index_action.isChecked(),
+            "normalize_text": self.normalize_text_action.isChecked(),
+            "insert_pauses": self.insert_pauses_action.isChecked(),
+            "marker_pause": self.marker_pause,
+            "paragraph_pause": self.paragraph_pause,
+            "profile": self.profile_action.isChecked(),
+            "extra_formats": [
+                action.text()
+                for action in self.export_format_actions
+                if action.isChecked()
+            ],
+            "speculative_first_chunk": self.speculative_action.isChecked(),
         }
 
         create_tts(values, self)
+
+    def select_variants(self):
+        """Ask for the voices and models of a matrix render"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Render Matrix")
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel("Voices:", dialog))
+        voice_list = QListWidget(dialog)
+        for i in range(self.voice_combo.count()):
+            item = QListWidgetItem(self.voice_combo.itemText(i), voice_list)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            checked = i == self.voice_combo.currentIndex()
+            item.setCheckState(
+                Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+            )
+        layout.addWidget(voice_list)
+        model_boxes = []
+        for i in range(self.model_combo.count()):
+            box = QCheckBox(self.model_combo.itemText(i), dialog)
+            box.setChecked(i == self.model_combo.currentIndex())
+            layout.addWidget(box)
+            model_boxes.append(box)
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
+            dialog,
+        )
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return []
+
+        speed = float(self.speed_input.text() or 1.0)
+        response_format = self.format_combo.currentText()
+        return [
+            make_variant(box.text(), voice_list.item(i).text(), speed, response_format)
+            for box in model_boxes
+            if box.isChecked()
+            for i in range(voice_list.count())
+            if voice_list.item(i).checkState() == Qt.CheckState.Checked
+        ]
+
+    def create_matrix(self):
+        if not self.api_key:
+            self.show_message(
+                "No API key found. Set the API key in the environment, `.env` file or the app's settings."
+            )
+            return
+        path = self.path_entry.text()
+        if not path or not os.path.isdir(os.path.dirname(path)):
+            self.show_message("Invalid path")
+            return
+        variants = self.select_variants()
+        if not variants:
+            return
+
+        text = self.text_edit.toPlainText().strip()
+        if self.normalize_text_action.isChecked():
+            text = normalize_text(text, self.boilerplate).text
+        price = sum(
+            estimate_price(len(text), "hd" in variant["model"]) for variant in variants
+        )
+        answer = QMessageBox.question(
+            self,
+            "Render Matrix",
+            f"Rendering {len(variants)} variants costs an estimated ${price:.3f}. "
+            "Do you want to continue?",
+        )
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+
+        cancel_token = CancelToken()
+        self.progress_updated.emit(1)
+        self.batch_started.emit(cancel_token)
+        Thread(
+            target=self._run_matrix,
+            args=(text, path, variants, cancel_token),
+            daemon=True,
+        ).start()
+
+    def _run_matrix(self, text, path, variants, cancel_token):
+        profiler = JobProfiler(path) if self.profile_action.isChecked() else None
+        try:
+            results = render_matrix(
+                text,
+                path,
+                variants,
+                make_progress_callback(self),
+                self.retain_files_checkbox_action.isChecked(),
+                cancel_token,
+                profiler=profiler,
+            )
+            failed = [output for output, ok in results.items() if not ok]
+            if cancel_token.is_cancelled():
+                self.show_message("Matrix render cancelled.")
+            elif failed:
+                self.show_message("Some variants failed:\n" + "\n".join(failed))
+            else:
+                self.show_message(f"Rendered {len(results)} variants.")
+        finally:
+            if profiler:
+                profiler.finish()
+            self.batch_finished.emit()
+
+    def create_document(self):
+        """Render an EPUB, HTML or Markdown file into one file per chapter"""
+        if not self.api_key:
+            self.show_message(
+                "No API key found. Set the API key in the environment, `.env` file or the app's settings."
+            )
+            return
+        patterns = " ".join(f"*{extension}" for extension in INGEST_EXTENSIONS)
+        source, _ = QFileDialog.getOpenFileName(
+            self, "Render Document", "", f"Documents ({patterns})"
+        )
+        if not source:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Folder for the chapters")
+        if not output_dir:
+            return
+
+        settings = {
+            "model": self.model_combo.currentText(),
+            "voice": self.voice_combo.currentText(),
+            "format": self.format_combo.currentText(),
+            "speed": float(self.speed_input.text() or 1.0),
+            "normalize": self.normalize_text_action.isChecked(),
+            "normalize_loudness": self.normalize_loudness_action.isChecked(),
+            "insert_pauses": self.insert_pauses_action.isChecked(),
+        }
+        # A long book takes a while to count; the window stays responsive
+        self.document_button.setEnabled(False)
+        Thread(
+            target=self._count_document,
+            args=(source, output_dir, settings),
+            daemon=True,
+        ).start()
+
+    def _count_document(self, source, output_dir, settings):
+        """Counts the billed characters, streaming, and asks for confirmation."""
+        sections = chars = billed = 0
+        try:
+            for section in iter_sections(source):
+                sections += 1
+                chars += len(section.text)
+                billed += len(section_text(section, settings["normalize"]))
+        except (OSError, ValueError) as e:
+            self.show_message(f"Cannot read the document: {e}")
+            billed = None
+        self.document_counted.emit(
+            (source, output_dir, settings, sections, chars, billed)
+        )
+
+    @pyqtSlot(object)
+    def confirm_document(self, counts):
+        source, output_dir, settings, sections, chars, billed = counts
+        self.document_button.setEnabled(True)
+        if billed is None:
+            return
+        if not billed:
+            self.show_message("The document has no text to render.")
+            return
+        price = estimate_price(billed, "hd" in settings["model"])
+        answer = QMessageBox.question(
+            self,
+            "Render Document",
+            f"Rendering {sections} chapters ({billed} characters) costs an "
+            f"estimated ${price:.3f}. Do you want to continue?",
+        )
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+
+        cancel_token = CancelToken()
+        self.progress_updated.emit(1)
+        self.batch_started.emit(cancel_token)
+        Thread(
+            target=self._run_document,
+            args=(source, output_dir, settings, chars, cancel_token),
+            daemon=True,
+        ).start()
+
+    def _run_document(self, source, output_dir, settings, chars, cancel_token):
+        rendered = [0]
+
+        def on_section(section, output, ok):
+            # Progress by source text, which was counted before normalization
+            rendered[0] += len(section.text)
+            self.progress_updated.emit(min(int(100 * rendered[0] / chars), 100))
+
+        try:
+            results = render_document(
+                source, output_dir, settings, render_scheduler, cancel_token, on_section
+            )
+            failed = [output for output, ok in results.items() if not ok]
+            if cancel_token.is_cancelled():
+                self.show_message("Document render cancelled.")
+            elif failed:
+                self.show_message("Some chapters failed:\n" + "\n".join(failed))
+            else:
+                self.show_message(f"Rendered {len(results)} chapters.")
+        finally:
+            self.batch_finished.emit()
@@ -0,0 +1,183 @@
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import wait
+
+from cancel import CancelToken
+
+# Upper bounds of the chunk length buckets, in characters
+LENGTH_BUCKETS = (256, 512, 1024, 2048, 4096)
+# Recent latencies kept per bucket
+LATENCY_SAMPLES = 200
+# Latencies needed in a bucket before its chunks are hedged
+MIN_SAMPLES = 20
+# A chunk slower than this percentile of its bucket gets a duplicate request
+HEDGE_PERCENTILE = 95.0
+# Duplicates allowed per request, i.e. at most ~5% extra spend, and the
+# number that may be spent at once
+HEDGE_BUDGET = 0.05
+HEDGE_BURST = 2.0
+
+
+class LatencyTracker:
+    """Recent request latencies, bucketed by chunk length."""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.lock = threading.Lock()
+        self.samples = {bucket: deque(maxlen=samples) for bucket in LENGTH_BUCKETS}
+
+    @staticmethod
+    def bucket(chars):
+        index = bisect.bisect_left(LENGTH_BUCKETS, chars)
+        return LENGTH_BUCKETS[min(index, len(LENGTH_BUCKETS) - 1)]
+
+    def record(self, chars, seconds):
+        with self.lock:
+            self.samples[self.bucket(chars)].append(seconds)
+
+    def percentile(self, chars, percentile):
+        """
+        Returns:
+            float: The latency percentile of the chunk's bucket in seconds, or
+            None while the bucket has fewer than MIN_SAMPLES latencies.
+        """
+        with self.lock:
+            samples = sorted(self.samples[self.bucket(chars)])
+        if len(samples) < MIN_SAMPLES:
+            return None
+        rank = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[rank]
+
+
+class HedgeBudget:
+    """
+    Caps the duplicates: every request earns `ratio` of a duplicate, up to
+    `burst` saved, and a duplicate spends a whole one.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET, burst=HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class Hedger:
+    """
+    Races a duplicate request against a straggling one.
+
+    A request that is still running when it exceeds the latency percentile of
+    its chunk length gets a duplicate, if the budget allows one. Whichever
+    finishes first wins and the other is cancelled, so one slow response no
+    longer holds up the in-order assembly of the whole render.
+    """
+
+    def __init__(
+        self, percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET, burst=HEDGE_BURST
+    ):
+        self.percentile = percentile
+        self.tracker = LatencyTracker()
+        self.budget = HedgeBudget(budget, burst)
+        self.lock = threading.Lock()
+        self.hedged = 0
+        self.won = 0
+
+    def run(self, attempt, chars, submit, cancel_token=None):
+        """
+        Runs `attempt(0, token)` in the calling thread and, if it straggles,
+        submits `attempt(1, token)`. Each attempt gets its own token, which is
+        triggered when the other attempt wins or `cancel_token` is.
+
+        Args:
+            attempt (callable): Performs the request; returns True on success
+                and must clean up after itself when it fails or is cancelled.
+            chars (int): Length of the chunk, selecting the latency bucket.
+            submit (callable): Queues the duplicate like
+                RenderScheduler.submit(), so it takes a rate limit token and a
+                worker like any other request.
+            cancel_token (CancelToken, optional): Cancels both attempts.
+
+        Returns:
+            int: 0 or 1 for the attempt that succeeded, or None if both failed.
+        """
+        self.budget.earn()
+        tokens = [CancelToken(), CancelToken()]
+        winner = []
+        hedge = []
+        primary_done = []
+
+        def finish(index, ok, started):
+            elapsed = time.monotonic() - started
+            with self.lock:
+                if not ok or winner:
+                    return
+                winner.append(index)
+            tokens[1 - index].cancel()
+            self.tracker.record(chars, elapsed)
+
+        def run_attempt(index):
+            started = time.monotonic()
+            finish(index, attempt(index, tokens[index]), started)
+
+        def run_hedge(cancel_token):
+            run_attempt(1)
+
+        def start_hedge():
+            with self.lock:
+                if primary_done or winner or tokens[1].is_cancelled():
+                    return
+                if not self.budget.spend():
+                    logging.debug("Hedge budget exhausted, not hedging")
+                    return
+                self.hedged += 1
+                logging.info(
+                    f"Hedging a {chars}-character chunk slower than "
+                    f"p{self.percentile:g} ({threshold:.1f} s)"
+                )
+                # Submit in the context of the request being hedged, so its
+                # log records keep their job and chunk IDs
+                hedge.append(context.run(submit, run_hedge, cancel_token=tokens[1]))
+
+        handle = None
+        if cancel_token:
+            handle = cancel_token.register(lambda: [t.cancel() for t in tokens])
+        threshold = self.tracker.percentile(chars, self.percentile)
+        context = contextvars.copy_context()
+        timer = None
+        if threshold is not None:
+            timer = threading.Timer(threshold, start_hedge)
+            timer.daemon = True
+            timer.start()
+        try:
+            run_attempt(0)
+        finally:
+            if timer:
+                timer.cancel()
+            with self.lock:
+                primary_done.append(True)
+            # A hedge still queued is dropped, so a worker never waits for a
+            # request that needs a worker; one that started is awaited
+            for future in hedge:
+                if not future.cancel():
+                    wait([future])
+            if cancel_token:
+                cancel_token.unregister(handle)
+        if winner == [1]:
+            with self.lock:
+                self.won += 1
+            logging.info(f"Hedged request won ({self.won}/{self.hedged} so far)")
+        return winner[0] if winner else None
@@ -0,0 +1,487 @@
+import os
+import re
+import time
+import codecs
+import logging
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from collections import deque
+from urllib.parse import unquote
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+
+from tts import render_text
+from normalize import normalize_text
+from cancel import CancelToken
+from log_setup import log_context
+
+EPUB_EXTENSIONS = (".epub",)
+HTML_EXTENSIONS = (".html", ".htm", ".xhtml")
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+INGEST_EXTENSIONS = EPUB_EXTENSIONS + HTML_EXTENSIONS + MARKDOWN_EXTENSIONS
+# Bytes of a source read and parsed at a time
+READ_BLOCK = 64 * 1024
+# Sections queued for synthesis ahead of the one being assembled; bounds the
+# text held in memory while the scheduler is kept busy
+MAX_PENDING_SECTIONS = 4
+# HTML headings that start a new section; EPUB chapters are their documents
+SECTION_HEADINGS = ("h1", "h2")
+MAX_NAME_LENGTH = 60
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = HEADING_TAGS | {
+    "address",
+    "article",
+    "blockquote",
+    "br",
+    "dd",
+    "div",
+    "dt",
+    "figcaption",
+    "footer",
+    "header",
+    "hr",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "td",
+    "th",
+    "tr",
+    "ul",
+}
+# Elements whose content is never spoken
+SKIPPED_TAGS = {
+    "audio",
+    "iframe",
+    "math",
+    "nav",
+    "noscript",
+    "object",
+    "rp",
+    "rt",
+    "script",
+    "style",
+    "svg",
+    "template",
+    "video",
+}
+SKIPPED_TYPES = ("footnote", "endnote", "rearnote", "noteref", "pagebreak", "toc")
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link"}
+VOID_TAGS |= {"meta", "param", "source", "track", "wbr"}
+
+ENCODING_DECLARATION = re.compile(rb"""(?:encoding|charset)\s*=\s*["']?([\w.:-]+)""")
+UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+MARKDOWN_FENCE = re.compile(r"^(`{3,}|~{3,})")
+MARKDOWN_HEADING = re.compile(r"^#{1,6}(?=\s|$)")
+MARKDOWN_SETEXT = re.compile(r"^(=+|-+)$")
+MARKDOWN_RULE = re.compile(r"^([-*_])(\s*\1){2,}$")
+MARKDOWN_LINK_DEFINITION = re.compile(r"^\[[^\]]+\]:\s")
+MARKDOWN_TABLE_SEPARATOR = re.compile(r"^\|?[\s:|-]+\|[\s:|-]*$")
+MARKDOWN_BLOCK_PREFIX = re.compile(r"^(?:>\s?)*(?:(?:[-*+]|\d{1,9}[.)])\s+)?")
+MARKDOWN_INLINE = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), ""),
+    (re.compile(r"\[\^[^\]]+\]"), ""),
+    (re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])"), r"\1"),
+    (re.compile(r"<(?:https?|mailto):[^>]*>"), ""),
+    (re.compile(r"</?[A-Za-z][^>]*>"), ""),
+    (re.compile(r"`+([^`]*)`+"), r"\1"),
+    # Delimiters only count at word boundaries, so a_b_c and 2*3*4 are kept
+    (
+        re.compile(r"(?<![\w*_~])(\*{1,3}|_{1,3}|~~)(?=\S)(.+?)(?<=\S)\1(?![\w*_~])"),
+        r"\2",
+    ),
+]
+
+
+class Section:
+    """A chapter or section of a document, in reading order."""
+
+    def __init__(self, index, title, text):
+        self.index = index
+        self.title = title
+        self.text = text
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Collects the speakable text of an (X)HTML document as it is fed, one
+    paragraph per block element. Finished sections are appended to `sections`
+    for the caller to drain, so the document is never held in memory whole.
+    """
+
+    def __init__(self, split_tags=()):
+        super().__init__(convert_charrefs=True)
+        self.split_tags = split_tags
+        self.sections = []  # (title, text) pairs not yet drained
+        self.paragraphs = []
+        self.parts = []
+        self.title = None  # first heading of the running section
+        self.heading = None  # text of the heading being parsed
+        self.page_title = None
+        self.in_page_title = False
+        self.skipping = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.skipping:
+            if tag == self.skipping[-1]:
+                self.skipping.append(tag)
+            return
+        if tag == "title":
+            self.in_page_title = True
+            self.page_title = ""
+            return
+        attrs = dict(attrs)
+        kind = f"{attrs.get('epub:type') or ''} {attrs.get('role') or ''}"
+        if tag in SKIPPED_TAGS or any(word in kind for word in SKIPPED_TYPES):
+            if tag not in VOID_TAGS:
+                self.skipping.append(tag)
+            return
+        if tag in self.split_tags:
+            self.end_section()
+        if tag in BLOCK_TAGS:
+            self._end_paragraph()
+        if tag in HEADING_TAGS:
+            self.heading = []
+
+    def handle_endtag(self, tag):
+        if self.skipping:
+            if tag == self.skipping[-1]:
+                self.skipping.pop()
+            return
+        if tag == "title":
+            self.in_page_title = False
+            return
+        if tag in HEADING_TAGS and self.heading is not None:
+            heading = " ".join("".join(self.heading).split())
+            self.heading = None
+            if heading and self.title is None:
+                self.title = heading
+        if tag in BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        if self.in_page_title:
+            self.page_title += data
+            return
+        self.parts.append(data)
+        if self.heading is not None:
+            self.heading.append(data)
+
+    def _end_paragraph(self):
+        paragraph = " ".join("".join(self.parts).split())
+        self.parts = []
+        if paragraph:
+            self.paragraphs.append(paragraph)
+
+    def end_section(self):
+        """Ends the running section, if it has any text."""
+        self._end_paragraph()
+        if self.paragraphs:
+            title = self.title or " ".join((self.page_title or "").split())
+            self.sections.append((title, "\n\n".join(self.paragraphs)))
+        self.paragraphs = []
+        self.title = None
+
+
+def _sniff_encoding(head, default="utf-8"):
+    """Returns the encoding declared by a BOM, an XML declaration or a meta tag."""
+    for bom, encoding in (
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+    ):
+        if head.startswith(bom):
+            return encoding
+    match = ENCODING_DECLARATION.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return default
+
+
+def _html_sections(file, split_tags=()):
+    """
+    Parses a binary (X)HTML stream block by block.
+
+    Yields:
+        tuple: (title, text) of every section as soon as it has been parsed.
+    """
+    parser = _TextExtractor(split_tags)
+    block = file.read(READ_BLOCK)
+    decoder = codecs.getincrementaldecoder(_sniff_encoding(block[:1024]))("replace")
+    while block:
+        parser.feed(decoder.decode(block))
+        yield from parser.sections
+        parser.sections.clear()
+        block = file.read(READ_BLOCK)
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    parser.end_section()
+    yield from parser.sections
+
+
+def _epub_sections(path):
+    """
+    Reads an EPUB's chapters in spine order, one compressed document at a time.
+
+    Yields:
+        tuple: (title, text) of every chapter with speakable text.
+    """
+    with zipfile.ZipFile(path) as book:
+        container = ET.fromstring(book.read("META-INF/container.xml"))
+        rootfile = container.find(".//{*}rootfile")
+        if rootfile is None:
+            raise ValueError("The container names no package document")
+        package_path = rootfile.get("full-path")
+        package = ET.fromstring(book.read(package_path))
+        base = posixpath.dirname(package_path)
+        items = {
+            item.get("id"): item for item in package.iterfind("{*}manifest/{*}item")
+        }
+        for itemref in package.iterfind("{*}spine/{*}itemref"):
+            item = items.get(itemref.get("idref"))
+            if (
+                item is None
+                or itemref.get("linear") == "no"
+                or "html" not in (item.get("media-type") or "")
+            ):
+                continue
+            name = posixpath.normpath(posixpath.join(base, unquote(item.get("href"))))
+            with book.open(name) as file:
+                parts = list(_html_sections(file))
+            if parts:
+                title = next((title for title, _ in parts if title), "")
+                yield title, "\n\n".join(text for _, text in parts)
+
+
+def _markdown_inline(line):
+    for pattern, replacement in MARKDOWN_INLINE:
+        line = pattern.sub(replacement, line)
+    return " ".join(line.split())
+
+
+def _markdown_sections(file):
+    """
+    Reads Markdown line by line, dropping the syntax that is not spoken: code
+    blocks, front matter, link targets, images and emphasis markers. `#` and
+    `##` headings start a new section.
+
+    Yields:
+        tuple: (title, text) of every section as soon as it has been read.
+    """
+    title, paragraphs, lines = None, [], []
+    fence = None
+    front_matter = False
+
+    def end_paragraph():
+        if lines:
+            paragraphs.append(" ".join(lines))
+            lines.clear()
+
+    for number, line in enumerate(file):
+        stripped = line.strip()
+        if number == 0 and stripped == "---":
+            front_matter = True
+            continue
+        if front_matter:
+            front_matter = stripped not in ("---", "...")
+            continue
+        if fence:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        match = MARKDOWN_FENCE.match(stripped)
+        if match:
+            end_paragraph()
+            fence = match.group(1)
+            continue
+
+        level = 0
+        heading = None
+        match = MARKDOWN_HEADING.match(stripped)
+        if match:
+            level = len(match.group())
+            heading = _markdown_inline(stripped[level:].strip().rstrip("#"))
+            end_paragraph()
+        elif lines and len(lines) == 1 and MARKDOWN_SETEXT.match(stripped):
+            level = 1 if stripped[0] == "=" else 2
+            heading = lines.pop()
+        if level:
+            if level <= 2 and paragraphs:
+                yield title, "\n\n".join(paragraphs)
+                title, paragraphs = None, []
+            if heading:
+                title = title or heading
+                paragraphs.append(heading)
+            continue
+
+        if (
+            not stripped
+            or MARKDOWN_RULE.match(stripped)
+            or MARKDOWN_LINK_DEFINITION.match(stripped)
+            or MARKDOWN_TABLE_SEPARATOR.match(stripped)
+        ):
+            end_paragraph()
+            continue
+        if stripped.startswith("|"):
+            cells = [_markdown_inline(cell) for cell in stripped.strip("|").split("|")]
+            lines.append(", ".join(cell for cell in cells if cell))
+            continue
+        prefix = MARKDOWN_BLOCK_PREFIX.match(stripped).end()
+        if prefix:
+            # A quote or list item is a paragraph of its own
+            end_paragraph()
+            stripped = stripped[prefix:]
+        text = _markdown_inline(stripped)
+        if text:
+            lines.append(text)
+    end_paragraph()
+    if paragraphs:
+        yield title, "\n\n".join(paragraphs)
+
+
+def iter_sections(path):
+    """
+    Streams the chapters or sections of an EPUB, HTML or Markdown document.
+
+    Only the section being parsed is held in memory, so a long book yields its
+    first chapter right away. Sections without speakable text are skipped.
+
+    Args:
+        path (str): Path to a document with one of INGEST_EXTENSIONS.
+
+    Yields:
+        Section: Every section in reading order, numbered from 1.
+
+    Raises:
+        ValueError: If the document type is not supported or it is malformed.
+        OSError: If the document cannot be read.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in INGEST_EXTENSIONS:
+        raise ValueError(f"Unsupported document type: {extension or path}")
+    index = 0
+    try:
+        for title, text in _read_sections(path, extension):
+            index += 1
+            yield Section(index, title or f"Section {index}", text)
+    except (zipfile.BadZipFile, ET.ParseError, KeyError) as e:
+        raise ValueError(f"{path} is not a valid document: {e}") from e
+
+
+def _read_sections(path, extension):
+    if extension in EPUB_EXTENSIONS:
+        yield from _epub_sections(path)
+    elif extension in HTML_EXTENSIONS:
+        with open(path, "rb") as file:
+            yield from _html_sections(file, SECTION_HEADINGS)
+    else:
+        with open(path, "r", encoding="utf-8-sig", errors="replace") as file:
+            yield from _markdown_sections(file)
+
+
+def section_text(section, normalize=False):
+    """Returns the text of a section as it is sent for synthesis."""
+    text = normalize_text(section.text).text if normalize else section.text
+    return text.strip()
+
+
+def section_path(output_dir, section, response_format):
+    """
+    Returns:
+        str: `<output_dir>/<NNN> <title>.<format>`, so the files sort in order.
+    """
+    name = UNSAFE_NAME.sub(" ", section.title)
+    name = " ".join(name.split())[:MAX_NAME_LENGTH].strip(" .") or "Section"
+    return os.path.join(output_dir, f"{section.index:03d} {name}.{response_format}")
+
+
+def render_document(
+    source, output_dir, settings, scheduler, cancel_token=None, on_section=None
+):
+    """
+    Renders a document chapter by chapter, each into its own output file.
+
+    Every section goes through tts.render_text(), i.e. the pipeline of the
+    app, as soon as it has been parsed, so synthesis starts with the first
+    chapter while the rest of the document is still unread. All sections are
+    one fair-share job, so they finish in order. At most MAX_PENDING_SECTIONS
+    sections wait for their chunks; parsing resumes as the oldest finishes.
+
+    Args:
+        source (str): EPUB, HTML or Markdown document.
+        output_dir (str): Folder the chapter files are written to.
+        settings (dict): model, voice, format, speed and normalize, and
+            optionally normalize_loudness and insert_pauses.
+        scheduler (RenderScheduler): Pool the requests run on.
+        cancel_token (CancelToken, optional): Aborts the render.
+        on_section (callable, optional): Called with the Section, its output
+            path and whether it was rendered, in order, as each one finishes.
+
+    Returns:
+        dict: Output path -> True if the section was rendered, and `source` ->
+        False if the document could not be read to the end.
+    """
+    cancel_token = cancel_token or CancelToken()
+    os.makedirs(output_dir, exist_ok=True)
+    pending = deque()
+    results = {}
+    sections = ThreadPoolExecutor(
+        max_workers=MAX_PENDING_SECTIONS + 1, thread_name_prefix="section"
+    )
+
+    def render(section, text, output):
+        started = time.monotonic()
+        with log_context(job_id=os.path.basename(output)):
+            try:
+                ok = render_text(
+                    text, output, settings, scheduler, cancel_token, job=source
+                )
+            except Exception as e:
+                logging.exception(f"Render of section {section.index} failed: {e}")
+                ok = False
+            if ok:
+                logging.info(
+                    f"Rendered {output} in {time.monotonic() - started:.1f} seconds"
+                )
+        return ok
+
+    def finish(section, output, future):
+        ok = future.result() and not cancel_token.is_cancelled()
+        results[output] = ok
+        if not ok and not cancel_token.is_cancelled():
+            logging.error(f"Failed to render section {section.index} of {source}")
+        if on_section:
+            on_section(section, output, ok)
+
+    try:
+        for section in iter_sections(source):
+            if cancel_token.is_cancelled():
+                break
+            text = section_text(section, settings["normalize"])
+            if not text:
+                continue
+            output = section_path(output_dir, section, settings["format"])
+            logging.info(f"Queued section {section.index} of {source}")
+            future = sections.submit(render, section, text, output)
+            pending.append((section, output, future))
+            while len(pending) > MAX_PENDING_SECTIONS:
+                finish(*pending.popleft())
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot read {source}: {e}")
+        results[source] = False
+    try:
+        while pending:
+            finish(*pending.popleft())
+    finally:
+        sections.shutdown()
+    return results
@@ -0,0 +1,255 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+from contextlib import closing
+
+# Seconds a claimed task stays owned by a worker without a heartbeat
+LEASE_SECONDS = 120
+# A task that failed or lost its worker this many times is given up on
+MAX_ATTEMPTS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    output_path TEXT NOT NULL,
+    segment_dir TEXT NOT NULL,
+    model TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    response_format TEXT NOT NULL,
+    speed REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    idx INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+"""
+
+
+class JobStore:
+    """
+    Shared job store backed by a SQLite file.
+
+    The file may live on shared storage so that worker processes on several
+    machines can pull chunk tasks from it. Tasks are claimed under a lease that
+    the worker renews with heartbeats; a task whose lease expires (because its
+    worker died) is handed to the next worker that asks.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the SQLite database file.
+        """
+        self.path = path
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # Rollback journal instead of WAL: WAL does not work on network filesystems
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _transaction(self, connection):
+        connection.execute("BEGIN IMMEDIATE")
+
+    def submit_job(
+        self,
+        chunks,
+        output_path,
+        model,
+        voice,
+        response_format,
+        speed,
+        segment_dir=None,
+    ):
+        """
+        Adds a job with one task per text chunk.
+
+        Args:
+            chunks (list of str): Text chunks, in playback order.
+            output_path (str): Final output file, written by the coordinator.
+            model (str): TTS model name.
+            voice (str): Voice ID to use.
+            response_format (str): Audio format of the segments.
+            speed (float): Speech speed multiplier.
+            segment_dir (str, optional): Shared directory for segment files.
+                Defaults to a hidden directory next to the output file.
+
+        Returns:
+            str: The new job ID.
+
+        Raises:
+            ValueError: If there are no chunks; such a job would never finish.
+        """
+        if not chunks:
+            raise ValueError("A job needs at least one chunk")
+        job_id = uuid.uuid4().hex[:12]
+        if segment_dir is None:
+            segment_dir = os.path.join(
+                os.path.dirname(os.path.abspath(output_path)),
+                f".{os.path.basename(output_path)}.segments",
+            )
+        os.makedirs(segment_dir, exist_ok=True)
+        connection = self._connect()
+        try:
+            self._transaction(connection)
+            connection.execute(
+                "INSERT INTO jobs (id, output_path, segment_dir, model, voice, response_format, speed, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    output_path,
+                    segment_dir,
+                    model,
+                    voice,
+                    response_format,
+                    speed,
+                    time.time(),
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO tasks (job_id, idx, text) VALUES (?, ?, ?)",
+                [(job_id, i, chunk) for i, chunk in enumerate(chunks)],
+            )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        logging.info(f"Submitted job {job_id} with {len(chunks)} tasks")
+        return job_id
+
+    def claim_task(self, worker_id, lease=LEASE_SECONDS):
+        """
+        Claims the oldest pending task, or one whose worker lost its lease.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+            lease (float, optional): Lease duration in seconds.
+
+        Returns:
+            dict: The task joined with its job parameters, or None if idle.
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            self._transaction(connection)
+            row = connection.execute(
+                "SELECT t.job_id, t.idx, t.text, t.attempts, j.model, j.voice, "
+                "j.response_format, j.speed, j.segment_dir FROM tasks t "
+                "JOIN jobs j ON j.id = t.job_id "
+                "WHERE j.status = 'pending' AND (t.status = 'pending' "
+                "OR (t.status = 'running' AND t.lease_until < ?)) "
+                "ORDER BY j.created_at, t.idx LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            if row["attempts"] >= MAX_ATTEMPTS:
+                connection.execute(
+                    "UPDATE tasks SET status = 'failed' WHERE job_id = ? AND idx = ?",
+                    (row["job_id"], row["idx"]),
+                )
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed' WHERE id = ?", (row["job_id"],)
+                )
+                connection.execute("COMMIT")
+                logging.error(f"Task {row['job_id']}/{row['idx']} gave up")
+                return self.claim_task(worker_id, lease)
+            connection.execute(
+                "UPDATE tasks SET status = 'running', worker_id = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE job_id = ? AND idx = ?",
+                (worker_id, now + lease, row["job_id"], row["idx"]),
+            )
+            connection.execute("COMMIT")
+            return dict(row)
+        finally:
+            connection.close()
+
+    def heartbeat(self, job_id, idx, worker_id, lease=LEASE_SECONDS):
+        """
+        Extends the lease of a task owned by the worker.
+
+        Returns:
+            bool: False if the worker no longer owns the task.
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_until = ? WHERE job_id = ? AND idx = ? "
+                "AND worker_id = ? AND status = 'running'",
+                (time.time() + lease, job_id, idx, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete_task(self, job_id, idx, worker_id, output_path):
+        """
+        Marks a task as done once its segment file is in place.
+
+        Returns:
+            bool: False if the task was taken over by another worker meanwhile.
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', output_path = ?, lease_until = NULL "
+                "WHERE job_id = ? AND idx = ? AND worker_id = ? AND status = 'running'",
+                (output_path, job_id, idx, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def release_task(self, job_id, idx, worker_id):
+        """Hands a task owned by the worker back to the queue."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE tasks SET status = 'pending', worker_id = NULL, lease_until = NULL "
+                "WHERE job_id = ? AND idx = ? AND worker_id = ? AND status = 'running'",
+                (job_id, idx, worker_id),
+            )
+
+    def get_job(self, job_id):
+        """Returns the job row as a dict, or None if it does not exist."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def job_progress(self, job_id):
+        """
+        Counts the tasks of a job per status.
+
+        Returns:
+            dict: Mapping of status to task count.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) AS n FROM tasks WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            ).fetchall()
+            return {row["status"]: row["n"] for row in rows}
+
+    def segment_paths(self, job_id):
+        """Returns the segment files of a job in playback order."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT output_path FROM tasks WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+            return [row["output_path"] for row in rows]
+
+    def set_job_status(self, job_id, status):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ? WHERE id = ?", (status, job_id)
+            )
@@ -0,0 +1,146 @@
+import os
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import get_audio_duration
+
+# Pause kept at every seam between two chunks, in seconds
+TARGET_GAP = 0.35
+# Length of audio decoded at each edge of a chunk, in seconds
+EDGE_SECONDS = 0.6
+# Length of the optional crossfade applied at every seam, in seconds
+CROSSFADE_SECONDS = 0.03
+# RMS level below which a window counts as silence
+SILENCE_THRESHOLD_DBFS = -50.0
+
+ANALYSIS_RATE = 24000
+WINDOW_SAMPLES = ANALYSIS_RATE // 100  # 10 ms RMS windows
+
+
+def _decode_edge(file_path, tail):
+    """Decodes only the first or last EDGE_SECONDS of a file into mono PCM."""
+    if tail:
+        command = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-sseof",
+            f"-{EDGE_SECONDS}",
+            "-i",
+            file_path,
+        ]
+    else:
+        command = ["ffmpeg", "-v", "error", "-i", file_path, "-t", str(EDGE_SECONDS)]
+    command += ["-ac", "1", "-ar", str(ANALYSIS_RATE), "-f", "s16le", "-"]
+    result = subprocess.run(
+        command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def _silent_windows(samples):
+    """Returns a boolean array telling which 10 ms windows are silent."""
+    usable = len(samples) - len(samples) % WINDOW_SAMPLES
+    if not usable:
+        return np.zeros(0, dtype=bool)
+    windows = samples[:usable].astype(np.float32).reshape(-1, WINDOW_SAMPLES)
+    rms = np.sqrt(np.mean(np.square(windows / 32768.0), axis=1))
+    threshold = 10 ** (SILENCE_THRESHOLD_DBFS / 20)
+    return rms < threshold
+
+
+def _run_length(silent):
+    """Length in seconds of the silent run at the start of the windows."""
+    loud = np.flatnonzero(~silent)
+    count = loud[0] if len(loud) else len(silent)
+    return count * WINDOW_SAMPLES / ANALYSIS_RATE
+
+
+def analyze_edges(file_path):
+    """
+    Measures the leading and trailing silence of an audio chunk.
+
+    Only the first and last EDGE_SECONDS are decoded, so the cost does not
+    depend on the chunk length.
+
+    Args:
+        file_path (str): Path to the audio chunk.
+
+    Returns:
+        tuple: (duration, leading silence, trailing silence) in seconds, or
+        None if the chunk could not be analysed.
+    """
+    try:
+        duration = get_audio_duration(file_path)
+        if duration is None:
+            return None
+        head = _silent_windows(_decode_edge(file_path, tail=False))
+        tail = _silent_windows(_decode_edge(file_path, tail=True))
+        leading = _run_length(head)
+        trailing = _run_length(tail[::-1])
+        # A chunk shorter than both edges must not be trimmed twice
+        leading = min(leading, duration / 2)
+        trailing = min(trailing, duration / 2)
+        return duration, leading, trailing
+    except Exception as e:
+        logging.error(f"Failed to analyze edges of {file_path}: {e}")
+        return None
+
+
+def plan_join_trims(edges, target_gap=TARGET_GAP):
+    """
+    Computes in/out points so that every seam keeps roughly `target_gap` seconds
+    of silence. The head of the first chunk and the tail of the last one are
+    left untouched.
+
+    Args:
+        edges (list): Output of analyze_edges() for every chunk, in order.
+        target_gap (float, optional): Silence to keep at each seam, in seconds.
+
+    Returns:
+        list of tuple: (inpoint, outpoint) per chunk, where None means the
+        chunk is not trimmed on that side.
+    """
+    trims = [[None, None] for _ in edges]
+    for i in range(len(edges) - 1):
+        left, right = edges[i], edges[i + 1]
+        if left is None or right is None:
+            continue
+        duration, _, trailing = left
+        _, leading, _ = right
+        if trailing + leading <= target_gap:
+            continue
+        keep_tail = min(trailing, target_gap / 2)
+        keep_head = min(leading, target_gap - keep_tail)
+        keep_tail = min(trailing, target_gap - keep_head)
+        if trailing - keep_tail > 0:
+            trims[i][1] = round(duration - (trailing - keep_tail), 3)
+        if leading - keep_head > 0:
+            trims[i + 1][0] = round(leading - keep_head, 3)
+    return [tuple(trim) for trim in trims]
+
+
+def analyze_joins(file_list, target_gap=TARGET_GAP, max_workers=None):
+    """
+    Analyses the edges of every chunk in a worker pool and plans the seam trims.
+
+    Args:
+        file_list (list of str): Chunk files in playback order.
+        target_gap (float, optional): Silence to keep at each seam, in seconds.
+        max_workers (int, optional): Size of the worker pool.
+
+    Returns:
+        list of tuple: (inpoint, outpoint) per chunk, see plan_join_trims().
+    """
+    with ThreadPoolExecutor(
+        max_workers=max_workers or os.cpu_count() or 2,
+        thread_name_prefix="joins",
+    ) as executor:
+        edges = list(executor.map(analyze_edges, file_list))
+    trims = plan_join_trims(edges, target_gap)
+    trimmed = sum(1 for inpoint, outpoint in trims if inpoint or outpoint)
+    logging.info(f"Planned silence trims for {trimmed}/{len(file_list)} chunks")
+    return trims
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import logging
+
+JOURNAL_SUFFIX = ".journal.json"
+
+
+def plan_hash(chunks, model, voice, response_format, speed, pauses=None):
+    """Identifies a render plan: the same chunks rendered with the same settings."""
+    digest = hashlib.sha256()
+    digest.update(f"{model}|{voice}|{response_format}|{float(speed):g}".encode())
+    for chunk in chunks:
+        digest.update(b"\0")
+        digest.update(chunk.encode("utf-8"))
+    if pauses and any(pauses):
+        # Padded chunk files differ from unpadded ones
+        digest.update(json.dumps([round(p, 3) for p in pauses]).encode())
+    return digest.hexdigest()
+
+
+class RenderJournal:
+    """
+    Records which chunks of a batch render are already on disk, so that a
+    cancelled or failed render can be resumed without paying for them again.
+
+    The journal lives next to the output as `<output>.journal.json` and is
+    rewritten atomically after every completed chunk.
+    """
+
+    def __init__(self, output_path, plan, chunk_files, completed=None):
+        self.output_path = output_path
+        self.path = output_path + JOURNAL_SUFFIX
+        self.plan = plan
+        self.chunk_files = chunk_files
+        self.completed = set(completed or ())
+
+    @classmethod
+    def load(cls, output_path, plan):
+        """
+        Loads the journal of an earlier render of the same plan.
+
+        Returns:
+            RenderJournal: The journal, or None if there is no matching journal.
+        """
+        try:
+            with open(output_path + JOURNAL_SUFFIX, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("plan") != plan:
+            return None
+        return cls(output_path, plan, data["chunk_files"], data["completed"])
+
+    def resumable(self):
+        """Returns the completed chunk indices whose files still exist."""
+        return {i for i in self.completed if os.path.exists(self.chunk_files[i])}
+
+    def mark_done(self, index):
+        self.completed.add(index)
+        self.save()
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(
+                    {
+                        "plan": self.plan,
+                        "chunk_files": self.chunk_files,
+                        "completed": sorted(self.completed),
+                    },
+                    file,
+                )
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error(f"Failed to write render journal {self.path}: {e}")
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,183 @@
+import re
+import time
+import logging
+import threading
+
+# Cooldown applied to a throttled key when the API does not say how long to wait
+DEFAULT_COOLDOWN = 20.0
+# Status codes that mean the key itself is unusable
+REVOKED_STATUS_CODES = (401, 403)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value):
+    """
+    Parses an OpenAI rate-limit reset header such as "1s", "6m0s" or "20ms".
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float: The duration in seconds, or None if it cannot be parsed.
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def mask_key(api_key):
+    """Returns a log-safe representation of an API key."""
+    return f"...{api_key[-4:]}" if len(api_key) > 8 else "..."
+
+
+class KeyState:
+    """Rate-limit bookkeeping for a single API key."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.remaining_requests = None  # unknown until the first response
+        self.remaining_tokens = None
+        self.cooldown_until = 0.0
+        self.revoked = False
+        self.inflight = 0
+
+    def available(self, now):
+        return not self.revoked and now >= self.cooldown_until
+
+    def score(self):
+        """Higher is better: the known request quota left minus in-flight requests."""
+        remaining = (
+            self.remaining_requests if self.remaining_requests is not None else 10**6
+        )
+        return remaining - self.inflight
+
+
+class KeyPool:
+    """
+    Spreads requests across several API keys with independent rate limits.
+
+    Each response reports the remaining quota of its key through the
+    `x-ratelimit-*` headers; keys that run dry or are throttled cool down until
+    their reset time, and keys rejected as invalid are taken out of rotation.
+    """
+
+    def __init__(self, api_keys):
+        """
+        Args:
+            api_keys (list of str): The API keys to rotate over.
+        """
+        self.condition = threading.Condition()
+        self.keys = {}
+        for api_key in api_keys:
+            self.add_key(api_key)
+
+    def add_key(self, api_key):
+        """Adds a key to the rotation, or brings a revoked one back."""
+        if not api_key:
+            return
+        with self.condition:
+            self.keys[api_key] = KeyState(api_key)
+            self.condition.notify_all()
+
+    def __len__(self):
+        with self.condition:
+            return sum(1 for state in self.keys.values() if not state.revoked)
+
+    def acquire(self, timeout=None, cancel_token=None):
+        """
+        Picks the key with the most quota left, waiting for a cooldown to end if
+        every key is currently throttled.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a key.
+            cancel_token (CancelToken, optional): Ends the wait when triggered.
+
+        Returns:
+            str: An API key, or None if no usable key is available or the wait
+            was cancelled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        handle = cancel_token.register(self._wake) if cancel_token else None
+        try:
+            with self.condition:
+                while True:
+                    if cancel_token and cancel_token.is_cancelled():
+                        return None
+                    now = time.monotonic()
+                    usable = [
+                        state for state in self.keys.values() if not state.revoked
+                    ]
+                    if not usable:
+                        logging.error("No usable API key left in the pool")
+                        return None
+                    available = [state for state in usable if state.available(now)]
+                    if available:
+                        state = max(available, key=KeyState.score)
+                        state.inflight += 1
+                        return state.api_key
+                    wait = min(state.cooldown_until for state in usable) - now
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                        if wait <= 0:
+                            return None
+                    self.condition.wait(wait)
+        finally:
+            if cancel_token:
+                cancel_token.unregister(handle)
+
+    def _wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def release(self, api_key, status_code=None, headers=None):
+        """
+        Returns a key to the pool and records what the API said about it.
+
+        Args:
+            api_key (str): The key returned by acquire().
+            status_code (int, optional): HTTP status of the response, or None if
+                the request failed before a response arrived.
+            headers (mapping, optional): Response headers.
+        """
+        headers = headers or {}
+        with self.condition:
+            state = self.keys.get(api_key)
+            if state is None:
+                return
+            state.inflight = max(state.inflight - 1, 0)
+            now = time.monotonic()
+
+            if status_code in REVOKED_STATUS_CODES:
+                state.revoked = True
+                logging.error(
+                    f"API key {mask_key(api_key)} rejected ({status_code}), removed from rotation"
+                )
+            else:
+                remaining = headers.get("x-ratelimit-remaining-requests")
+                if remaining is not None and remaining.isdigit():
+                    state.remaining_requests = int(remaining)
+                tokens = headers.get("x-ratelimit-remaining-tokens")
+                if tokens is not None and tokens.isdigit():
+                    state.remaining_tokens = int(tokens)
+
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+                if status_code == 429:
+                    retry_after = parse_reset_duration(headers.get("retry-after"))
+                    cooldown = retry_after or reset or DEFAULT_COOLDOWN
+                    state.cooldown_until = now + cooldown
+                    logging.warning(
+                        f"API key {mask_key(api_key)} throttled, cooling down for {cooldown:.1f}s"
+                    )
+                elif state.remaining_requests == 0 and reset:
+                    state.cooldown_until = now + reset
+                    # The quota refills over the reset window
+                    state.remaining_requests = None
+            self.condition.notify_all()
@@ -0,0 +1,123 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+
+LOG_FILE = "tts_app.log"
+LOG_LEVEL = "INFO"
+# Size-based rotation: five backups of at most 5 MB each
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+job_id_var = contextvars.ContextVar("job_id", default=None)
+chunk_id_var = contextvars.ContextVar("chunk_id", default=None)
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the job and chunk IDs of the logging thread."""
+
+    def filter(self, record):
+        record.job_id = job_id_var.get()
+        record.chunk_id = chunk_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in ("job_id", "chunk_id"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value if isinstance(value, int) else str(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(path=None, level=None, rotate=None):
+    """
+    Routes all logging through an in-memory queue to a rotating JSON log file.
+
+    Callers only format and enqueue a record; a background listener thread does
+    the file I/O, so worker threads never wait on the disk or on each other.
+    Calling it again has no effect.
+
+    Args:
+        path (str, optional): Log file. Defaults to $TTS_LOG_FILE or tts_app.log.
+        level (str, optional): Level name. Defaults to $TTS_LOG_LEVEL or INFO.
+        rotate (str, optional): "size" (default, or $TTS_LOG_ROTATE) or "daily".
+    """
+    global _listener
+    if _listener is not None:
+        return
+    path = path or os.getenv("TTS_LOG_FILE", LOG_FILE)
+    level = (level or os.getenv("TTS_LOG_LEVEL", LOG_LEVEL)).upper()
+    rotate = rotate or os.getenv("TTS_LOG_ROTATE", "size")
+
+    if rotate == "daily":
+        file_handler = TimedRotatingFileHandler(
+            path, when="midnight", backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            path, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+    file_handler.setFormatter(JsonFormatter())
+
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(records, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes the queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def log_context(job_id=None, chunk_id=None):
+    """Tags every record logged by this thread inside the block with the IDs."""
+    tokens = []
+    if job_id is not None:
+        tokens.append((job_id_var, job_id_var.set(job_id)))
+    if chunk_id is not None:
+        tokens.append((chunk_id_var, chunk_id_var.set(chunk_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
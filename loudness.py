@@ -0,0 +1,299 @@
+import os
+import logging
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+# Target integrated loudness of a render, in LUFS
+TARGET_LUFS = -16.0
+# Never push the sample peak of a chunk above this level (dBFS)
+MAX_PEAK_DBFS = -1.0
+# Largest correction applied to a render, in dB
+MAX_GAIN_DB = 12.0
+# Corrections, and changes of the running gain, smaller than this are inaudible
+# and skipped to avoid a re-encode or a step in level
+MIN_GAIN_DB = 0.2
+
+ANALYSIS_RATE = 24000
+# BS.1770 gating blocks are 400 ms long with 75% overlap, i.e. a 100 ms step
+STEP_SAMPLES = ANALYSIS_RATE // 10
+STEPS_PER_BLOCK = 4
+# Number of 100 ms steps decoded and analysed per read (bounded memory)
+STEPS_PER_READ = 64
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# K-weighting filter coefficients (ITU-R BS.1770-4, defined at 48 kHz)
+_SHELF_B = (1.53512485958697, -2.69169618940638, 1.19839281085285)
+_SHELF_A = (1.0, -1.69065929318241, 0.73248077421585)
+_HIGHPASS_B = (1.0, -2.0, 1.0)
+_HIGHPASS_A = (1.0, -1.99004745483398, 0.99007225036621)
+
+
+def _biquad_power(b, a, w):
+    z = np.exp(-1j * w)
+    num = b[0] + b[1] * z + b[2] * z * z
+    den = a[0] + a[1] * z + a[2] * z * z
+    return np.abs(num / den) ** 2
+
+
+def _k_weights(n):
+    """
+    Builds the per-bin weights that turn an rfft of n samples into the
+    K-weighted mean square of those samples (Parseval with K-weighting).
+    """
+    freqs = np.fft.rfftfreq(n, d=1.0 / ANALYSIS_RATE)
+    w = 2 * np.pi * freqs / 48000.0
+    weights = _biquad_power(_SHELF_B, _SHELF_A, w) * _biquad_power(
+        _HIGHPASS_B, _HIGHPASS_A, w
+    )
+    # One-sided spectrum: every bin except DC (and Nyquist) counts twice
+    weights[1:] *= 2
+    if n % 2 == 0:
+        weights[-1] /= 2
+    return weights / (n * n)
+
+
+_WEIGHTS = _k_weights(STEP_SAMPLES)
+
+
+def _power_to_lufs(power):
+    return -0.691 + 10 * np.log10(np.maximum(power, 1e-12))
+
+
+def measure_blocks(file_path):
+    """
+    Measures the loudness blocks and sample peak of an audio file.
+
+    The file is decoded by ffmpeg into a mono float PCM stream that is analysed
+    in fixed-size blocks, so memory use does not depend on the file length.
+
+    Args:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        tuple: (K-weighted mean square of every 400 ms block above the absolute
+        gate, sample peak in dBFS), or (None, None) if the file cannot be
+        decoded.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        file_path,
+        "-ac",
+        "1",
+        "-ar",
+        str(ANALYSIS_RATE),
+        "-f",
+        "f32le",
+        "-",
+    ]
+    read_size = STEP_SAMPLES * STEPS_PER_READ * 4
+    step_powers = []
+    peak = 0.0
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    ) as process:
+        pending = b""
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % (STEP_SAMPLES * 4)
+            pending = data[usable:]
+            if not usable:
+                continue
+            samples = np.frombuffer(data[:usable], dtype=np.float32)
+            peak = max(peak, float(np.max(np.abs(samples))))
+            steps = samples.reshape(-1, STEP_SAMPLES)
+            spectrum = np.abs(np.fft.rfft(steps, axis=1)) ** 2
+            step_powers.append(spectrum @ _WEIGHTS)
+    if process.returncode != 0 or not step_powers:
+        logging.error(f"Could not decode {file_path} for loudness measurement")
+        return None, None
+
+    steps = np.concatenate(step_powers)
+    if len(steps) < STEPS_PER_BLOCK:
+        blocks = np.array([steps.mean()])
+    else:
+        # Mean square of each overlapping 400 ms block from its four steps
+        window = np.ones(STEPS_PER_BLOCK) / STEPS_PER_BLOCK
+        blocks = np.convolve(steps, window, mode="valid")
+    blocks = blocks[_power_to_lufs(blocks) > ABSOLUTE_GATE_LUFS]
+    return blocks, float(20 * np.log10(max(peak, 1e-9)))
+
+
+def integrated_loudness(blocks):
+    """
+    Gates loudness blocks relative to their mean, as BS.1770 does.
+
+    Args:
+        blocks (numpy.ndarray): Block powers from measure_blocks(), possibly
+            of several files.
+
+    Returns:
+        float: The integrated loudness in LUFS, or None if all blocks are silent.
+    """
+    if not len(blocks):
+        return None
+    relative_gate = _power_to_lufs(blocks.mean()) + RELATIVE_GATE_LU
+    gated = blocks[_power_to_lufs(blocks) > relative_gate]
+    return float(_power_to_lufs(gated.mean()))
+
+
+def measure_loudness(file_path):
+    """
+    Measures the integrated loudness and sample peak of an audio file.
+
+    Args:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        tuple: (integrated loudness in LUFS, sample peak in dBFS), or
+        (None, None) if the file is silent or cannot be decoded.
+    """
+    blocks, peak_dbfs = measure_blocks(file_path)
+    loudness = None if blocks is None else integrated_loudness(blocks)
+    if loudness is None:
+        return None, None
+    return loudness, peak_dbfs
+
+
+def apply_gain(file_path, gain_db):
+    """
+    Applies a fixed gain to an audio file in place, streaming it through ffmpeg.
+
+    Args:
+        file_path (str): Path to the audio file.
+        gain_db (float): Gain in dB.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    root, extension = os.path.splitext(file_path)
+    temp_path = f"{root}.gain{extension}"
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        file_path,
+        "-af",
+        f"volume={gain_db:.2f}dB",
+        temp_path,
+    ]
+    try:
+        subprocess.run(command, check=True, stderr=subprocess.PIPE)
+        os.replace(temp_path, file_path)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to apply gain to {file_path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+class LoudnessNormalizer:
+    """
+    Levels a render to the target loudness in a worker pool while the remaining
+    chunks download.
+
+    Every chunk is measured as soon as it is saved, but the gain follows the
+    loudness of the whole render so far rather than that of the chunk, so the
+    level does not step at the seams. The running gain only moves when its
+    estimate drifts by MIN_GAIN_DB or more, and chunks that need less than that
+    are left as they are, without a decode and re-encode.
+    """
+
+    def __init__(self, target=TARGET_LUFS, max_workers=None):
+        self.target = target
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 2,
+            thread_name_prefix="loudness",
+        )
+        self.futures = []
+        self.lock = threading.Lock()
+        self.blocks = np.empty(0)
+        self.gain = None
+        # Resolves once the previous chunk's gain is decided; gains are decided
+        # in playback order, the measuring and re-encoding run in parallel
+        self.decided = Future()
+        self.decided.set_result(None)
+
+    def _decide(self, blocks, peak_dbfs):
+        """Adds a chunk to the running loudness and returns the gain for it."""
+        if blocks is not None:
+            self.blocks = np.concatenate([self.blocks, blocks])
+        loudness = integrated_loudness(self.blocks)
+        if loudness is None:
+            return 0.0
+        estimate = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, self.target - loudness))
+        if self.gain is None or abs(estimate - self.gain) >= MIN_GAIN_DB:
+            self.gain = estimate
+        if blocks is None or not len(blocks):
+            return 0.0
+        # Only a chunk that would clip gets less than the running gain
+        return min(self.gain, MAX_PEAK_DBFS - peak_dbfs)
+
+    def _normalize(self, file_path, measured, previous, decided, on_done):
+        try:
+            try:
+                blocks, peak_dbfs = measured.result()
+                previous.result()
+                with self.lock:
+                    gain = self._decide(blocks, peak_dbfs)
+            finally:
+                decided.set_result(None)
+            logging.debug(f"Chunk {file_path}: gain {gain:+.2f} dB")
+            if abs(gain) < MIN_GAIN_DB:
+                return True
+            return apply_gain(file_path, gain)
+        finally:
+            if on_done:
+                on_done()
+
+    def submit(self, file_path, on_done=None):
+        """
+        Queues a saved chunk for normalization. Chunks must be submitted in
+        playback order.
+
+        Args:
+            file_path (str): Path to the saved chunk.
+            on_done (callable, optional): Called from the worker once the chunk
+                is final, before the returned future resolves.
+
+        Returns:
+            concurrent.futures.Future: Resolves to True once the chunk is usable.
+        """
+        # A task only ever waits for tasks queued before it, which a worker has
+        # already taken, so the pool cannot fill up with waiting tasks
+        measured = self.executor.submit(measure_blocks, file_path)
+        decided = Future()
+        future = self.executor.submit(
+            self._normalize, file_path, measured, self.decided, decided, on_done
+        )
+        self.decided = decided
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """
+        Waits for every queued chunk and shuts the pool down.
+
+        Returns:
+            bool: True if every chunk was normalized successfully.
+        """
+        try:
+            return all(future.result() for future in self.futures)
+        except Exception as e:
+            logging.exception(f"Error during loudness normalization: {e}")
+            return False
+        finally:
+            self.executor.shutdown()
@@ -1,9 +1,13 @@
 import sys
-from PyQt6.QtWidgets import QApplication
-from gui import TTSWindow
+import argparse
 
+from log_setup import setup_logging
+
+
+def run_gui():
+    from PyQt6.QtWidgets import QApplication
+    from gui import TTSWindow
 
-def main():
     try:
         app = QApplication(sys.argv)
         window = TTSWindow()
@@ -14,5 +18,257 @@ def main():
         sys.exit(1)
 
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="OpenAI TTS GUI")
+    parser.add_argument(
+        "--log-level",
+        help="DEBUG, INFO, WARNING or ERROR (default: $TTS_LOG_LEVEL or INFO)",
+    )
+    parser.add_argument(
+        "--log-file",
+        help="Rotating JSON log file (default: $TTS_LOG_FILE or tts_app.log)",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    worker = commands.add_parser(
+        "worker", help="Render chunk tasks pulled from a shared job store"
+    )
+    worker.add_argument("store", help="Path to the shared SQLite job store")
+    worker.add_argument("--id", help="Worker identifier (default: host:pid)")
+    worker.add_argument(
+        "--exit-when-idle", action="store_true", help="Stop once no task is left"
+    )
+
+    submit = commands.add_parser("submit", help="Queue a text file as a shared job")
+    submit.add_argument("store", help="Path to the shared SQLite job store")
+    submit.add_argument("text_file", help="Text file to render")
+    submit.add_argument("output", help="Final output file")
+    submit.add_argument("--model", default="tts-1")
+    submit.add_argument("--voice", default="alloy")
+    submit.add_argument("--format", default="mp3")
+    submit.add_argument("--speed", type=float, default=1.0)
+    submit.add_argument(
+        "--wait",
+        action="store_true",
+        help="Stay as coordinator and write the output when all tasks are done",
+    )
+
+    coordinate = commands.add_parser(
+        "coordinate", help="Wait for a shared job and concatenate its segments"
+    )
+    coordinate.add_argument("store", help="Path to the shared SQLite job store")
+    coordinate.add_argument("job_id", help="Job ID printed by `submit`")
+
+    matrix = commands.add_parser(
+        "matrix", help="Render a text in several voices/models at once"
+    )
+    matrix.add_argument("text_file", help="Text file to render")
+    matrix.add_argument("output", help="Output path the variant names derive from")
+    matrix.add_argument("--models", default="tts-1", help="Comma separated models")
+    matrix.add_argument("--voices", default="alloy", help="Comma separated voices")
+    matrix.add_argument("--speeds", default="1.0", help="Comma separated speeds")
+    matrix.add_argument("--formats", default="mp3", help="Comma separated formats")
+    matrix.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write <output>.pstats and an allocation report next to the output",
+    )
+
+    watch = commands.add_parser(
+        "watch", help="Render every text file dropped into the given folders"
+    )
+    watch.add_argument("folders", nargs="+", help="Folders to watch, recursively")
+    watch.add_argument(
+        "--output", required=True, help="Root of the mirrored output tree"
+    )
+    watch.add_argument("--model", default="tts-1")
+    watch.add_argument("--voice", default="alloy")
+    watch.add_argument("--format", default="mp3")
+    watch.add_argument("--speed", type=float, default=1.0)
+    watch.add_argument(
+        "--normalize", action="store_true", help="Normalize the text before rendering"
+    )
+    watch.add_argument(
+        "--normalize-loudness",
+        action="store_true",
+        help="Level every chunk to a common loudness",
+    )
+    watch.add_argument(
+        "--pauses",
+        action="store_true",
+        help="Insert silence for [pause] markers and blank lines",
+    )
+    watch.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="Seconds a file must stay unchanged before it is rendered",
+    )
+    watch.add_argument(
+        "--batch-size", type=int, default=16, help="Documents per render batch"
+    )
+    watch.add_argument(
+        "--poll", action="store_true", help="Poll the folders instead of using inotify"
+    )
+
+    book = commands.add_parser(
+        "book", help="Render an EPUB, HTML or Markdown document chapter by chapter"
+    )
+    book.add_argument("document", help="EPUB, HTML or Markdown file to render")
+    book.add_argument("output_dir", help="Folder the chapter files are written to")
+    book.add_argument("--model", default="tts-1")
+    book.add_argument("--voice", default="alloy")
+    book.add_argument("--format", default="mp3")
+    book.add_argument("--speed", type=float, default=1.0)
+    book.add_argument(
+        "--normalize", action="store_true", help="Normalize the text before rendering"
+    )
+    book.add_argument(
+        "--normalize-loudness",
+        action="store_true",
+        help="Level every chunk to a common loudness",
+    )
+    book.add_argument(
+        "--pauses",
+        action="store_true",
+        help="Insert silence for [pause] markers and blank lines",
+    )
+
+    serve = commands.add_parser("serve", help="Run the local HTTP render service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument(
+        "--jobs", type=int, default=4, help="Batch renders executed at the same time"
+    )
+    serve.add_argument(
+        "--user-weight",
+        action="append",
+        default=[],
+        metavar="USER=WEIGHT",
+        help="Give a user a larger share of the request slots, e.g. alice=2",
+    )
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    setup_logging(args.log_file, args.log_level)
+    if args.command is None:
+        run_gui()
+        return
+
+    if args.command == "serve":
+        import service
+
+        weights = dict(item.split("=", 1) for item in args.user_weight)
+        service.serve(
+            args.host,
+            args.port,
+            args.jobs,
+            {user: float(weight) for user, weight in weights.items()},
+        )
+        return
+
+    if args.command == "watch":
+        from watcher import WatchDaemon
+
+        WatchDaemon(
+            args.folders,
+            args.output,
+            args.model,
+            args.voice,
+            args.format,
+            args.speed,
+            normalize=args.normalize,
+            normalize_loudness=args.normalize_loudness,
+            insert_pauses=args.pauses,
+            settle=args.settle,
+            batch_size=args.batch_size,
+            use_inotify=False if args.poll else None,
+        ).run()
+        return
+
+    if args.command == "book":
+        from ingest import render_document
+        from tts import render_scheduler
+
+        results = render_document(
+            args.document,
+            args.output_dir,
+            {
+                "model": args.model,
+                "voice": args.voice,
+                "format": args.format,
+                "speed": args.speed,
+                "normalize": args.normalize,
+                "normalize_loudness": args.normalize_loudness,
+                "insert_pauses": args.pauses,
+            },
+            render_scheduler,
+            on_section=lambda section, output, ok: print(
+                f"{'ok' if ok else 'FAILED'} {output}", flush=True
+            ),
+        )
+        if not results or not all(results.values()):
+            sys.exit(1)
+        return
+
+    if args.command == "matrix":
+        import matrix
+        from profiling import JobProfiler
+
+        with open(args.text_file, "r", encoding="utf-8") as file:
+            text = file.read().strip()
+        variants = [
+            matrix.make_variant(model, voice, float(speed), response_format)
+            for model in args.models.split(",")
+            for voice in args.voices.split(",")
+            for speed in args.speeds.split(",")
+            for response_format in args.formats.split(",")
+        ]
+        profiler = JobProfiler(args.output) if args.profile else None
+        results = matrix.render_matrix(
+            text,
+            args.output,
+            variants,
+            lambda percent, eta: print(f"\r{percent}%", end="", flush=True),
+            profiler=profiler,
+        )
+        print()
+        if profiler:
+            print(f"Profile report: {profiler.finish()}")
+        for output, ok in results.items():
+            print(f"{'ok' if ok else 'FAILED'} {output}")
+        if not all(results.values()):
+            sys.exit(1)
+        return
+
+    import worker
+
+    if args.command == "worker":
+        worker.run_worker(args.store, args.id, args.exit_when_idle)
+    elif args.command == "submit":
+        with open(args.text_file, "r", encoding="utf-8") as file:
+            text = file.read().strip()
+        try:
+            job_id = worker.submit_job(
+                args.store,
+                text,
+                args.output,
+                args.model,
+                args.voice,
+                args.format,
+                args.speed,
+            )
+        except ValueError as e:
+            sys.exit(f"Cannot submit {args.text_file}: {e}")
+        print(job_id)
+        if args.wait and not worker.run_coordinator(args.store, job_id):
+            sys.exit(1)
+    elif args.command == "coordinate":
+        if not worker.run_coordinator(args.store, args.job_id):
+            sys.exit(1)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
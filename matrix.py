@@ -0,0 +1,123 @@
+import os
+import logging
+from concurrent.futures import wait
+
+from tts import save_chunk, render_scheduler
+from utils import split_text, concatenate_audio_files, cleanup_files
+from progress import ProgressTracker
+from cancel import CancelToken
+
+
+def make_variant(model="tts-1", voice="alloy", speed=1.0, response_format="mp3"):
+    """Returns a render variant as a dict of its settings."""
+    return {
+        "model": model,
+        "voice": voice,
+        "speed": float(speed),
+        "format": response_format,
+    }
+
+
+def variant_path(path, variant):
+    """
+    Names the output of one variant after the requested output path, e.g.
+    `casting.mp3` -> `casting_tts-1-hd_nova_1.mp3`.
+    """
+    root = os.path.splitext(path)[0]
+    return (
+        f"{root}_{variant['model']}_{variant['voice']}_{variant['speed']:g}"
+        f".{variant['format']}"
+    )
+
+
+def render_matrix(
+    text,
+    path,
+    variants,
+    on_progress=None,
+    retain_files=False,
+    cancel_token=None,
+    scheduler=None,
+    profiler=None,
+):
+    """
+    Renders one text in several (model, voice, speed, format) variants.
+
+    The text is split once and every variant-chunk request goes through one
+    shared rate-limited pool, so the matrix takes about as long as its slowest
+    variant instead of the sum of all of them. Each variant is concatenated as
+    soon as its own chunks are done, while the others are still downloading.
+
+    Args:
+        text (str): The text to render.
+        path (str): Output path the variant file names are derived from.
+        variants (list of dict): Variants, see make_variant().
+        on_progress (callable, optional): Called with (percent, eta_seconds).
+        retain_files (bool): Whether to keep the individual chunk files.
+        cancel_token (CancelToken, optional): Aborts the whole matrix.
+        scheduler (RenderScheduler, optional): Pool to run the requests on.
+            Defaults to render_scheduler, so a matrix shares the upstream rate
+            limit with every other render of the process.
+        profiler (JobProfiler, optional): Receives the split and synthesize phase
+            boundaries; synthesize includes the per-variant concatenation.
+
+    Returns:
+        dict: Output path -> True if that variant was written.
+    """
+    cancel_token = cancel_token or CancelToken()
+    variants = list({tuple(sorted(v.items())): v for v in variants}.values())
+    if profiler:
+        profiler.start_phase("split")
+    chunks = split_text(text)
+    if profiler:
+        profiler.start_phase("synthesize")
+    logging.info(
+        f"Rendering {len(variants)} variants of {len(chunks)} chunks "
+        f"({len(variants) * len(chunks)} requests)"
+    )
+    scheduler = scheduler or render_scheduler
+    progress = ProgressTracker(
+        sum(len(chunk) for chunk in chunks) * len(variants),
+        on_progress or (lambda percent, eta: None),
+        variants[0]["format"],
+    )
+
+    plans = []
+    for v, variant in enumerate(variants):
+        output = variant_path(path, variant)
+        root, extension = os.path.splitext(output)
+        files = [f"{root}_{i}{extension}" for i in range(len(chunks))]
+        futures = [
+            scheduler.submit(
+                save_chunk,
+                chunk,
+                file_path,
+                variant["model"],
+                variant["voice"],
+                variant["format"],
+                variant["speed"],
+                progress=progress,
+                chunk_id=(v, i),
+                cancel_token=cancel_token,
+                scheduler=scheduler,
+                job=output,
+                cost=len(chunk),
+            )
+            for i, (chunk, file_path) in enumerate(zip(chunks, files))
+        ]
+        plans.append((output, files, futures))
+
+    results = {}
+    for output, files, futures in plans:
+        wait(futures)
+        ok = all(not f.cancelled() and f.result() for f in futures)
+        if ok and not cancel_token.is_cancelled():
+            concatenate_audio_files(files, output, cancel_token=cancel_token)
+            ok = os.path.exists(output)
+        else:
+            logging.error(f"Variant {output} failed or was cancelled")
+            ok = False
+        results[output] = ok
+        cleanup_files(files, retain_files and ok)
+    progress.finish()
+    return results
@@ -0,0 +1,304 @@
+import os
+import re
+import html
+import bisect
+import difflib
+import logging
+from collections import Counter
+
+# Lines matching one of these (case-insensitive, whole line) carry no speech
+DEFAULT_BOILERPLATE = (
+    r"(?:page\s+)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?",
+    r"-\s*\d{1,4}\s*-",
+)
+BOILERPLATE_FILE = "boilerplate.txt"
+
+# A short line seen this many times at the top or bottom of a page is a
+# running page header or footer
+REPEATED_LINE_MIN = 3
+REPEATED_LINE_MAX_CHARS = 80
+# Lines next to a page break (form feed or page number) that may be headers
+PAGE_EDGE_LINES = 2
+# Lines ending like a sentence are dialogue, not headers ("Yes.", "No!")
+SENTENCE_END = re.compile(r"[.!?:;,\"'”)]$")
+
+# The preview only diffs the beginning of the text so it stays instant
+PREVIEW_CHARS = 20000
+
+NEWLINES = re.compile(r"\r\n?")
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+HTML_BLOCK_TAG = re.compile(
+    r"<(?:br|p|div|li|tr|h[1-6])\b[^<>]{0,500}>|</(?:p|div|li|tr|h[1-6])\s*>",
+    re.IGNORECASE,
+)
+HTML_TAG = re.compile(r"</?[A-Za-z][^<>]{0,500}>")
+HTML_ENTITY = re.compile(r"&(?:#\d{1,7}|#[xX][0-9A-Fa-f]{1,6}|[A-Za-z]{2,8});")
+
+MD_IMAGE = re.compile(r"!\[[^\]\n]*\]\([^)\n]*\)")
+MD_LINK = re.compile(r"\[([^\]\n]+)\]\([^)\n]*\)")
+MD_LINE_MARKUP = re.compile(
+    r"^[ \t]*(?:```|~~~).*$"  # code fences
+    r"|^[ \t]*([-*_])(?:[ \t]*\1){2,}[ \t]*$"  # horizontal rules
+    r"|^[ \t]*(?:#{1,6}|>|[-*+])[ \t]+",  # headings, quotes, bullets
+    re.MULTILINE,
+)
+# Emphasis and code markers; whether a match is markup depends on its neighbours
+MD_EMPHASIS = re.compile(r"\*{1,3}|_{1,3}|`+")
+
+# Words hyphenated across a line break by PDF text extraction
+BROKEN_WORD = re.compile(r"(?<=[a-z])-\n[ \t]*(?=[a-z])")
+INLINE_SPACE = re.compile(r"[ \t\f\v ]{2,}|[\t\f\v ]")
+LINE_BREAKS = re.compile(r"[ \t]*\n[ \t\n]*")
+
+
+class OffsetMap:
+    """
+    Maps character offsets in normalized text back to the text it came from.
+
+    Every pass that edits the text records anchors (output offset, input
+    offset) around its edits; offsets between anchors move linearly. Lookups
+    walk the passes backwards with one bisect each.
+    """
+
+    def __init__(self):
+        self.passes = []
+
+    def add_pass(self, out_starts, in_starts):
+        if out_starts:
+            self.passes.append((out_starts, in_starts))
+
+    def to_source(self, offset):
+        """Returns the offset in the original text of a normalized offset."""
+        for out_starts, in_starts in reversed(self.passes):
+            position = bisect.bisect_right(out_starts, offset) - 1
+            if position < 0:
+                continue
+            mapped = in_starts[position] + offset - out_starts[position]
+            if position + 1 < len(in_starts):
+                mapped = min(mapped, in_starts[position + 1])
+            offset = mapped
+        return offset
+
+
+class _Pass:
+    """Rebuilds a text from kept slices and replacements, recording anchors."""
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = []
+        self.position = 0
+        self.out_length = 0
+        self.out_starts = []
+        self.in_starts = []
+
+    def replace(self, start, end, replacement):
+        self.parts.append(self.text[self.position : start])
+        self.out_length += start - self.position
+        self.out_starts.append(self.out_length)
+        self.in_starts.append(start)
+        self.parts.append(replacement)
+        self.out_length += len(replacement)
+        self.out_starts.append(self.out_length)
+        self.in_starts.append(end)
+        self.position = end
+
+    def finish(self, offset_map):
+        self.parts.append(self.text[self.position :])
+        offset_map.add_pass(self.out_starts, self.in_starts)
+        return "".join(self.parts)
+
+
+def _sub(pattern, replacement, text, offset_map):
+    """re.sub() that records its edits in `offset_map`."""
+    edit = _Pass(text)
+    for match in pattern.finditer(text):
+        new = replacement(match) if callable(replacement) else replacement
+        if new != match.group():
+            edit.replace(match.start(), match.end(), new)
+    return edit.finish(offset_map)
+
+
+def _is_word(char):
+    return char.isalnum() or char == "_"
+
+
+def _emphasis(match):
+    """Drops emphasis markers that open or close a word, keeping e.g. snake_case."""
+    text = match.string
+    start, end = match.span()
+    before = text[start - 1] if start else " "
+    after = text[end] if end < len(text) else " "
+    if match.group()[0] == "`":
+        return ""
+    if match.group()[0] == "*":
+        opening = not _is_word(before) and before != "*" and not after.isspace()
+        closing = not before.isspace() and not _is_word(after) and after != "*"
+    else:
+        opening = not _is_word(before) and not after.isspace()
+        closing = not before.isspace() and not _is_word(after)
+    return "" if opening or closing else match.group()
+
+
+def _line_break(match):
+    return "\n\n" if match.group().count("\n") > 1 else " "
+
+
+def read_boilerplate_patterns(path=BOILERPLATE_FILE):
+    """
+    Reads extra boilerplate patterns, one regular expression per line. Lines
+    starting with `#` are comments.
+
+    Returns:
+        list of str: The default patterns followed by the configured ones.
+    """
+    patterns = list(DEFAULT_BOILERPLATE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        re.compile(line)
+                        patterns.append(line)
+        except (OSError, re.error) as e:
+            logging.error(f"Error reading {path}: {e}")
+    return patterns
+
+
+def compile_boilerplate(patterns):
+    """Combines boilerplate patterns into one whole-line, case-insensitive regex."""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+class NormalizedText:
+    """The result of normalize_text()."""
+
+    def __init__(self, text, source_length, offset_map, dropped_lines):
+        self.text = text
+        self.source_length = source_length
+        self.offset_map = offset_map
+        self.dropped_lines = dropped_lines
+
+    @property
+    def chars_saved(self):
+        return self.source_length - len(self.text)
+
+
+def _page_edges(lines, keys, boilerplate):
+    """
+    Finds the lines at the top and bottom of the pages: next to the start and
+    end of the text, a form feed or a boilerplate line such as a page number.
+    Only these can be running headers or footers; a line repeated elsewhere,
+    e.g. a speaker label or a refrain, is content.
+
+    Returns:
+        set of int: Indices of the lines at a page edge.
+    """
+    edges = set()
+
+    def walk(i, step):
+        found = 0
+        while 0 <= i < len(lines) and found < PAGE_EDGE_LINES:
+            if keys[i]:
+                edges.add(i)
+                found += 1
+            i += step
+
+    walk(0, 1)
+    walk(len(lines) - 1, -1)
+    for i, (line, key) in enumerate(zip(lines, keys)):
+        if "\f" in line:
+            walk(i, 1)
+            walk(i - 1, -1)
+        elif key and boilerplate.fullmatch(key):
+            walk(i + 1, 1)
+            walk(i - 1, -1)
+    return edges
+
+
+def _drop_lines(text, boilerplate, offset_map):
+    """Removes boilerplate lines and running headers/footers."""
+    lines = text.split("\n")
+    keys = [" ".join(line.split()) for line in lines]
+    edges = _page_edges(lines, keys, boilerplate)
+    counts = Counter(keys[i] for i in edges)
+    dropped = Counter()
+    edit = _Pass(text)
+    start = 0
+    for i, (line, key) in enumerate(zip(lines, keys)):
+        end = start + len(line)
+        repeated = (
+            i in edges
+            and counts[key] >= REPEATED_LINE_MIN
+            and len(key) <= REPEATED_LINE_MAX_CHARS
+            and not SENTENCE_END.search(key)
+        )
+        if key and (repeated or boilerplate.fullmatch(key)):
+            # Drop the line break too, so text around a page break rejoins
+            edit.replace(start, min(end + 1, len(text)), "")
+            dropped[key] += 1
+        start = end + 1
+    return edit.finish(offset_map), dropped
+
+
+def normalize_text(text, boilerplate=None):
+    """
+    Removes everything from pasted text that costs characters without adding
+    speech: markup, boilerplate lines, running headers and redundant whitespace.
+
+    Every pass is a single scan with a precompiled, non-backtracking pattern,
+    so the cost is linear in the length of the text.
+
+    Args:
+        text (str): The raw text.
+        boilerplate (re.Pattern, optional): Whole-line patterns to drop.
+            Defaults to the patterns from read_boilerplate_patterns().
+
+    Returns:
+        NormalizedText: The normalized text and an offset map back to `text`.
+    """
+    if boilerplate is None:
+        boilerplate = compile_boilerplate(read_boilerplate_patterns())
+    offset_map = OffsetMap()
+    source_length = len(text)
+
+    text = _sub(NEWLINES, "\n", text, offset_map)
+    text = _sub(HTML_COMMENT, "", text, offset_map)
+    text = _sub(HTML_BLOCK_TAG, "\n", text, offset_map)
+    text = _sub(HTML_TAG, "", text, offset_map)
+    text = _sub(HTML_ENTITY, lambda m: html.unescape(m.group()), text, offset_map)
+    text = _sub(MD_IMAGE, "", text, offset_map)
+    text = _sub(MD_LINK, lambda m: m.group(1), text, offset_map)
+    text = _sub(MD_LINE_MARKUP, "", text, offset_map)
+    text = _sub(MD_EMPHASIS, _emphasis, text, offset_map)
+    text, dropped = _drop_lines(text, boilerplate, offset_map)
+    text = _sub(BROKEN_WORD, "", text, offset_map)
+    text = _sub(INLINE_SPACE, " ", text, offset_map)
+    text = _sub(LINE_BREAKS, _line_break, text, offset_map)
+
+    stripped = text.lstrip()
+    offset_map.add_pass([0], [len(text) - len(stripped)])
+    text = stripped.rstrip()
+    return NormalizedText(text, source_length, offset_map, dropped)
+
+
+def preview_diff(text, boilerplate=None, limit=PREVIEW_CHARS):
+    """
+    Builds a line diff of what normalization changes at the start of a text.
+
+    Returns:
+        str: A unified diff of the first `limit` characters.
+    """
+    head = text[:limit]
+    if len(text) > limit and "\n" in head:
+        head = head[: head.rfind("\n")]
+    normalized = normalize_text(head, boilerplate).text
+    diff = difflib.unified_diff(
+        head.splitlines(),
+        normalized.splitlines(),
+        "original",
+        "normalized",
+        n=0,
+        lineterm="",
+    )
+    return "\n".join(diff)
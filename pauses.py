@@ -0,0 +1,202 @@
+import os
+import re
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+
+from utils import split_text, get_codec, concatenate_audio_files
+from streaming import PCM_SAMPLE_RATE
+
+# Silence for a bare `[pause]` marker and for a blank line, in seconds
+MARKER_PAUSE = 1.0
+PARAGRAPH_PAUSE = 0.75
+# Longest pause a marker can ask for, in seconds
+MAX_PAUSE = 30.0
+
+# `[pause]`, `[pause 2s]`, `[pause 500ms]`, `[break 1.5]`
+PAUSE_MARKER = re.compile(
+    r"\[(?:pause|break)(?:[ :=]+(\d{1,5}(?:\.\d{1,3})?)[ \t]*(ms|s)?)?\]",
+    re.IGNORECASE,
+)
+PARAGRAPH_BREAK = re.compile(r"[ \t]*\n(?:[ \t]*\n)+[ \t]*")
+BREAK = re.compile(f"(?:{PAUSE_MARKER.pattern})|(?:{PARAGRAPH_BREAK.pattern})", re.I)
+
+_silence_lock = threading.Lock()
+_silence_files = {}  # (milliseconds, format) -> path
+_silence_dir = None
+
+
+def _marker_seconds(match, default):
+    value, unit = match.group(1), match.group(2)
+    if value is None:
+        return default
+    seconds = float(value) / 1000 if (unit or "").lower() == "ms" else float(value)
+    return min(seconds, MAX_PAUSE)
+
+
+class PausePlan:
+    """
+    The result of plan_pauses(): the chunks to synthesize, the silence to play
+    after each of them and where each chunk starts in the planned text.
+    """
+
+    def __init__(self, chunks, pauses, offsets, chars_saved):
+        self.chunks = chunks
+        self.pauses = pauses
+        self.offsets = offsets
+        self.chars_saved = chars_saved
+
+    @property
+    def total_pause(self):
+        return sum(self.pauses)
+
+
+def plan_pauses(
+    text,
+    marker_pause=MARKER_PAUSE,
+    paragraph_pause=PARAGRAPH_PAUSE,
+    chunk_size=4096,
+):
+    """
+    Turns pause markers and blank lines into locally generated silence, so the
+    breaks are neither billed nor left to the voice's own pacing.
+
+    Every marker ends a chunk and becomes silence of its length; a run of
+    markers becomes their sum. Paragraphs are packed into chunks of up to
+    `chunk_size` characters, so short paragraphs do not each cost a request,
+    and a chunk preferably ends at a blank line, which then becomes
+    `paragraph_pause` of silence. Blank lines inside a chunk stay in its text.
+    Breaks before the first and after the last chunk are dropped.
+
+    Args:
+        text (str): The text to render.
+        marker_pause (float, optional): Seconds for a marker without a length.
+        paragraph_pause (float, optional): Seconds for a blank line ending a
+            chunk. 0 leaves paragraphs to split_text().
+        chunk_size (int, optional): The maximum size of each chunk.
+
+    Returns:
+        PausePlan: Chunks, pause after every chunk and chunk offsets in `text`.
+    """
+    pattern = BREAK if paragraph_pause else PAUSE_MARKER
+    chunks, pauses, offsets = [], [], []
+    pack = None  # (start, end) of the paragraphs gathered for the next chunk
+
+    def flush(pause):
+        start, end = pack
+        for chunk in split_text(text[start:end], chunk_size):
+            found = text.find(chunk, start)
+            offsets.append(found if found != -1 else start)
+            start = offsets[-1] + len(chunk)
+            chunks.append(chunk)
+            pauses.append(0.0)
+        pauses[-1] = min(pause, MAX_PAUSE)
+
+    markers = 0.0
+    position = 0
+    for match in [*pattern.finditer(text), None]:
+        end = match.start() if match else len(text)
+        piece = text[position:end]
+        if piece.strip():
+            start = position + len(piece) - len(piece.lstrip())
+            end = position + len(piece.rstrip())
+            if pack is None:
+                pack = (start, end)
+            elif markers:
+                flush(markers)
+                pack = (start, end)
+            elif end - pack[0] > chunk_size:
+                flush(paragraph_pause)
+                pack = (start, end)
+            else:
+                pack = (pack[0], end)
+            markers = 0.0
+        if match is None:
+            break
+        if match.group().lstrip().startswith("["):
+            markers += _marker_seconds(match, marker_pause)
+        position = match.end()
+    if pack is None:
+        return PausePlan([text.strip()], [0.0], [0], 0)
+    flush(0.0)
+    billed = sum(len(chunk) for chunk in chunks)
+    return PausePlan(chunks, pauses, offsets, len(text) - billed)
+
+
+def _cleanup_silence():
+    if _silence_dir:
+        shutil.rmtree(_silence_dir, ignore_errors=True)
+
+
+def silence_file(seconds, response_format):
+    """
+    Encodes `seconds` of silence in a response format, once per length.
+
+    The silence has the sample rate and channel layout of the API's audio, so
+    it can be joined to a chunk with a stream copy.
+
+    Returns:
+        str: Path of the silence file, or None if ffmpeg failed.
+    """
+    global _silence_dir
+    key = (int(round(seconds * 1000)), response_format)
+    with _silence_lock:
+        if key in _silence_files:
+            return _silence_files[key]
+        if _silence_dir is None:
+            _silence_dir = tempfile.mkdtemp(prefix="tts_silence_")
+            atexit.register(_cleanup_silence)
+        path = os.path.join(_silence_dir, f"silence_{key[0]}ms.{response_format}")
+        command = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=r={PCM_SAMPLE_RATE}:cl=mono",
+            "-t",
+            f"{key[0] / 1000:.3f}",
+        ]
+        codec = get_codec(path)
+        if codec != "copy":
+            command += ["-c:a", codec]
+        command.append(path)
+        result = subprocess.run(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            logging.error(f"Failed to generate silence: {result.stderr.decode()}")
+            return None
+        _silence_files[key] = path
+        return path
+
+
+def append_silence(chunk_path, seconds, response_format, cancel_token=None):
+    """
+    Appends `seconds` of silence to a chunk file in place.
+
+    Raw PCM gets zero samples appended; every other format is joined to a
+    cached silence file of the same format without re-encoding.
+
+    Returns:
+        bool: True if the silence was appended.
+    """
+    if response_format == "pcm":
+        with open(chunk_path, "ab") as file:
+            file.write(bytes(int(seconds * PCM_SAMPLE_RATE) * 2))
+        return True
+    silence = silence_file(seconds, response_format)
+    if silence is None:
+        return False
+    root, extension = os.path.splitext(chunk_path)
+    padded = f"{root}.padded{extension}"
+    concatenate_audio_files([chunk_path, silence], padded, cancel_token=cancel_token)
+    if not os.path.exists(padded):
+        return False
+    os.replace(padded, chunk_path)
+    return True
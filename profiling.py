@@ -0,0 +1,118 @@
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+
+PSTATS_SUFFIX = ".pstats"
+REPORT_SUFFIX = ".profile.txt"
+# Stack depth recorded per allocation; deeper is more precise but slower
+TRACE_FRAMES = 10
+TOP_ALLOCATIONS = 15
+TOP_FUNCTIONS = 15
+
+
+class JobProfiler:
+    """
+    Profiles one render phase by phase (split, synthesize, concatenate, cleanup).
+
+    Every phase runs under its own cProfile profiler, in the thread that starts
+    it, and ends with a tracemalloc snapshot, so both the hot functions and the
+    allocation growth can be attributed to a phase. finish() writes the merged
+    profile to `<output>.pstats` and a readable report to `<output>.profile.txt`.
+
+    cProfile only sees the thread a phase runs in; helper pools and ffmpeg show
+    up as the time that thread spends waiting for them.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.lock = threading.Lock()
+        self.phases = []  # (name, seconds, profile, snapshot, current, peak)
+        self.current = None
+        self.finished = False
+        self.owns_tracing = not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def start_phase(self, name):
+        """Ends the running phase, if any, and starts profiling `name`."""
+        self.end_phase()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler is active, e.g. a second profiled job
+            logging.warning(f"Cannot profile phase {name}: {e}")
+            profile = None
+        tracemalloc.reset_peak()
+        self.current = (name, time.perf_counter(), profile)
+
+    def end_phase(self):
+        """Ends the running phase; must be called from the thread that started it."""
+        with self.lock:
+            if self.current is None:
+                return
+            name, started, profile = self.current
+            self.current = None
+        if profile:
+            profile.disable()
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        self.phases.append((name, elapsed, profile, snapshot, current, peak))
+
+    def cancel(self):
+        """Stops profiling without writing anything, e.g. for a declined render."""
+        self.end_phase()
+        self.phases = []
+        self.finish()
+
+    def finish(self):
+        """
+        Ends the last phase and writes the profile and the report.
+
+        Returns:
+            str: Path of the report, or None if nothing was recorded.
+        """
+        self.end_phase()
+        if self.finished:
+            return None
+        self.finished = True
+        if self.owns_tracing:
+            tracemalloc.stop()
+        if not self.phases:
+            return None
+
+        profiles = [phase[2] for phase in self.phases if phase[2]]
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(self.output_path + PSTATS_SUFFIX)
+
+        report_path = self.output_path + REPORT_SUFFIX
+        with open(report_path, "w", encoding="utf-8") as report:
+            report.write(f"Profile of {self.output_path}\n\n")
+            for name, elapsed, _, _, current, peak in self.phases:
+                report.write(
+                    f"{name:<12} {elapsed:9.3f} s   traced {current / 2**20:8.1f} MiB"
+                    f"   peak {peak / 2**20:8.1f} MiB\n"
+                )
+            previous = self.baseline
+            for name, elapsed, profile, snapshot, _, _ in self.phases:
+                report.write(f"\n=== {name} ({elapsed:.3f} s) ===\n")
+                report.write(f"\nTop {TOP_ALLOCATIONS} allocation changes:\n")
+                for stat in snapshot.compare_to(previous, "lineno")[:TOP_ALLOCATIONS]:
+                    report.write(f"  {stat}\n")
+                previous = snapshot
+                if profile:
+                    report.write(
+                        f"\nTop {TOP_FUNCTIONS} functions by cumulative time:\n"
+                    )
+                    buffer = io.StringIO()
+                    stats = pstats.Stats(profile, stream=buffer)
+                    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                    report.write(buffer.getvalue())
+        logging.info(f"Wrote profile report to {report_path}")
+        return report_path
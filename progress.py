@@ -0,0 +1,169 @@
+import time
+import threading
+
+# Minimum seconds between two progress emissions towards the GUI (~10 Hz)
+UI_REFRESH_INTERVAL = 0.1
+# Re-emit an unchanged percentage at most this often, to refresh the ETA
+ETA_REFRESH_INTERVAL = 1.0
+
+# Rough bytes of audio the API returns per input character at speed 1.0
+# (~15 characters of speech per second). Used as a prior until real
+# throughput has been measured for the running job.
+EST_BYTES_PER_CHAR = {
+    "mp3": 1100,
+    "opus": 300,
+    "aac": 1100,
+    "flac": 1700,
+    "wav": 3200,
+    "pcm": 3200,
+}
+
+
+def format_eta(seconds):
+    """
+    Formats a number of seconds as a short human-readable ETA string.
+
+    Args:
+        seconds (float or None): Remaining seconds, or None if unknown.
+
+    Returns:
+        str: The formatted ETA, e.g. "1h 02m", "3m 05s" or "--" if unknown.
+    """
+    if seconds is None:
+        return "--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+
+class ProgressTracker:
+    """
+    Thread-safe progress model for a TTS job.
+
+    Tracks characters completed and bytes received across concurrently running
+    chunk workers, estimates the ETA from measured throughput and coalesces
+    updates so that at most one emission reaches the GUI per refresh interval.
+    """
+
+    def __init__(
+        self,
+        total_chars,
+        on_update,
+        response_format="mp3",
+        interval=UI_REFRESH_INTERVAL,
+    ):
+        """
+        Args:
+            total_chars (int): Total number of characters in the job.
+            on_update (callable): Called as on_update(percent, eta_seconds)
+                with an int percent and a float ETA (or None if unknown).
+            response_format (str): Audio format requested from the API, used
+                for the bytes-per-character prior.
+            interval (float): Minimum seconds between two emissions.
+        """
+        self.total_chars = max(int(total_chars), 1)
+        self.on_update = on_update
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.emit_lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.done_chars = 0
+        self.done_bytes = 0
+        self.inflight = {}  # chunk id -> [chars, bytes received]
+        self.prior_bytes_per_char = EST_BYTES_PER_CHAR.get(response_format, 1100)
+        self.last_emit = 0.0
+        self.last_percent = -1
+        self.finished = False
+
+    def start_chunk(self, chunk_id, chars):
+        """Registers a chunk whose request has been sent."""
+        with self.lock:
+            self.inflight[chunk_id] = [chars, 0]
+        self._maybe_emit()
+
+    def add_bytes(self, chunk_id, nbytes):
+        """Records bytes received for an in-flight chunk."""
+        with self.lock:
+            entry = self.inflight.get(chunk_id)
+            if entry is not None:
+                entry[1] += nbytes
+        self._maybe_emit()
+
+    def finish_chunk(self, chunk_id):
+        """Marks an in-flight chunk as completed."""
+        with self.lock:
+            entry = self.inflight.pop(chunk_id, None)
+            if entry is not None:
+                self.done_chars += entry[0]
+                self.done_bytes += entry[1]
+        self._maybe_emit()
+
+    def fail_chunk(self, chunk_id):
+        """Drops an in-flight chunk without counting it as completed."""
+        with self.lock:
+            self.inflight.pop(chunk_id, None)
+        self._maybe_emit()
+
+    def bytes_per_char(self):
+        """Returns the measured bytes per character, or the format prior."""
+        if self.done_chars and self.done_bytes:
+            return self.done_bytes / self.done_chars
+        return self.prior_bytes_per_char
+
+    def snapshot(self):
+        """
+        Computes the current progress.
+
+        Returns:
+            tuple: (fraction completed in [0, 1], ETA in seconds or None).
+        """
+        with self.lock:
+            bytes_per_char = self.bytes_per_char()
+            partial = 0.0
+            for chars, received in self.inflight.values():
+                # An in-flight chunk never counts as complete before it ends
+                partial += min(received / bytes_per_char, chars * 0.95)
+            effective = min(self.done_chars + partial, self.total_chars)
+        fraction = effective / self.total_chars
+        elapsed = time.monotonic() - self.start_time
+        if effective <= 0 or elapsed <= 0:
+            return fraction, None
+        rate = effective / elapsed  # characters per second
+        return fraction, (self.total_chars - effective) / rate
+
+    def _maybe_emit(self):
+        now = time.monotonic()
+        if self.finished or now - self.last_emit < self.interval:
+            return
+        # Another worker is already emitting, this update is coalesced into it
+        if not self.emit_lock.acquire(blocking=False):
+            return
+        try:
+            fraction, eta = self.snapshot()
+            percent = int(fraction * 100)
+            if (
+                percent == self.last_percent
+                and now - self.last_emit < ETA_REFRESH_INTERVAL
+            ):
+                # Nothing visible changed, keep the GUI thread idle
+                return
+            self.last_emit = now
+            self.last_percent = percent
+            self.on_update(percent, eta)
+        finally:
+            self.emit_lock.release()
+
+    def finish(self):
+        """Forces a final 100% emission."""
+        with self.emit_lock:
+            if self.finished:
+                return
+            self.finished = True
+            self.last_emit = time.monotonic()
+            self.last_percent = 100
+            self.on_update(100, 0.0)
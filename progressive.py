@@ -0,0 +1,160 @@
+import os
+import struct
+import logging
+import threading
+
+from containers import (
+    parse_mp3_header,
+    is_mp3_info_frame,
+    strip_id3,
+    ogg_crc,
+    parse_wav,
+    wav_header,
+)
+
+# Formats whose files can be grown by appending chunks while staying playable
+PROGRESSIVE_FORMATS = ("mp3", "aac", "opus", "wav", "pcm")
+
+
+def strip_mp3_info_frame(data):
+    """
+    Drops a leading Xing/Info/VBRI frame: it describes the length of the single
+    chunk and would make players stop or mis-seek in the growing file.
+    """
+    header = parse_mp3_header(data[:4])
+    if header and is_mp3_info_frame(data[: header["frame_size"]]):
+        return data[header["frame_size"] :]
+    return data
+
+
+def renumber_ogg_pages(data, serial):
+    """
+    Rewrites the stream serial number of every Ogg page, so that the chunks
+    form a valid chained Ogg stream with one distinct serial per link.
+    """
+    out = bytearray()
+    pos = 0
+    while pos + 27 <= len(data):
+        if data[pos : pos + 4] != b"OggS":
+            logging.error("Unexpected data in Ogg chunk, truncating")
+            break
+        segments = data[pos + 26]
+        header_size = 27 + segments
+        body_size = sum(data[pos + 27 : pos + header_size])
+        page = bytearray(data[pos : pos + header_size + body_size])
+        struct.pack_into("<I", page, 14, serial)
+        struct.pack_into("<I", page, 22, 0)
+        struct.pack_into("<I", page, 22, ogg_crc(page))
+        out += page
+        pos += header_size + body_size
+    return bytes(out)
+
+
+class ProgressiveWriter:
+    """
+    Grows the final output file in playback order while chunks complete.
+
+    Chunks may be handed over in any order; each one is appended as soon as
+    every chunk before it is in place, so external players can open and play
+    the completed prefix while the rest is still rendering. MP3 and AAC frames
+    and Ogg pages are appended directly; WAV sample data is appended and the
+    header sizes are rewritten after every chunk.
+    """
+
+    def __init__(self, path, response_format):
+        """
+        Args:
+            path (str): Final output file.
+            response_format (str): One of PROGRESSIVE_FORMATS.
+        """
+        if response_format not in PROGRESSIVE_FORMATS:
+            raise ValueError(
+                f"{response_format} output cannot be written progressively"
+            )
+        self.path = path
+        self.response_format = response_format
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next_index = 0
+        self.data_size = 0
+        self.wav_fmt = None
+        self.chunk_sizes = []
+        self.file = open(path, "wb")
+
+    def add(self, index, chunk_path):
+        """
+        Hands over a completed chunk file.
+
+        Args:
+            index (int): Position of the chunk in playback order.
+            chunk_path (str): Path to the downloaded chunk.
+        """
+        # Reading and rewriting the chunk needs no shared state, so it runs in
+        # the calling thread before the lock is taken
+        prepared = self._prepare(index, chunk_path)
+        with self.lock:
+            self.pending[index] = prepared
+            while self.next_index in self.pending:
+                self._append(self.next_index, *self.pending.pop(self.next_index))
+                self.next_index += 1
+
+    def _prepare(self, index, chunk_path):
+        """
+        Returns:
+            tuple: The WAV format of the chunk, or None for other formats, and
+            the data to append, or None if the chunk is unusable.
+        """
+        with open(chunk_path, "rb") as chunk_file:
+            data = chunk_file.read()
+
+        if self.response_format == "mp3":
+            return None, strip_mp3_info_frame(strip_id3(data))
+        if self.response_format == "aac":
+            return None, strip_id3(data)
+        if self.response_format == "opus":
+            return None, renumber_ogg_pages(data, 0x54545300 + index)
+        if self.response_format == "wav":
+            fmt, offset = parse_wav(data)
+            if offset is None:
+                logging.error(f"Chunk {chunk_path} is not a valid WAV file, skipped")
+                return None, None
+            return fmt, data[offset:]
+        return None, data
+
+    def _append(self, index, fmt, data):
+        if data is None:
+            self.chunk_sizes.append(0)
+            return
+        if self.response_format == "wav" and self.wav_fmt is None:
+            self.wav_fmt = fmt
+            self.file.write(wav_header(fmt, 0))
+
+        self.file.write(data)
+        self.data_size += len(data)
+        self.chunk_sizes.append(len(data))
+        if self.response_format == "wav":
+            self._rewrite_wav_header()
+        self.file.flush()
+        logging.debug(f"Appended chunk {index} ({len(data)} bytes) to {self.path}")
+
+    def _rewrite_wav_header(self):
+        self.file.seek(0)
+        self.file.write(wav_header(self.wav_fmt, self.data_size))
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self):
+        """
+        Finishes the output file.
+
+        Returns:
+            bool: True if every chunk handed over was appended.
+        """
+        with self.lock:
+            complete = not self.pending
+            if not complete:
+                logging.error(
+                    f"Progressive output stopped at chunk {self.next_index}, "
+                    f"{len(self.pending)} later chunks were not written"
+                )
+            self.file.close()
+            return complete
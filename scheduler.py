@@ -0,0 +1,283 @@
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future
+
+# Speech requests in flight at the same time
+MAX_CONCURRENT_REQUESTS = 8
+# Workers reserved for interactive requests, on top of MAX_CONCURRENT_REQUESTS
+INTERACTIVE_WORKERS = 1
+# Emptied flows whose vtime is remembered before old entries are pruned
+MAX_IDLE_FLOWS = 1024
+# Default request budget per API key (the lowest paid tier of tts-1)
+REQUESTS_PER_MINUTE = 50
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how many requests start per second.
+
+    The bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second; every request takes one token, waiting if the bucket is empty.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cancel_token=None):
+        """
+        Takes a token, waiting until one is available.
+
+        Returns:
+            bool: False if the wait was cancelled.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if cancel_token is None:
+                time.sleep(wait)
+            elif cancel_token.wait(wait):
+                return False
+
+
+class _Flow:
+    """
+    One queue of a fair queue: a user, or a job of a user.
+
+    `vtime` is the service the flow has received divided by its weight; the
+    active flow with the lowest vtime is served next.
+    """
+
+    def __init__(self, weight=1.0):
+        self.weight = weight
+        self.vtime = 0.0
+        self.items = deque()  # requests of a job
+        self.children = {}  # active jobs of a user, or active users
+        self.idle = {}  # vtime of recently emptied children
+        self.clock = 0.0  # vtime of the child served last
+
+    def child(self, key, weight):
+        flow = self.children.get(key)
+        if flow is None:
+            flow = self.children[key] = _Flow(weight)
+            # A flow that was idle gets no credit for the time it was away, and
+            # one that went idle briefly cannot shed the service it received
+            flow.vtime = max(self.clock, self.idle.pop(key, 0.0))
+        return flow
+
+    def retire(self, key):
+        flow = self.children.pop(key)
+        self.idle[key] = flow.vtime
+        if len(self.idle) > MAX_IDLE_FLOWS:
+            self.idle = {k: v for k, v in self.idle.items() if v > self.clock}
+
+
+class FairQueue:
+    """
+    Two-level weighted fair queue: users share the request slots in proportion
+    to their weights, and the jobs of one user share that user's part in
+    proportion to theirs.
+
+    Every request is charged its cost (e.g. its characters) at both levels, so
+    a job of a hundred large chunks cannot hold back a one-chunk job queued
+    after it, yet a lone job still gets every slot.
+    """
+
+    def __init__(self):
+        self.root = _Flow()
+        self.user_weights = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item, user=None, job=None, weight=1.0, cost=1.0):
+        user_flow = self.root.child(user, self.user_weights.get(user, 1.0))
+        user_flow.child(job, weight).items.append((item, cost))
+        self.size += 1
+
+    def pop(self):
+        """Removes the next request, or returns None if the queue is empty."""
+        if not self.size:
+            return None
+        user, user_flow = min(self.root.children.items(), key=lambda kv: kv[1].vtime)
+        job, job_flow = min(user_flow.children.items(), key=lambda kv: kv[1].vtime)
+        item, cost = job_flow.items.popleft()
+        self.size -= 1
+        self.root.clock = user_flow.vtime
+        user_flow.clock = job_flow.vtime
+        user_flow.vtime += cost / user_flow.weight
+        job_flow.vtime += cost / job_flow.weight
+        if not job_flow.items:
+            user_flow.retire(job)
+        if not user_flow.children:
+            self.root.retire(user)
+        return item
+
+    def drain(self):
+        """Removes and returns every queued request."""
+        items = []
+        while self.size:
+            items.append(self.pop())
+        return items
+
+
+class RenderScheduler:
+    """
+    Runs speech requests of any number of renders on one bounded, rate-limited
+    pool, so concurrent renders share the upstream budget instead of each
+    running its chunks serially.
+
+    Queued requests are served by weighted fair queuing across users and their
+    jobs (see FairQueue), so one huge render cannot starve the others. Requests
+    submitted as `interactive`, e.g. the chunks of a streamed preview, skip the
+    queue and have workers of their own, so they never wait for a batch
+    request to finish; batch requests keep every regular worker when no
+    preview is waiting.
+    """
+
+    def __init__(
+        self,
+        max_workers=MAX_CONCURRENT_REQUESTS,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        interactive_workers=INTERACTIVE_WORKERS,
+    ):
+        self.max_workers = max_workers
+        self.interactive_workers = interactive_workers
+        self.limiter = RateLimiter(requests_per_minute / 60.0, burst=max_workers)
+        self.queue = FairQueue()
+        self.interactive = deque()
+        # Regular and preview workers wait apart, so a batch item always wakes
+        # a worker that can take it
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.preview_condition = threading.Condition(self.lock)
+        self.threads = []
+        self.closed = False
+
+    def set_user_weight(self, user, weight):
+        """Gives `user` a `weight` times larger share than a user of weight 1."""
+        with self.condition:
+            self.queue.user_weights[user] = float(weight)
+
+    def _start(self):
+        """Starts the workers on first use, so an idle scheduler costs nothing."""
+        for i in range(self.max_workers + self.interactive_workers):
+            interactive_only = i >= self.max_workers
+            thread = threading.Thread(
+                target=self._work,
+                args=(interactive_only,),
+                name=f"{'preview' if interactive_only else 'synth'}_{i}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _next(self, interactive_only):
+        with self.condition:
+            while True:
+                if self.interactive:
+                    return self.interactive.popleft()
+                if not interactive_only and self.queue:
+                    return self.queue.pop()
+                if self.closed:
+                    return None
+                if interactive_only:
+                    self.preview_condition.wait()
+                else:
+                    self.condition.wait()
+
+    def _work(self, interactive_only):
+        while True:
+            item = self._next(interactive_only)
+            if item is None:
+                return
+            future, context, cancel_token, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = context.run(self._run, cancel_token, fn, args, kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _run(self, cancel_token, fn, args, kwargs):
+        if not self.limiter.acquire(cancel_token):
+            return False
+        return fn(*args, **kwargs)
+
+    def submit(
+        self,
+        fn,
+        *args,
+        cancel_token=None,
+        user=None,
+        job=None,
+        weight=1.0,
+        cost=1.0,
+        interactive=False,
+        **kwargs,
+    ):
+        """
+        Queues a request. `cancel_token` is also passed on to `fn`.
+
+        Args:
+            user (hashable, optional): Who the request is for.
+            job (hashable, optional): The render of `user` it belongs to.
+            weight (float, optional): Share of the job among the user's jobs.
+            cost (float, optional): What the request is charged, e.g. the
+                characters of its chunk.
+            interactive (bool, optional): Run it in the fast lane.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the result of `fn`.
+        """
+        if cancel_token is not None:
+            kwargs["cancel_token"] = cancel_token
+        future = Future()
+        # Run in the submitter's context so log records keep its job ID
+        item = (future, contextvars.copy_context(), cancel_token, fn, args, kwargs)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Cannot submit to a scheduler after shutdown")
+            if not self.threads:
+                self._start()
+            if interactive:
+                self.interactive.append(item)
+                self.preview_condition.notify()
+            else:
+                self.queue.push(item, user, job, weight, cost)
+            self.condition.notify()
+        return future
+
+    def shutdown(self, wait=True):
+        """Stops the workers; without `wait`, queued requests are cancelled."""
+        logging.debug("Shutting down render scheduler")
+        with self.condition:
+            self.closed = True
+            if not wait:
+                queued = list(self.interactive) + self.queue.drain()
+                self.interactive.clear()
+                for future, *_ in queued:
+                    future.cancel()
+            self.condition.notify_all()
+            self.preview_condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
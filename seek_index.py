@@ -0,0 +1,395 @@
+import os
+import struct
+import bisect
+import logging
+import shutil
+
+from containers import (
+    parse_mp3_header,
+    is_mp3_info_frame,
+    id3v2_size,
+    parse_wav,
+)
+from utils import get_audio_duration
+
+# Minimum spacing between two entries of a sidecar index, in seconds
+SEEK_INTERVAL = 1.0
+SIDECAR_SUFFIX = ".seekidx"
+SIDECAR_MAGIC = b"TTSSEEK1"
+SIDECAR_ENTRY = struct.Struct("<IQ")  # milliseconds, byte offset
+
+XING_FLAGS = 0x0F  # frames, bytes, TOC and quality fields present
+XING_TOC_SIZE = 100
+
+ADTS_SAMPLE_RATES = (
+    96000,
+    88200,
+    64000,
+    48000,
+    44100,
+    32000,
+    24000,
+    22050,
+    16000,
+    12000,
+    11025,
+    8000,
+    7350,
+)
+
+READ_SIZE = 1024 * 1024
+
+
+def _read_blocks(file, start):
+    """Yields (absolute offset, bytes) blocks of a file from `start`."""
+    file.seek(start)
+    offset = start
+    while True:
+        block = file.read(READ_SIZE)
+        if not block:
+            return
+        yield offset, block
+        offset += len(block)
+
+
+def _scan_frames(path, start, parse):
+    """
+    Walks fixed-header audio frames without decoding them.
+
+    Args:
+        path (str): The file to scan.
+        start (int): Offset of the first frame.
+        parse (callable): Returns (frame size, samples, sample rate) for the
+            bytes at the start of a frame, or None if they are not a frame.
+
+    Returns:
+        list of tuple: (byte offset, start time in seconds) per frame, and the
+        total duration in seconds.
+    """
+    frames = []
+    elapsed = 0.0
+    with open(path, "rb") as file:
+        buffer = b""
+        buffer_start = start
+        pos = start
+        for _, block in _read_blocks(file, start):
+            buffer += block
+            while True:
+                local = pos - buffer_start
+                if local + 10 > len(buffer):
+                    break
+                frame = parse(buffer[local : local + 10])
+                if frame is None:
+                    # Lost sync: skip ahead to the next candidate sync byte
+                    next_sync = buffer.find(b"\xff", local + 1)
+                    if next_sync == -1:
+                        pos = buffer_start + len(buffer)
+                        break
+                    pos = buffer_start + next_sync
+                    continue
+                size, samples, sample_rate = frame
+                frames.append((pos, elapsed))
+                elapsed += samples / sample_rate
+                pos += size
+            # Keep only the bytes that have not been walked over yet
+            consumed = min(pos - buffer_start, len(buffer))
+            buffer = buffer[consumed:]
+            buffer_start += consumed
+    return frames, elapsed
+
+
+def _parse_mp3_frame(data):
+    header = parse_mp3_header(data[:4])
+    if header is None:
+        return None
+    return header["frame_size"], header["samples"], header["sample_rate"]
+
+
+def _parse_adts_frame(data):
+    if data[0] != 0xFF or (data[1] & 0xF6) != 0xF0:
+        return None
+    rate_index = (data[2] >> 2) & 0x0F
+    if rate_index >= len(ADTS_SAMPLE_RATES):
+        return None
+    size = ((data[3] & 0x03) << 11) | (data[4] << 3) | (data[5] >> 5)
+    blocks = (data[6] & 0x03) + 1
+    if size < 7:
+        return None
+    return size, 1024 * blocks, ADTS_SAMPLE_RATES[rate_index]
+
+
+def scan_mp3(path):
+    """
+    Scans the frame headers of an MP3 file.
+
+    Returns:
+        tuple: (offset of the first frame, Xing/Info frame size or 0,
+        list of (offset, time) per audio frame, duration in seconds).
+    """
+    with open(path, "rb") as file:
+        head = file.read(64 * 1024)
+    start = id3v2_size(head)
+    info_size = 0
+    header = parse_mp3_header(head[start : start + 4])
+    if header and is_mp3_info_frame(head[start : start + header["frame_size"]]):
+        info_size = header["frame_size"]
+    frames, duration = _scan_frames(path, start + info_size, _parse_mp3_frame)
+    return start, info_size, frames, duration
+
+
+def scan_adts(path):
+    """Scans the ADTS frame headers of an AAC file."""
+    with open(path, "rb") as file:
+        start = id3v2_size(file.read(64 * 1024))
+    return _scan_frames(path, start, _parse_adts_frame)
+
+
+def scan_ogg_opus(path):
+    """
+    Scans the page headers of an Ogg Opus file, chained streams included.
+
+    Returns:
+        tuple: list of (page offset, time at the start of the page), and the
+        total duration in seconds.
+    """
+    pages = []
+    base = 0.0
+    last_time = 0.0
+    serial = None
+    with open(path, "rb") as file:
+        offset = 0
+        while True:
+            file.seek(offset)
+            header = file.read(27)
+            if len(header) < 27 or header[:4] != b"OggS":
+                break
+            granule, page_serial = struct.unpack("<qI", header[6:18])
+            lacing = file.read(header[26])
+            if page_serial != serial:
+                # A new link of a chained stream restarts its granule positions
+                serial = page_serial
+                base = last_time
+            pages.append((offset, last_time))
+            if granule >= 0:
+                last_time = base + granule / 48000.0
+            offset += 27 + len(lacing) + sum(lacing)
+    return pages, last_time
+
+
+def media_duration(path):
+    """
+    Returns the exact duration of an audio file from its container headers,
+    falling back to ffprobe for formats that cannot be scanned.
+
+    Args:
+        path (str): Path to the audio file.
+
+    Returns:
+        float: The duration in seconds, or None if unknown.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == ".mp3":
+            return scan_mp3(path)[3]
+        if extension == ".aac":
+            return scan_adts(path)[1]
+        if extension == ".opus":
+            return scan_ogg_opus(path)[1]
+        if extension == ".wav":
+            with open(path, "rb") as file:
+                head = file.read(4096)
+            fmt, offset = parse_wav(head)
+            if fmt and offset:
+                byte_rate = struct.unpack("<I", fmt[8:12])[0]
+                return (os.path.getsize(path) - offset) / byte_rate
+    except OSError as e:
+        logging.error(f"Failed to scan {path}: {e}")
+    return get_audio_duration(path)
+
+
+def _thin(entries, interval=SEEK_INTERVAL):
+    """Keeps one (offset, time) entry per `interval` seconds."""
+    thinned = []
+    next_time = 0.0
+    for offset, time in entries:
+        if time >= next_time:
+            thinned.append((offset, time))
+            next_time = time + interval
+    return thinned
+
+
+def _xing_frame(first_header, frames, duration, total_bytes, audio_start):
+    """Builds a Xing frame carrying a 100-entry TOC for the given frames."""
+    header = bytearray(first_header)
+    header[1] |= 0x01  # no CRC, so the side info directly follows the header
+    info = parse_mp3_header(bytes(header))
+    mpeg1 = info["version"] == 3
+    if mpeg1:
+        side_info = 17 if info["channels"] == 1 else 32
+    else:
+        side_info = 9 if info["channels"] == 1 else 17
+    needed = 4 + side_info + 8 + 8 + XING_TOC_SIZE + 4
+
+    # Pick the smallest bitrate whose frame can hold the Xing payload
+    for index in range(1, 15):
+        header[2] = (header[2] & 0x0D) | (index << 4)  # no padding, same rate
+        size = parse_mp3_header(bytes(header))["frame_size"]
+        if size >= needed:
+            break
+    else:
+        return None
+
+    times = [time for _, time in frames]
+    stream_bytes = total_bytes + size
+    toc = bytearray()
+    for percent in range(XING_TOC_SIZE):
+        position = bisect.bisect_left(times, duration * percent / 100)
+        position = min(position, len(frames) - 1)
+        offset = frames[position][0] - audio_start + size
+        toc.append(min(255, offset * 256 // stream_bytes))
+
+    frame = bytearray(size)
+    frame[:4] = header
+    pos = 4 + side_info
+    frame[pos : pos + 4] = b"Xing"
+    struct.pack_into(">III", frame, pos + 4, XING_FLAGS, len(frames), stream_bytes)
+    frame[pos + 16 : pos + 16 + XING_TOC_SIZE] = toc
+    struct.pack_into(">I", frame, pos + 16 + XING_TOC_SIZE, 0)
+    return bytes(frame)
+
+
+def write_mp3_toc(path):
+    """
+    Gives an MP3 file a Xing header with a seek TOC, replacing an existing
+    Xing/Info frame or inserting a new one after the ID3 tag.
+
+    Args:
+        path (str): Path to the MP3 file.
+
+    Returns:
+        bool: True if the file now carries a TOC.
+    """
+    start, info_size, frames, duration = scan_mp3(path)
+    if not frames:
+        logging.error(f"No MP3 frames found in {path}")
+        return False
+    with open(path, "rb") as file:
+        file.seek(frames[0][0])
+        first_header = file.read(4)
+    audio_start = frames[0][0]
+    total_bytes = os.path.getsize(path) - audio_start
+    frame = _xing_frame(first_header, frames, duration, total_bytes, audio_start)
+    if frame is None:
+        logging.error(f"Cannot build a Xing frame for {path}")
+        return False
+
+    if info_size == len(frame):
+        with open(path, "r+b") as file:
+            file.seek(start)
+            file.write(frame)
+    else:
+        temp_path = f"{path}.toc.tmp"
+        with open(path, "rb") as source, open(temp_path, "wb") as target:
+            target.write(source.read(start))
+            target.write(frame)
+            source.seek(audio_start)
+            shutil.copyfileobj(source, target, READ_SIZE)
+        os.replace(temp_path, path)
+    logging.info(f"Wrote Xing TOC for {len(frames)} frames to {path}")
+    return True
+
+
+def write_sidecar(path, entries):
+    """
+    Writes a time-to-byte-offset sidecar index next to an audio file.
+
+    Args:
+        path (str): Path to the audio file.
+        entries (list of tuple): (byte offset, time in seconds), sorted.
+
+    Returns:
+        str: Path of the sidecar file.
+    """
+    sidecar = path + SIDECAR_SUFFIX
+    with open(sidecar, "wb") as file:
+        file.write(SIDECAR_MAGIC)
+        file.write(struct.pack("<I", len(entries)))
+        for offset, time in entries:
+            file.write(SIDECAR_ENTRY.pack(int(round(time * 1000)), offset))
+    logging.info(f"Wrote seek index with {len(entries)} entries to {sidecar}")
+    return sidecar
+
+
+def write_seek_index(path):
+    """
+    Emits the seek table suited to the output format: a Xing TOC inside MP3
+    files and a sidecar index for AAC and Ogg Opus. WAV/PCM are seekable by
+    arithmetic and FLAC carries the SEEKTABLE written by ffmpeg.
+
+    Args:
+        path (str): Path to the rendered output.
+
+    Returns:
+        bool: True if an index was written.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == ".mp3":
+            return write_mp3_toc(path)
+        if extension == ".aac":
+            frames, _ = scan_adts(path)
+        elif extension == ".opus":
+            frames, _ = scan_ogg_opus(path)
+        else:
+            return False
+        write_sidecar(path, _thin(frames))
+        return True
+    except OSError as e:
+        logging.error(f"Failed to write seek index for {path}: {e}")
+        return False
+
+
+class SeekIndex:
+    """Sidecar time-to-byte-offset index with O(log n) lookups."""
+
+    def __init__(self, times_ms, offsets):
+        self.times_ms = times_ms
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the sidecar index of an audio file.
+
+        Args:
+            path (str): Path to the audio file (not the sidecar).
+
+        Returns:
+            SeekIndex: The index, or None if there is no valid sidecar.
+        """
+        try:
+            with open(path + SIDECAR_SUFFIX, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if data[:8] != SIDECAR_MAGIC:
+            return None
+        (count,) = struct.unpack_from("<I", data, 8)
+        times_ms, offsets = [], []
+        for time_ms, offset in SIDECAR_ENTRY.iter_unpack(
+            data[12 : 12 + count * SIDECAR_ENTRY.size]
+        ):
+            times_ms.append(time_ms)
+            offsets.append(offset)
+        return cls(times_ms, offsets)
+
+    def offset_for(self, seconds):
+        """Returns (byte offset, exact time) of the last entry at or before `seconds`."""
+        position = bisect.bisect_right(self.times_ms, int(seconds * 1000)) - 1
+        position = max(position, 0)
+        return self.offsets[position], self.times_ms[position] / 1000
+
+    def time_for(self, offset):
+        """Returns the time of the last entry at or before a byte offset."""
+        position = max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+        return self.times_ms[position] / 1000
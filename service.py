@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from tts import process_tts, post_speech, render_scheduler, upstream_bandwidth
+from format_plan import plan_formats
+from cancel import CancelToken
+from log_setup import log_context
+from utils import split_text
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Batch renders executed at the same time; further jobs wait in the queue
+MAX_CONCURRENT_JOBS = 4
+# Seconds a finished job and its audio are kept for the client to fetch
+JOB_TTL = 3600
+
+CONTENT_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "application/octet-stream",
+}
+# Formats whose chunks joined back to back are one valid stream; WAV and FLAC
+# chunks each start with a header of their own
+STREAM_FORMATS = ("mp3", "opus", "aac", "pcm")
+
+
+class _Signal:
+    """Minimal stand-in for a Qt signal, so process_tts can report to a job."""
+
+    def __init__(self, callback):
+        self.emit = callback
+
+
+class ServiceJob:
+    """State of one batch render submitted to the service."""
+
+    def __init__(self, job_id, params, output_path):
+        self.id = job_id
+        self.params = params
+        self.output_path = output_path
+        self.status = "queued"
+        self.progress = 0
+        self.eta = "--"
+        self.error = None
+        self.finished_at = None
+        self.cancel_token = CancelToken()
+        self.progress_updated = _Signal(self._set_progress)
+        self.eta_updated = _Signal(self._set_eta)
+
+    def _set_progress(self, value):
+        self.progress = value
+
+    def _set_eta(self, value):
+        self.eta = value
+
+    def show_message(self, message):
+        self.error = message
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "eta": self.eta,
+            "error": self.error,
+        }
+
+
+class RenderService:
+    """
+    Runs batch renders for HTTP clients on a bounded pool of job threads.
+
+    Every job shares the process-wide upstream connection pool, API key pool
+    and synthesis cache of the `tts` module, so clients do not each start their
+    own interpreter and GUI stack. Finished jobs are dropped with their files
+    `job_ttl` seconds after they finish, unless the client deletes them first.
+    """
+
+    def __init__(self, work_dir=None, max_jobs=MAX_CONCURRENT_JOBS, job_ttl=JOB_TTL):
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="tts_service_")
+        self.job_ttl = job_ttl
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="render"
+        )
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, params):
+        self.evict_expired()
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.work_dir, job_id)
+        os.makedirs(job_dir)
+        output_path = os.path.join(job_dir, f"output.{params['format']}")
+        job = ServiceJob(job_id, params, output_path)
+        with self.lock:
+            self.jobs[job_id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        self.evict_expired()
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def evict_expired(self):
+        """Drops the jobs that finished more than `job_ttl` seconds ago."""
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                job
+                for job in self.jobs.values()
+                if job.finished_at is not None and now - job.finished_at > self.job_ttl
+            ]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            logging.info(
+                f"Dropping service job {job.id}, finished {self.job_ttl} s ago"
+            )
+            shutil.rmtree(os.path.dirname(job.output_path), ignore_errors=True)
+
+    def delete(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job:
+            job.cancel_token.cancel()
+            shutil.rmtree(os.path.dirname(job.output_path), ignore_errors=True)
+        return job
+
+    def _run(self, job):
+        job.status = "running"
+        params = job.params
+        try:
+            with log_context(job_id=job.id):
+                chunks = split_text(params["text"])
+                plan = plan_formats(
+                    [params["format"]],
+                    sum(len(chunk) for chunk in chunks),
+                    bandwidth=upstream_bandwidth,
+                )
+                ok = process_tts(
+                    chunks,
+                    job.output_path,
+                    params["model"],
+                    params["voice"],
+                    plan.upstream,
+                    params["speed"],
+                    False,
+                    job,
+                    cancel_token=job.cancel_token,
+                    user=params["user"],
+                    job=job.id,
+                    output_format=params["format"],
+                )
+            if job.cancel_token.is_cancelled():
+                job.status = "cancelled"
+            else:
+                job.status = "done" if ok else "failed"
+        except Exception as e:
+            logging.exception(f"Service job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.monotonic()
+
+
+def parse_params(body):
+    """
+    Validates the JSON body of a render request.
+
+    Returns:
+        dict: The normalized parameters.
+
+    Raises:
+        ValueError: If the body is invalid.
+    """
+    params = json.loads(body or b"{}")
+    if not isinstance(params, dict):
+        raise ValueError("The body must be a JSON object")
+    text = str(params.get("text", "")).strip()
+    if not text:
+        raise ValueError("`text` is required")
+    response_format = params.get("format", "mp3")
+    if response_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported format {response_format!r}")
+    try:
+        speed = float(params.get("speed", 1.0))
+    except (TypeError, ValueError):
+        raise ValueError("`speed` must be a number")
+    return {
+        "text": text,
+        "model": params.get("model", "tts-1"),
+        "voice": params.get("voice", "alloy"),
+        "format": response_format,
+        "speed": speed,
+        "user": str(params.get("user", "")),
+    }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+        POST   /jobs             submit a batch render, returns its status
+        GET    /jobs/<id>        job status, progress and ETA
+        GET    /jobs/<id>/audio  fetch the finished audio file
+        DELETE /jobs/<id>        drop a job and its files
+        POST   /stream           synthesize and stream audio chunk by chunk
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_from_path(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "jobs":
+            return None, parts
+        return self.service.get(parts[1]), parts
+
+    def do_POST(self):
+        try:
+            params = parse_params(self._read_body())
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if self.path == "/jobs":
+            job = self.service.submit(params)
+            self._send_json(202, job.to_dict())
+        elif self.path == "/stream":
+            self._stream(params)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_GET(self):
+        job, parts = self._job_from_path()
+        if job is None:
+            self._send_json(404, {"error": "Unknown job"})
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[2] == "audio":
+            self._send_audio(job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_DELETE(self):
+        job, parts = self._job_from_path()
+        if job is None or len(parts) != 2:
+            self._send_json(404, {"error": "Unknown job"})
+            return
+        self.service.delete(job.id)
+        self._send_json(200, {"id": job.id, "status": "deleted"})
+
+    def _send_audio(self, job):
+        if job.status != "done":
+            self._send_json(409, job.to_dict())
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[job.params["format"]])
+        self.send_header("Content-Length", str(os.path.getsize(job.output_path)))
+        self.end_headers()
+        with open(job.output_path, "rb") as file:
+            shutil.copyfileobj(file, self.wfile)
+
+    def _speech(self, params, chunk):
+        """
+        Requests one chunk upstream.
+
+        Returns:
+            requests.Response: The streaming response, or None if it failed.
+        """
+        try:
+            response = render_scheduler.submit(
+                post_speech,
+                {
+                    "model": params["model"],
+                    "input": chunk,
+                    "voice": params["voice"],
+                    "response_format": params["format"],
+                    "speed": params["speed"],
+                },
+                interactive=True,
+            ).result()
+        except requests.RequestException as e:
+            logging.error(f"Upstream request failed while streaming: {e}")
+            return None
+        if response is None or response.status_code != 200:
+            logging.error("Upstream request failed while streaming")
+            if response is not None:
+                response.close()
+            return None
+        return response
+
+    def _stream(self, params):
+        """Relays upstream audio to the client as each chunk arrives."""
+        if params["format"] not in STREAM_FORMATS:
+            self._send_json(
+                400,
+                {
+                    "error": f"Cannot stream {params['format']!r}; use one of "
+                    f"{', '.join(STREAM_FORMATS)}"
+                },
+            )
+            return
+        chunks = split_text(params["text"])
+        # The status is only sent once the first chunk is known to be coming
+        response = self._speech(params, chunks[0])
+        if response is None:
+            self._send_json(502, {"error": "Upstream request failed"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[params["format"]])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            if i:
+                response = self._speech(params, chunk)
+            if response is None:
+                # Drop the connection without the final chunk, so the client
+                # cannot mistake the partial stream for a complete one
+                self.close_connection = True
+                return
+            try:
+                for block in response.iter_content(chunk_size=8192):
+                    if block:
+                        self.wfile.write(f"{len(block):X}\r\n".encode())
+                        self.wfile.write(block)
+                        self.wfile.write(b"\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                logging.info("Streaming client disconnected")
+                self.close_connection = True
+                return
+            except requests.RequestException as e:
+                logging.error(f"Upstream stream broke off: {e}")
+                self.close_connection = True
+                return
+            finally:
+                response.close()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    max_jobs=MAX_CONCURRENT_JOBS,
+    user_weights=None,
+):
+    """
+    Runs the render service until interrupted.
+
+    Args:
+        host (str, optional): Interface to bind.
+        port (int, optional): TCP port to listen on.
+        max_jobs (int, optional): Batch renders executed at the same time.
+        user_weights (dict, optional): User -> share of the request slots
+            relative to users of weight 1.
+    """
+    for user, weight in (user_weights or {}).items():
+        render_scheduler.set_user_weight(user, weight)
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = RenderService(max_jobs=max_jobs)
+    logging.info(f"Render service listening on http://{host}:{port}")
+    print(f"Render service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
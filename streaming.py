@@ -0,0 +1,153 @@
+import logging
+import subprocess
+from threading import Thread
+
+# Compressed format requested for "Stream and Play": roughly a tenth of the
+# bytes of WAV, and decodable from the first Ogg page on
+STREAM_FORMAT = "opus"
+PCM_SAMPLE_RATE = 24000
+# Largest PCM block handed to the sink at once: 100 ms of 16-bit mono
+PCM_BLOCK_BYTES = PCM_SAMPLE_RATE // 10 * 2
+
+# ffmpeg demuxer reading each response format from a pipe
+DEMUXERS = {
+    "opus": "ogg",
+    "mp3": "mp3",
+    "aac": "aac",
+    "flac": "flac",
+    "wav": "wav",
+    "pcm": "s16le",
+}
+
+
+def _feed(process, byte_blocks):
+    """Writes the compressed bytes into the decoder as they arrive."""
+    try:
+        for block in byte_blocks:
+            if block:
+                process.stdin.write(block)
+                process.stdin.flush()
+    except (BrokenPipeError, OSError, ValueError):
+        # The decoder was stopped early, e.g. playback was aborted
+        pass
+    except Exception as e:
+        logging.error(f"Error while downloading streamed audio: {e}")
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+
+def decode_stream(byte_blocks, input_format=STREAM_FORMAT):
+    """
+    Decodes a compressed audio stream into PCM while it is still downloading.
+
+    A feeder thread pushes the downloaded bytes into an ffmpeg pipe, and the
+    PCM is yielded as soon as ffmpeg produces it, so playback can start after
+    the first packets instead of after the whole response.
+
+    Args:
+        byte_blocks (iterable of bytes): The response body, e.g. iter_content().
+        input_format (str): The response format.
+
+    Yields:
+        bytes: 16-bit mono PCM at PCM_SAMPLE_RATE, at most PCM_BLOCK_BYTES each.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-f",
+        DEMUXERS[input_format],
+    ]
+    if input_format == "pcm":
+        command += ["-ar", str(PCM_SAMPLE_RATE), "-ac", "1"]
+    command += [
+        "-i",
+        "pipe:0",
+        "-f",
+        "s16le",
+        "-ar",
+        str(PCM_SAMPLE_RATE),
+        "-ac",
+        "1",
+        "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    feeder = Thread(target=_feed, args=(process, byte_blocks), daemon=True)
+    feeder.start()
+    try:
+        pending = b""
+        while True:
+            data = process.stdout.read1(PCM_BLOCK_BYTES)
+            if not data:
+                break
+            # Keep whole samples together
+            data = pending + data
+            usable = len(data) - len(data) % 2
+            pending = data[usable:]
+            if usable:
+                yield data[:usable]
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        feeder.join(timeout=1.0)
+
+
+class PcmSink:
+    """
+    Plays raw PCM blocks as they are written, through an ffplay process.
+
+    Writes block while ffplay's buffer is full, which in turn holds back the
+    decoder and the download; not writing simply lets playback run dry.
+    """
+
+    def __init__(self, sample_rate=PCM_SAMPLE_RATE):
+        self.process = subprocess.Popen(
+            [
+                "ffplay",
+                "-nodisp",
+                "-autoexit",
+                "-loglevel",
+                "error",
+                "-f",
+                "s16le",
+                "-sample_rate",
+                str(sample_rate),
+                "-i",
+                "pipe:0",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def write(self, block):
+        """
+        Returns:
+            bool: False if the player is gone.
+        """
+        try:
+            self.process.stdin.write(block)
+            self.process.stdin.flush()
+            return True
+        except (BrokenPipeError, OSError, ValueError):
+            return False
+
+    def close(self, abort=False):
+        """Waits until the written audio has played, or stops at once if aborting."""
+        if abort:
+            self.process.kill()
+        else:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        self.process.wait()
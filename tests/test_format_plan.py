@@ -0,0 +1,26 @@
+import pytest
+
+from format_plan import plan_formats
+
+
+@pytest.mark.parametrize("bandwidth", [1e6, 4 * 1024 * 1024, 5e6, 5e7])
+@pytest.mark.parametrize("primary", ["wav", "pcm"])
+def test_assembled_formats_are_requested_as_they_are(primary, bandwidth):
+    # WAV and PCM chunks are assembled in place, which a smaller upstream
+    # format would forgo
+    assert plan_formats([primary], 20000, bandwidth=bandwidth).upstream == primary
+
+
+def test_assembled_primary_keeps_its_format_with_extra_outputs():
+    plan = plan_formats(["wav", "mp3"], 20000)
+    assert plan.upstream == "wav"
+    assert plan.transcoded == ["mp3"]
+
+
+def test_lossy_primary_is_not_encoded_from_another_lossy_format():
+    # Opus is the smallest download, but re-encoding it would cost quality
+    assert plan_formats(["mp3"], 20000, bandwidth=1e3).upstream == "mp3"
+
+
+def test_fixed_plan_requests_the_primary_format():
+    assert plan_formats(["flac", "mp3"], 20000, fixed=True).upstream == "flac"
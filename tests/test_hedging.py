@@ -0,0 +1,60 @@
+import contextvars
+
+from hedging import Hedger
+from scheduler import RenderScheduler
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def make_hedger():
+    hedger = Hedger(percentile=90, budget=1.0, burst=2)
+    for _ in range(30):
+        hedger.tracker.record(1000, 0.02)
+    return hedger
+
+
+def test_straggler_is_hedged_through_the_given_scheduler():
+    scheduler = RenderScheduler(max_workers=2, interactive_workers=0)
+    submitted = []
+
+    def submit(fn, **kwargs):
+        submitted.append(fn)
+        return scheduler.submit(fn, **kwargs)
+
+    def attempt(index, token):
+        return not token.wait(2.0 if index == 0 else 0.01)
+
+    try:
+        assert make_hedger().run(attempt, 1000, submit) == 1
+    finally:
+        scheduler.shutdown()
+    assert len(submitted) == 1
+
+
+def test_hedge_keeps_the_context_of_the_request():
+    scheduler = RenderScheduler(max_workers=2, interactive_workers=0)
+    seen = {}
+
+    def attempt(index, token):
+        seen[index] = request_id.get()
+        return not token.wait(2.0 if index == 0 else 0.01)
+
+    def run():
+        request_id.set("chunk-7")
+        return make_hedger().run(attempt, 1000, scheduler.submit)
+
+    try:
+        assert contextvars.copy_context().run(run) == 1
+    finally:
+        scheduler.shutdown()
+    assert seen == {0: "chunk-7", 1: "chunk-7"}
+
+
+def test_fast_request_is_not_hedged():
+    scheduler = RenderScheduler(max_workers=2, interactive_workers=0)
+    hedger = make_hedger()
+    try:
+        assert hedger.run(lambda index, token: True, 1000, scheduler.submit) == 0
+    finally:
+        scheduler.shutdown()
+    assert hedger.hedged == 0
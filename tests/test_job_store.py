@@ -0,0 +1,58 @@
+import pytest
+
+import job_store
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def submit(store, tmp_path, chunks=("one", "two")):
+    return store.submit_job(
+        list(chunks), str(tmp_path / "out.mp3"), "tts-1", "alloy", "mp3", 1.0
+    )
+
+
+def test_tasks_are_claimed_in_order_once(store, tmp_path):
+    job_id = submit(store, tmp_path)
+    first = store.claim_task("a")
+    second = store.claim_task("b")
+    assert (first["job_id"], first["idx"]) == (job_id, 0)
+    assert (second["job_id"], second["idx"]) == (job_id, 1)
+    assert store.claim_task("c") is None
+
+
+def test_expired_lease_is_taken_over(store, tmp_path):
+    job_id = submit(store, tmp_path, ["one"])
+    store.claim_task("a", lease=-1)
+    task = store.claim_task("b")
+    assert (task["job_id"], task["idx"]) == (job_id, 0)
+    # The first worker lost the task and can no longer renew or complete it
+    assert not store.heartbeat(job_id, 0, "a")
+    assert not store.complete_task(job_id, 0, "a", "segment")
+    assert store.complete_task(job_id, 0, "b", "segment")
+    assert store.job_progress(job_id) == {"done": 1}
+
+
+def test_released_task_is_claimed_again(store, tmp_path):
+    job_id = submit(store, tmp_path, ["one"])
+    store.claim_task("a")
+    store.release_task(job_id, 0, "a")
+    assert store.claim_task("b")["idx"] == 0
+
+
+def test_task_is_given_up_after_max_attempts(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "MAX_ATTEMPTS", 2)
+    job_id = submit(store, tmp_path, ["one"])
+    for worker_id in ("a", "b"):
+        store.claim_task(worker_id, lease=-1)
+    assert store.claim_task("c") is None
+    assert store.get_job(job_id)["status"] == "failed"
+    assert store.job_progress(job_id) == {"failed": 1}
+
+
+def test_empty_job_is_rejected(store, tmp_path):
+    with pytest.raises(ValueError):
+        submit(store, tmp_path, [])
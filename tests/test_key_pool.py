@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from cancel import CancelToken
+from key_pool import KeyPool, parse_reset_duration, DEFAULT_COOLDOWN
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("1s", 1.0),
+        ("6m0s", 360.0),
+        ("20ms", 0.02),
+        ("1h2m3.5s", 3723.5),
+        ("7", 7.0),
+        ("", None),
+        (None, None),
+        ("soon", None),
+    ],
+)
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def test_acquire_prefers_the_key_with_most_quota():
+    pool = KeyPool(["key-a", "key-b"])
+    key = pool.acquire()
+    pool.release(key, 200, {"x-ratelimit-remaining-requests": "3"})
+    other = pool.acquire()
+    assert other != key
+    pool.release(other, 200, {"x-ratelimit-remaining-requests": "40"})
+    assert pool.acquire() == other
+
+
+def test_in_flight_requests_spread_over_keys():
+    pool = KeyPool(["key-a", "key-b"])
+    assert {pool.acquire(), pool.acquire()} == {"key-a", "key-b"}
+
+
+def test_throttled_key_cools_down(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("key_pool.time.monotonic", lambda: now[0])
+    pool = KeyPool(["key-a", "key-b"])
+    pool.release("key-a", 429, {"retry-after": "5"})
+    pool.release("key-b", 429, {})
+    assert pool.acquire(timeout=0) is None
+    now[0] += 5
+    assert pool.acquire(timeout=0) == "key-a"
+    now[0] += DEFAULT_COOLDOWN
+    assert pool.acquire(timeout=0) == "key-b"
+
+
+def test_exhausted_quota_waits_for_the_reset(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("key_pool.time.monotonic", lambda: now[0])
+    pool = KeyPool(["key-a"])
+    key = pool.acquire()
+    pool.release(
+        key,
+        200,
+        {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"},
+    )
+    assert pool.acquire(timeout=0) is None
+    now[0] = 2.0
+    assert pool.acquire(timeout=0) == "key-a"
+
+
+def test_rejected_key_is_removed():
+    pool = KeyPool(["key-a", "key-b"])
+    pool.release("key-a", 401)
+    assert len(pool) == 1
+    assert pool.acquire() == "key-b"
+    pool.release("key-b", 403)
+    assert pool.acquire() is None
+    pool.add_key("key-a")
+    assert pool.acquire() == "key-a"
+
+
+def test_cancel_ends_the_wait_for_a_key():
+    pool = KeyPool(["key-a"])
+    pool.release("key-a", 429, {"retry-after": "60"})
+    token = CancelToken()
+    result = []
+    waiter = threading.Thread(
+        target=lambda: result.append(pool.acquire(cancel_token=token))
+    )
+    waiter.start()
+    token.cancel()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert result == [None]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import loudness
+from loudness import LoudnessNormalizer, integrated_loudness
+
+
+def blocks_at(lufs, count=50):
+    return np.full(count, 10 ** ((lufs + 0.691) / 10))
+
+
+@pytest.fixture
+def render(monkeypatch):
+    """Chunks are names mapped to (loudness, peak); returns the gains applied."""
+    levels = {}
+    applied = {}
+    monkeypatch.setattr(
+        loudness,
+        "measure_blocks",
+        lambda path: (blocks_at(levels[path][0]), levels[path][1]),
+    )
+    monkeypatch.setattr(
+        loudness,
+        "apply_gain",
+        lambda path, gain: applied.__setitem__(path, round(gain, 2)) or True,
+    )
+
+    def run(chunks):
+        levels.update(chunks)
+        normalizer = LoudnessNormalizer(target=-16.0, max_workers=4)
+        for path in chunks:
+            normalizer.submit(path)
+        assert normalizer.wait()
+        return applied
+
+    return run
+
+
+def test_integrated_loudness_of_constant_blocks():
+    assert integrated_loudness(blocks_at(-20.0)) == pytest.approx(-20.0)
+    assert integrated_loudness(np.empty(0)) is None
+
+
+def test_one_gain_for_the_whole_render(render):
+    applied = render({"a": (-20.0, -10.0), "b": (-20.1, -10.0), "c": (-19.9, -10.0)})
+    assert applied == {"a": 4.0, "b": 4.0, "c": 4.0}
+
+
+def test_quiet_chunk_is_not_boosted_on_its_own(render):
+    applied = render({"a": (-20.0, -10.0), "b": (-26.0, -10.0)})
+    # The render as a whole got quieter, so the running gain moves a little,
+    # rather than lifting the quiet chunk all the way to the target
+    assert applied["a"] == 4.0
+    assert 4.0 < applied["b"] < 10.0
+
+
+def test_chunk_that_would_clip_is_held_back(render):
+    applied = render({"a": (-20.0, -10.0), "b": (-20.0, -2.0)})
+    assert applied == {"a": 4.0, "b": 1.0}
+
+
+def test_negligible_gain_is_not_applied(render):
+    assert render({"a": (-16.1, -10.0), "b": (-15.95, -10.0)}) == {}
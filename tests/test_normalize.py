@@ -0,0 +1,57 @@
+import re
+
+from normalize import compile_boilerplate, DEFAULT_BOILERPLATE, normalize_text
+
+BOILERPLATE = compile_boilerplate(DEFAULT_BOILERPLATE)
+
+
+def normalize(text):
+    return normalize_text(text, BOILERPLATE)
+
+
+def test_running_headers_at_page_breaks_are_dropped():
+    pages = [
+        f"The Long Road\nChapter text number {i} goes on here.\n{i}" for i in range(4)
+    ]
+    result = normalize("\n".join(pages))
+    assert "The Long Road" not in result.text
+    assert result.dropped_lines["The Long Road"] == 4
+    assert "Chapter text number 3 goes on here." in result.text
+
+
+def test_form_feeds_mark_page_edges():
+    pages = [f"Annual Report\nBody of page {i} in full sentences." for i in range(3)]
+    assert "Annual Report" not in normalize("\n\f".join(pages)).text
+
+
+def test_repeated_lines_within_a_page_are_kept():
+    script = "\n".join(
+        ["Intro line that sets the scene."]
+        + [
+            f"ALICE\nLine {i} of the dialogue goes here\nBOB\nReply {i}"
+            for i in range(5)
+        ]
+        + ["The end."]
+    )
+    text = normalize(script).text
+    assert text.count("ALICE") == 5
+    assert text.count("BOB") == 5
+
+
+def test_markup_is_removed():
+    text = normalize(
+        "# Title\n\nSome **bold** and [a link](http://x.y) <b>here</b>."
+    ).text
+    assert text == "Title\n\nSome bold and a link here."
+
+
+def test_intraword_delimiters_are_kept():
+    assert normalize("snake_case_name and 2*3*4").text == "snake_case_name and 2*3*4"
+
+
+def test_offsets_map_back_to_the_source():
+    source = "Page 1\n**Hello** world"
+    result = normalize(source)
+    offset = result.text.index("world")
+    assert source[result.offset_map.to_source(offset) :].startswith("world")
+    assert re.fullmatch(r"Hello world", result.text)
@@ -0,0 +1,46 @@
+import pytest
+
+from pauses import plan_pauses, MAX_PAUSE
+
+
+def test_markers_split_chunks_and_become_silence():
+    text = "Hello there. [pause 2s] How are you? [pause 500ms] Fine."
+    plan = plan_pauses(text, paragraph_pause=0)
+    assert plan.chunks == ["Hello there.", "How are you?", "Fine."]
+    assert plan.pauses == [2.0, 0.5, 0.0]
+    assert [text[o:].startswith(c) for o, c in zip(plan.offsets, plan.chunks)] == [
+        True
+    ] * 3
+    assert plan.chars_saved == len(text) - sum(map(len, plan.chunks))
+
+
+def test_runs_of_markers_add_up_and_are_capped():
+    plan = plan_pauses("One. [pause] [break 1.5] Two. [pause 99s] Three.")
+    assert plan.pauses == [pytest.approx(2.5), MAX_PAUSE, 0.0]
+
+
+def test_edge_breaks_are_dropped():
+    plan = plan_pauses("[pause 3s]\n\nOnly this.\n\n[pause]")
+    assert plan.chunks == ["Only this."]
+    assert plan.pauses == [0.0]
+
+
+def test_short_paragraphs_share_a_chunk():
+    text = "First paragraph.\n\nSecond paragraph."
+    plan = plan_pauses(text, paragraph_pause=0.75)
+    assert plan.chunks == [text]
+    assert plan.pauses == [0.0]
+
+
+def test_chunks_end_at_blank_lines_with_a_pause():
+    paragraphs = ["a" * 30 + ".", "b" * 30 + ".", "c" * 30 + "."]
+    plan = plan_pauses("\n\n".join(paragraphs), paragraph_pause=0.75, chunk_size=70)
+    assert plan.chunks == ["\n\n".join(paragraphs[:2]), paragraphs[2]]
+    assert plan.pauses == [0.75, 0.0]
+
+
+def test_text_without_breaks_is_one_chunk():
+    plan = plan_pauses("  Just one line.  ")
+    assert plan.chunks == ["Just one line."]
+    assert plan.offsets == [2]
+    assert plan.total_pause == 0
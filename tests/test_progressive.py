@@ -0,0 +1,49 @@
+import struct
+
+from containers import ogg_crc
+from progressive import ProgressiveWriter, renumber_ogg_pages
+
+
+def ogg_page(serial, body):
+    header = bytearray(b"OggS" + bytes(2) + bytes(8))
+    header += struct.pack("<III", serial, 0, 0)
+    header += bytes([1, len(body)])
+    page = header + body
+    struct.pack_into("<I", page, 22, ogg_crc(page))
+    return bytes(page)
+
+
+def test_ogg_crc_check_value():
+    # CRC-32/CKSUM without its final XOR
+    assert ogg_crc(b"123456789") == 0x89A1897F
+
+
+def test_renumbered_pages_keep_a_valid_crc():
+    data = ogg_page(7, b"first") + ogg_page(7, b"second")
+    out = renumber_ogg_pages(data, 42)
+    assert len(out) == len(data)
+    pos = 0
+    while pos < len(out):
+        size = 28 + out[pos + 27]
+        page = bytearray(out[pos : pos + size])
+        assert struct.unpack_from("<I", page, 14)[0] == 42
+        crc = struct.unpack_from("<I", page, 22)[0]
+        struct.pack_into("<I", page, 22, 0)
+        assert ogg_crc(page) == crc
+        pos += size
+
+
+def test_chunks_are_appended_in_playback_order(tmp_path):
+    chunks = []
+    for i in range(3):
+        chunk = tmp_path / f"chunk_{i}.pcm"
+        chunk.write_bytes(bytes([i]) * 4)
+        chunks.append(str(chunk))
+    output = tmp_path / "out.pcm"
+    writer = ProgressiveWriter(str(output), "pcm")
+    writer.add(2, chunks[2])
+    writer.add(0, chunks[0])
+    assert output.read_bytes() == bytes(4)
+    writer.add(1, chunks[1])
+    assert writer.close()
+    assert output.read_bytes() == bytes(4) + bytes([1]) * 4 + bytes([2]) * 4
@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from cancel import CancelToken
+from scheduler import FairQueue, RateLimiter, RenderScheduler
+
+
+def test_fair_queue_alternates_between_jobs():
+    queue = FairQueue()
+    for i in range(3):
+        queue.push(f"a{i}", job="a")
+    for i in range(3):
+        queue.push(f"b{i}", job="b")
+    assert queue.drain() == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_fair_queue_charges_cost():
+    queue = FairQueue()
+    queue.push("big", job="a", cost=100)
+    queue.push("big2", job="a", cost=100)
+    for i in range(3):
+        queue.push(f"small{i}", job="b", cost=10)
+    assert queue.drain() == ["big", "small0", "small1", "small2", "big2"]
+
+
+def test_fair_queue_shares_between_users_by_weight():
+    queue = FairQueue()
+    queue.user_weights["heavy"] = 2.0
+    for i in range(4):
+        queue.push(("heavy", i), user="heavy")
+        queue.push(("light", i), user="light")
+    order = [user for user, _ in queue.drain()]
+    assert order[:6].count("heavy") == 4
+
+
+def test_fair_queue_gives_no_credit_for_idle_time():
+    queue = FairQueue()
+    for i in range(5):
+        queue.push(f"a{i}", job="a")
+    assert [queue.pop() for _ in range(4)] == ["a0", "a1", "a2", "a3"]
+    for i in range(3):
+        queue.push(f"b{i}", job="b")
+    # The late job competes from now on instead of catching up first
+    assert queue.drain() == ["b0", "a4", "b1", "b2"]
+
+
+def test_fair_queue_pop_empty():
+    queue = FairQueue()
+    assert queue.pop() is None
+    assert len(queue) == 0
+
+
+def test_rate_limiter_spends_the_burst_then_waits(monkeypatch):
+    limiter = RateLimiter(rate=1.0, burst=2)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        limiter.updated -= seconds
+
+    monkeypatch.setattr("scheduler.time.sleep", sleep)
+    assert limiter.acquire() and limiter.acquire()
+    assert sleeps == []
+    assert limiter.acquire()
+    assert sleeps and sleeps[0] == pytest.approx(1.0, abs=0.05)
+
+
+def test_rate_limiter_wait_can_be_cancelled():
+    limiter = RateLimiter(rate=0.01, burst=1)
+    assert limiter.acquire()
+    token = CancelToken()
+    token.cancel()
+    assert limiter.acquire(token) is False
+
+
+def test_scheduler_runs_and_passes_the_token():
+    scheduler = RenderScheduler(max_workers=2, requests_per_minute=6000)
+    token = CancelToken()
+    try:
+        future = scheduler.submit(
+            lambda x, cancel_token: (x, cancel_token), 1, cancel_token=token
+        )
+        assert future.result(timeout=5) == (1, token)
+    finally:
+        scheduler.shutdown()
+
+
+def test_interactive_requests_skip_the_busy_workers():
+    scheduler = RenderScheduler(max_workers=1, requests_per_minute=6000)
+    release = threading.Event()
+    try:
+        batch = scheduler.submit(release.wait, 5)
+        preview = scheduler.submit(lambda: "preview", interactive=True)
+        assert preview.result(timeout=5) == "preview"
+        assert not batch.done()
+    finally:
+        release.set()
+        scheduler.shutdown()
+
+
+def test_shutdown_without_wait_cancels_queued_requests():
+    scheduler = RenderScheduler(max_workers=1, requests_per_minute=6000)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    running = scheduler.submit(block)
+    started.wait(5)
+    queued = scheduler.submit(lambda: None)
+    scheduler.shutdown(wait=False)
+    release.set()
+    assert queued.cancelled()
+    assert running.result(timeout=5) is None
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
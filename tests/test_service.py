@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from service import RenderService, ServiceJob, parse_params
+
+
+def test_defaults_are_filled_in():
+    params = parse_params(b'{"text": " Hello "}')
+    assert params == {
+        "text": "Hello",
+        "model": "tts-1",
+        "voice": "alloy",
+        "format": "mp3",
+        "speed": 1.0,
+        "user": "",
+    }
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"",
+        b"not json",
+        b"[]",
+        b'"text"',
+        b'{"text": ""}',
+        b'{"text": "Hi", "format": "ogg"}',
+        b'{"text": "Hi", "speed": null}',
+        b'{"text": "Hi", "speed": "fast"}',
+    ],
+)
+def test_invalid_bodies_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse_params(body)
+
+
+def test_finished_jobs_expire(tmp_path):
+    service = RenderService(work_dir=str(tmp_path), job_ttl=10)
+    job_dir = tmp_path / "abc"
+    job_dir.mkdir()
+
+    running = ServiceJob("run", {}, str(tmp_path / "run" / "output.mp3"))
+    finished = ServiceJob("abc", {}, str(job_dir / "output.mp3"))
+    finished.finished_at = -100.0
+    service.jobs = {"run": running, "abc": finished}
+    service.evict_expired()
+    assert list(service.jobs) == ["run"]
+    assert not os.path.exists(job_dir)
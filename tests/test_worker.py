@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import worker
+from job_store import JobStore
+
+
+@pytest.fixture
+def job(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    output = str(tmp_path / "out.mp3")
+    job_id = store.submit_job(["one", "two"], output, "tts-1", "alloy", "mp3", 1.0)
+    segment_dir = store.get_job(job_id)["segment_dir"]
+    for idx in range(2):
+        segment = os.path.join(segment_dir, f"{idx}.mp3")
+        with open(segment, "w") as f:
+            f.write(str(idx))
+        store.claim_task("a")
+        store.complete_task(job_id, idx, "a", segment)
+    return store, job_id, output, segment_dir
+
+
+def fake_join(files, output, *args, **kwargs):
+    with open(output, "w") as f:
+        for file_path in files:
+            with open(file_path) as segment:
+                f.write(segment.read())
+
+
+def test_coordinator_joins_and_removes_the_segments(job, monkeypatch):
+    store, job_id, output, segment_dir = job
+    monkeypatch.setattr(worker, "concatenate_audio_files", fake_join)
+    assert worker.run_coordinator(store.path, job_id)
+    with open(output) as f:
+        assert f.read() == "01"
+    assert not os.path.exists(segment_dir)
+    assert store.get_job(job_id)["status"] == "done"
+
+
+def test_failed_join_fails_the_job(job, monkeypatch):
+    store, job_id, output, segment_dir = job
+    # concatenate_audio_files() logs ffmpeg errors instead of raising them
+    monkeypatch.setattr(worker, "concatenate_audio_files", lambda *a, **k: None)
+    assert not worker.run_coordinator(store.path, job_id)
+    assert store.get_job(job_id)["status"] == "failed"
+    assert len(os.listdir(segment_dir)) == 2
+
+
+def test_empty_text_is_not_submitted(tmp_path):
+    with pytest.raises(ValueError):
+        worker.submit_job(
+            str(tmp_path / "jobs.db"), "  ", "out.mp3", "tts-1", "alloy", "mp3", 1.0
+        )
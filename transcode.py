@@ -0,0 +1,119 @@
+import os
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_codec, concatenate_audio_files, cleanup_files
+
+TRANSCODE_FORMATS = ("mp3", "opus", "aac", "flac", "wav")
+
+
+def transcode_file(source, destination, cancel_token=None):
+    """
+    Encodes one audio file into the format given by the destination extension.
+
+    ffmpeg is limited to one thread so that a pool of transcodes maps onto the
+    available cores instead of oversubscribing them.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        source,
+        "-threads",
+        "1",
+        "-c:a",
+        get_codec(destination),
+        destination,
+    ]
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    handle = cancel_token.register(process.kill) if cancel_token else None
+    try:
+        _, stderr = process.communicate()
+    finally:
+        if cancel_token:
+            cancel_token.unregister(handle)
+    if process.returncode != 0:
+        logging.error(f"Failed to transcode {source}: {stderr.decode().strip()}")
+        if os.path.exists(destination):
+            os.remove(destination)
+        return False
+    return True
+
+
+class SegmentTranscoder:
+    """
+    Transcodes every chunk into additional output formats while the render runs.
+
+    Each chunk is encoded on its own as soon as it is final, by one ffmpeg
+    process per core, and the encoded segments are joined with a stream copy
+    at the end. This replaces one long single-threaded encode of the whole
+    render per format.
+    """
+
+    def __init__(self, path, formats, max_workers=None, cancel_token=None):
+        self.root = os.path.splitext(path)[0]
+        self.formats = [fmt for fmt in dict.fromkeys(formats)]
+        self.cancel_token = cancel_token
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 2,
+            thread_name_prefix="transcode",
+        )
+        self.segments = {fmt: {} for fmt in self.formats}  # format -> index -> path
+
+    def output_path(self, fmt):
+        return f"{self.root}.{fmt}"
+
+    def submit(self, index, chunk_path):
+        """Queues the encodes of one final chunk into every format."""
+        for fmt in self.formats:
+            segment = f"{self.root}_{index}.seg.{fmt}"
+            future = self.executor.submit(
+                transcode_file, chunk_path, segment, self.cancel_token
+            )
+            self.segments[fmt][index] = (segment, future)
+
+    def join(self, trims=None, crossfade=0.0, retain_files=False):
+        """
+        Waits for the encodes and joins the segments of every format.
+
+        Args:
+            trims (list of tuple, optional): (inpoint, outpoint) per chunk.
+            crossfade (float, optional): Crossfade at every seam, in seconds.
+            retain_files (bool): Whether to keep the encoded segments.
+
+        Returns:
+            dict: Output path -> True if that format was written.
+        """
+        results = {}
+        try:
+            for fmt in self.formats:
+                indices = sorted(self.segments[fmt])
+                files = [self.segments[fmt][i][0] for i in indices]
+                ok = all(self.segments[fmt][i][1].result() for i in indices)
+                output = self.output_path(fmt)
+                if ok and files:
+                    concatenate_audio_files(
+                        files, output, trims, crossfade, self.cancel_token
+                    )
+                    ok = os.path.exists(output)
+                results[output] = ok
+                if not ok:
+                    logging.error(f"Failed to produce {output}")
+                cleanup_files(files, retain_files)
+        finally:
+            self.executor.shutdown()
+        return results
+
+    def close(self):
+        """Stops without joining, e.g. after a failed or cancelled render."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for segments in self.segments.values():
+            cleanup_files([segment for segment, _ in segments.values()], False)
@@ -1,17 +1,39 @@
 import os
+import uuid
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import logging
-import tempfile
-from threading import Thread, Event
+from functools import partial
+from threading import Thread, Event, Lock
 from decimal import Decimal
-from pydub import AudioSegment
-from pydub.playback import play
 from PyQt6.QtWidgets import QMessageBox
+from progress import ProgressTracker, format_eta, EST_BYTES_PER_CHAR
+from loudness import LoudnessNormalizer
+from joins import analyze_joins, CROSSFADE_SECONDS
+from key_pool import KeyPool
+from cache import SynthesisCache, SingleFlight, cache_key
+from progressive import ProgressiveWriter, PROGRESSIVE_FORMATS
+from seek_index import write_seek_index
+from alignment import align_render, chunk_offsets
+from normalize import normalize_text
+from profiling import JobProfiler
+from log_setup import log_context
+from transcode import SegmentTranscoder
+from streaming import STREAM_FORMAT, decode_stream
+from cancel import CancelToken, CancelledError
+from journal import RenderJournal, plan_hash
+from hedging import Hedger, HEDGE_PERCENTILE, HEDGE_BUDGET
+from assembler import PcmAssembler, ASSEMBLY_FORMATS
+from pauses import plan_pauses, append_silence, MARKER_PAUSE, PARAGRAPH_PAUSE
+from scheduler import RenderScheduler, REQUESTS_PER_MINUTE
+from format_plan import plan_formats, BANDWIDTH
 from utils import (
     split_text,
     estimate_price,
     read_api_key,
+    read_api_keys,
     concatenate_audio_files,
     cleanup_files,
 )
@@ -23,44 +45,41 @@ if not api_key:
         "The API key must be set either by setting the OPENAI_API_KEY environment variable or by providing it in a configuration file."
     )
 client = OpenAI(api_key=api_key)
+key_pool = KeyPool(read_api_keys() or [api_key])
 
 TTS_PRICE_PER_1K_CHARS = Decimal("0.015")
 TTS_HD_PRICE_PER_1K_CHARS = Decimal("0.030")
 MAX_RETRIES = 3
 RETRY_DELAY = 5
+# (connect, read) timeouts bounding how long a cancelled request can block
+REQUEST_TIMEOUT = (10, 60)
+# Upper bound of concurrently open upstream connections kept warm
+MAX_CONNECTIONS = 16
 
-logging.basicConfig(
-    filename="tts_app.log",
-    level=logging.DEBUG,
-    format="%(asctime)s:%(levelname)s:%(message)s",
+# Shared by every request so that TCP/TLS connections are reused across chunks
+http_session = requests.Session()
+http_session.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS),
 )
-
-
-class AudioPlayer:
-    def __init__(self):
-        self.pause_event = Event()
-        self.abort_event = Event()
-        self.audio = None
-
-    def play(self, audio_segment):
-        self.audio = audio_segment
-        self.pause_event.clear()
-        self.abort_event.clear()
-
-        while not self.abort_event.is_set():
-            if not self.pause_event.is_set():
-                play(self.audio)
-                break
-            time.sleep(0.1)
-
-    def pause(self):
-        self.pause_event.set()
-
-    def resume(self):
-        self.pause_event.clear()
-
-    def abort(self):
-        self.abort_event.set()
+synthesis_cache = SynthesisCache()
+in_flight = SingleFlight()
+# How often a request waiting for an identical one checks for cancellation
+FOLLOWER_POLL = 0.25
+# Duplicates straggling chunk requests; TTS_HEDGE_PERCENTILE=0 turns it off
+hedge_percentile = float(os.getenv("TTS_HEDGE_PERCENTILE", HEDGE_PERCENTILE))
+hedger = (
+    Hedger(hedge_percentile, float(os.getenv("TTS_HEDGE_BUDGET", HEDGE_BUDGET)))
+    if hedge_percentile > 0
+    else None
+)
+# Fair-share pool every render and preview of this process requests through
+render_scheduler = RenderScheduler(
+    requests_per_minute=REQUESTS_PER_MINUTE * max(len(key_pool), 1)
+)
+# Download rate the format planner weighs transfer against encoding with
+upstream_bandwidth = float(os.getenv("TTS_BANDWIDTH", BANDWIDTH))
+SPEECH_URL = "https://api.openai.com/v1/audio/speech"
 
 
 def create_tts(values, window):
@@ -75,6 +94,19 @@ def create_tts(values, window):
     response_format = values["format_var"]
     speed = float(values["speed_var"]) if values["speed_var"] else 1.0
     retain_files = values["retain_files"]
+    normalize_loudness = values.get("normalize_loudness", False)
+    trim_joins = values.get("trim_joins", False)
+    crossfade_joins = values.get("crossfade_joins", False)
+    progressive_output = values.get("progressive_output", False)
+    seek_index = values.get("seek_index", False)
+    alignment_index = values.get("alignment_index", False)
+    source_text = values["text_box"]
+    source_map = None
+    if values.get("normalize_text", False):
+        normalized = normalize_text(source_text)
+        logging.info(f"Text normalization saved {normalized.chars_saved} characters")
+        text = source_text = normalized.text
+        source_map = normalized.offset_map.to_source
     hd = "hd" in model
 
     if not path or not os.path.isdir(os.path.dirname(path)):
@@ -82,8 +114,43 @@ def create_tts(values, window):
         window.show_message("Invalid path")
         return
 
+    profiler = JobProfiler(path) if values.get("profile", False) else None
+    if profiler:
+        profiler.start_phase("split")
+    pauses = None
+    if values.get("insert_pauses", False):
+        plan = plan_pauses(
+            source_text,
+            values.get("marker_pause", MARKER_PAUSE),
+            values.get("paragraph_pause", PARAGRAPH_PAUSE),
+        )
+        chunks, pauses, offsets = plan.chunks, plan.pauses, plan.offsets
+        logging.info(
+            f"Replaced breaks with {plan.total_pause:.1f} s of local silence, "
+            f"saving {plan.chars_saved} characters"
+        )
+    else:
+        chunks = split_text(text)
+        offsets = None
+    if profiler:
+        profiler.end_phase()
+    char_count = sum(len(chunk) for chunk in chunks)
+
+    # Request the format that delivers the outputs most cheaply
+    extra_formats = values.get("extra_formats", ())
+    upstream_format = plan_formats(
+        [response_format, *extra_formats],
+        char_count,
+        fixed=progressive_output and response_format in PROGRESSIVE_FORMATS,
+        bandwidth=upstream_bandwidth,
+    ).upstream
+
+    # Synthesize the first chunk while the user reads the cost dialog
+    speculation = None
+    if values.get("speculative_first_chunk", False) and chunks and chunks[0]:
+        speculation = SpeculativeChunk(chunks[0], model, voice, upstream_format, speed)
+
     # Calculate and confirm price
-    char_count = len(text)
     estimated_price = estimate_price(char_count, hd)
     logging.info(f"Estimated price: ${estimated_price:.3f}")
 
@@ -97,98 +164,236 @@ def create_tts(values, window):
 
     if msg_box.exec() == QMessageBox.StandardButton.Yes:
         logging.debug("User confirmed to proceed with TTS")
+        resume = ask_resume(path, chunks, model, voice, upstream_format, speed, pauses)
         window.progress_updated.emit(1)
+        cancel_token = CancelToken()
+        window.batch_started.emit(cancel_token)
         Thread(
-            target=process_tts,
+            target=run_batch,
             args=(
-                split_text(text),
+                chunks,
                 path,
                 model,
                 voice,
-                response_format,
+                upstream_format,
                 speed,
                 retain_files,
                 window,
             ),
+            kwargs={
+                "normalize_loudness": normalize_loudness,
+                "trim_joins": trim_joins,
+                "crossfade_joins": crossfade_joins,
+                "progressive_output": progressive_output,
+                "seek_index": seek_index,
+                "text_offsets": (
+                    (offsets or chunk_offsets(source_text, chunks))
+                    if alignment_index
+                    else None
+                ),
+                "source_map": source_map,
+                "cancel_token": cancel_token,
+                "resume": resume,
+                "profiler": profiler,
+                "extra_formats": extra_formats,
+                "speculation": speculation,
+                "pauses": pauses,
+                "output_format": response_format,
+            },
         ).start()
     else:
         logging.debug("User declined to proceed with TTS")
+        if speculation:
+            speculation.discard()
+        if profiler:
+            profiler.cancel()
 
 
-def stream_tts(values, window):
-    temp_file = None
-    player = AudioPlayer()
+def ask_resume(path, chunks, model, voice, response_format, speed, pauses=None):
+    """
+    Offers to resume an earlier cancelled or failed render of the same plan.
 
+    Returns:
+        bool: True if the user chose to resume.
+    """
+    plan = plan_hash(chunks, model, voice, response_format, speed, pauses)
+    journal = RenderJournal.load(path, plan)
+    if journal is None:
+        return False
+    done = len(journal.resumable())
+    if not done:
+        return False
+    answer = QMessageBox.question(
+        None,
+        "Resume render",
+        f"{done} of {len(chunks)} chunks of this text were already rendered to "
+        "this path. Resume the earlier render?",
+    )
+    return answer == QMessageBox.StandardButton.Yes
+
+
+def run_batch(*args, **kwargs):
+    """Runs process_tts and reports the outcome to the GUI window."""
+    window = args[7]
+    # The render attaches to the speculative request of its first chunk, if it
+    # is still running, through save_chunk's table of requests in flight
+    kwargs.pop("speculation", None)
     try:
-        text = values["text_box"].strip()
-        model = values["model_var"]
-        voice = values["voice_var"]
-        speed = float(values["speed_var"]) if values["speed_var"] else 1.0
-        response_format = "wav"
-
-        temp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        temp_path = temp_file.name
-        logging.debug(f"Created temporary file: {temp_path}")
-
-        response = requests.post(
-            "https://api.openai.com/v1/audio/speech",
-            headers={
-                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": model,
-                "input": text,
-                "voice": voice,
-                "response_format": response_format,
-                "speed": speed,
-            },
-            stream=True,
+        with log_context(job_id=uuid.uuid4().hex[:12]):
+            ok = process_tts(*args, **kwargs)
+    except Exception as e:
+        logging.exception(f"Error during batch TTS: {e}")
+        ok = False
+    if kwargs.get("profiler"):
+        kwargs["profiler"].finish()
+    token = kwargs.get("cancel_token")
+    if token and token.is_cancelled():
+        window.show_message(
+            "Render cancelled. Start it again with the same text and path to resume."
         )
+    elif not ok:
+        window.show_message("Render failed, see tts_app.log for details.")
+    window.batch_finished.emit()
 
-        if response.status_code != 200:
-            logging.error(f"Failed to stream TTS: {response.status_code}")
-            logging.error(response.json())
-            window.show_message(f"Failed to stream TTS: {response.status_code}")
-            return
 
-        with open(temp_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    window.progress_updated.emit(50)
-
-        audio = AudioSegment.from_wav(temp_path)
-        player_thread = Thread(target=player.play, args=(audio,))
-        player_thread.start()
-
-        window.playback_control.connect(
-            lambda cmd: {
-                "pause": player.pause,
-                "resume": player.resume,
-                "abort": player.abort,
-            }.get(cmd, lambda: None)()
-        )
+def render_text(
+    text, path, settings, scheduler=None, cancel_token=None, job=None, window=None
+):
+    """
+    Renders a text unattended, e.g. for the watch folder and book renders.
 
-        window.progress_updated.emit(100)
-        logging.info("Audio streaming and playback started")
-        player_thread.join()
+    The text goes through the same pipeline as a render from the GUI: pause
+    planning, format planning and process_tts(). An earlier render of the same
+    plan that was interrupted is resumed from its journal without asking.
 
+    Args:
+        text (str): The text to render.
+        path (str): Final output file.
+        settings (dict): model, voice, format and speed, and optionally
+            normalize_loudness and insert_pauses.
+        scheduler (RenderScheduler, optional): Pool the requests run on.
+        cancel_token (CancelToken, optional): Aborts the render.
+        job (hashable, optional): Fair-share job the requests belong to.
+        window (object, optional): Receives the progress signals.
+
+    Returns:
+        bool: True if the output was written.
+    """
+    pauses = None
+    if settings.get("insert_pauses", False):
+        plan = plan_pauses(text)
+        chunks, pauses = plan.chunks, plan.pauses
+    else:
+        chunks = split_text(text)
+    upstream_format = plan_formats(
+        [settings["format"]],
+        sum(len(chunk) for chunk in chunks),
+        bandwidth=upstream_bandwidth,
+    ).upstream
+    return process_tts(
+        chunks,
+        path,
+        settings["model"],
+        settings["voice"],
+        upstream_format,
+        settings["speed"],
+        False,
+        window,
+        normalize_loudness=settings.get("normalize_loudness", False),
+        cancel_token=cancel_token,
+        resume=True,
+        scheduler=scheduler,
+        job=job,
+        pauses=pauses,
+        output_format=settings["format"],
+    )
+
+
+def stream_tts(values, window):
+    """
+    Streams speech for the text and plays it while it downloads.
+
+    Every chunk is requested in a compressed format and decoded into PCM as its
+    bytes arrive, so playback starts after the first packets and the transfer
+    is a fraction of the size of WAV.
+    """
+    player = window.player
+    text = values["text_box"].strip()
+    model = values["model_var"]
+    voice = values["voice_var"]
+    speed = float(values["speed_var"]) if values["speed_var"] else 1.0
+    response_format = values.get("format_var") or STREAM_FORMAT
+    chunks = split_text(text)
+    progress = ProgressTracker(
+        len(text), make_progress_callback(window), response_format
+    )
+
+    def pcm_blocks():
+        for i, chunk in enumerate(chunks):
+            response = render_scheduler.submit(
+                post_speech,
+                {
+                    "model": model,
+                    "input": chunk,
+                    "voice": voice,
+                    "response_format": response_format,
+                    "speed": speed,
+                },
+                interactive=True,
+            ).result()
+            if response is None:
+                raise RuntimeError("Failed to stream TTS: no usable API key")
+            if response.status_code != 200:
+                logging.error(f"Failed to stream TTS: {response.status_code}")
+                logging.error(response.json())
+                raise RuntimeError(f"Failed to stream TTS: {response.status_code}")
+
+            def body(i=i, response=response):
+                for block in response.iter_content(chunk_size=8192):
+                    progress.add_bytes(i, len(block))
+                    yield block
+
+            progress.start_chunk(i, len(chunk))
+            try:
+                yield from decode_stream(body(), response_format)
+            finally:
+                response.close()
+            progress.finish_chunk(i)
+        progress.finish()
+
+    try:
+        logging.info(f"Streaming {len(chunks)} chunks as {response_format}")
+        player.play_stream(pcm_blocks())
     except Exception as e:
         logging.exception(f"Error during streaming TTS: {e}")
         window.show_message(f"Error during streaming TTS: {str(e)}")
-    finally:
-        if temp_file:
-            try:
-                os.unlink(temp_file.name)
-                logging.debug(f"Cleaned up temporary file: {temp_file.name}")
-            except OSError as e:
-                logging.error(f"Error removing temporary file: {e}")
-        window.reset_playback_ui()
 
 
 def process_tts(
-    chunks, path, model, voice, response_format, speed, retain_files, window
+    chunks,
+    path,
+    model,
+    voice,
+    response_format,
+    speed,
+    retain_files,
+    window,
+    normalize_loudness=False,
+    trim_joins=False,
+    crossfade_joins=False,
+    progressive_output=False,
+    seek_index=False,
+    text_offsets=None,
+    source_map=None,
+    cancel_token=None,
+    resume=False,
+    profiler=None,
+    extra_formats=(),
+    scheduler=None,
+    user=None,
+    job=None,
+    pauses=None,
+    output_format=None,
 ):
     """
     Processes speech chunks, saves them as temporary files, and concatenates them into a final audio file.
@@ -198,45 +403,476 @@ def process_tts(
         path (str): Path to save the final concatenated audio file.
         model (str): Model to be used for speech processing.
         voice (str): Voice to be used for speech synthesis.
-        response_format (str): Format of the response audio files (e.g., 'mp3', 'wav').
+        response_format (str): Format requested from the API for the chunks (e.g., 'mp3', 'wav').
         speed (float): Speed of the speech synthesis.
         retain_files (bool): Whether to retain the temporary files after processing.
         window (object): GUI window object to emit progress updates.
+        normalize_loudness (bool): Whether to level every chunk to a common loudness
+            in a worker pool while the remaining chunks download.
+        trim_joins (bool): Whether to trim the silence at every seam between chunks
+            to a consistent pause.
+        crossfade_joins (bool): Whether to apply a short crossfade at every seam.
+        progressive_output (bool): Whether to grow the output file in order while
+            chunks complete, so the finished prefix can already be played.
+        seek_index (bool): Whether to emit a seek table for the output (a Xing TOC
+            for MP3, a sidecar index for AAC and Opus).
+        text_offsets (list of int, optional): Character offset of every chunk in the
+            source text. When given, a text-to-audio alignment index is written.
+        source_map (callable, optional): Maps offsets in normalized text back to the
+            text shown to the user, so the alignment index matches the editor.
+        cancel_token (CancelToken, optional): Aborts the render when triggered. The
+            downloaded chunks and the journal are kept so it can be resumed.
+        resume (bool): Whether to reuse the chunks recorded in the journal of an
+            earlier render of the same plan.
+        profiler (JobProfiler, optional): Receives the synthesize, concatenate and
+            cleanup phase boundaries. The caller finishes it.
+        extra_formats (list of str, optional): Further formats to deliver next to
+            `path`, e.g. ["opus"] writes `<name>.opus`. Chunks are transcoded in
+            parallel while the render runs and joined with a stream copy.
+        scheduler (RenderScheduler, optional): Pool the chunk requests are queued
+            on, all at once. Defaults to the shared render_scheduler, which
+            shares the request slots fairly between users and their jobs.
+        user (hashable, optional): Who the render is for, for fair sharing.
+        job (hashable, optional): Identifies the render among the user's jobs.
+        pauses (list of float, optional): Seconds of silence to play after every
+            chunk, see pauses.plan_pauses(). The silence is generated locally
+            and appended to the chunk file before it is handed on.
+        output_format (str, optional): Format of the file at `path`, see
+            format_plan.plan_formats(). Defaults to `response_format`; if it
+            differs, the chunks are encoded into it in parallel like the
+            extra formats.
 
     Returns:
-        None
+        bool: True if the final audio file was written, False otherwise.
     """
     logging.debug("Starting process_tts function")
-    temp_files = []
+    cancel_token = cancel_token or CancelToken()
+    temp_files = [
+        os.path.join(
+            os.path.dirname(path),
+            f"{os.path.splitext(os.path.basename(path))[0]}_{i}.{response_format}",
+        )
+        for i in range(len(chunks))
+    ]
+    pauses = list(pauses) if pauses else None
+    plan = plan_hash(chunks, model, voice, response_format, speed, pauses)
+    journal = RenderJournal.load(path, plan) if resume else None
+    done = journal.resumable() if journal else set()
+    journal = RenderJournal(path, plan, temp_files, done)
+    journal.save()
     total_chunks = len(chunks)
     logging.debug(f"Total chunks to process: {total_chunks}")
+    progress = ProgressTracker(
+        sum(len(chunk) for chunk in chunks),
+        make_progress_callback(window),
+        response_format,
+    )
+    normalizer = LoudnessNormalizer() if normalize_loudness else None
+    writer = None
+    output_format = output_format or response_format
+    # The chunks are joined as they are into the output of their own format,
+    # if there is one; every other output is encoded chunk by chunk
+    if output_format == response_format:
+        join_path = path
+    elif response_format in extra_formats:
+        join_path = f"{os.path.splitext(path)[0]}.{response_format}"
+    else:
+        join_path = None
+    extra_formats = [
+        fmt
+        for fmt in dict.fromkeys([output_format, *extra_formats])
+        if fmt != response_format
+    ]
 
+    if progressive_output:
+        if response_format in PROGRESSIVE_FORMATS and join_path == path:
+            writer = ProgressiveWriter(path, response_format)
+            if trim_joins or crossfade_joins:
+                logging.info("Join trimming is not applied to progressive output")
+        else:
+            logging.warning(
+                f"{response_format} output cannot be written progressively, "
+                "falling back to concatenation"
+            )
+
+    transcoder = (
+        SegmentTranscoder(path, extra_formats, cancel_token=cancel_token)
+        if extra_formats
+        else None
+    )
+
+    # WAV and PCM chunks are placed straight into the output, without ffmpeg
+    assembler = None
+    if (
+        join_path
+        and response_format in ASSEMBLY_FORMATS
+        and not writer
+        and not trim_joins
+        and not crossfade_joins
+    ):
+        assembler = PcmAssembler(
+            join_path,
+            response_format,
+            len(chunks),
+            sum(len(chunk) for chunk in chunks) * EST_BYTES_PER_CHAR[response_format],
+        )
+
+    def chunk_final(index, chunk_path):
+        if writer:
+            writer.add(index, chunk_path)
+        if transcoder:
+            transcoder.submit(index, chunk_path)
+        if assembler:
+            assembler.add(index, chunk_path)
+
+    def place_downloaded(index, future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            assembler.add(index, temp_files[index])
+
+    if profiler:
+        profiler.start_phase("synthesize")
+    scheduler = scheduler or render_scheduler
+    job = job or path
+    futures = {
+        i: scheduler.submit(
+            save_chunk,
+            chunk,
+            temp_files[i],
+            model,
+            voice,
+            response_format,
+            speed,
+            progress=progress,
+            chunk_id=i,
+            cancel_token=cancel_token,
+            scheduler=scheduler,
+            user=user,
+            job=job,
+            cost=len(chunk),
+        )
+        for i, chunk in enumerate(chunks)
+        if i not in done
+    }
+    if assembler and not normalizer and not pauses:
+        # Unmodified chunks are placed by the worker that downloaded them
+        for i, future in futures.items():
+            future.add_done_callback(partial(place_downloaded, i))
+    # Chunks complete in any order but are handed on in order
     for i, chunk in enumerate(chunks):
-        progress = (i / total_chunks) * 100
-        window.progress_updated.emit(progress)
-        logging.debug(f"Processing chunk {i+1}/{total_chunks}, progress: {progress}%")
+        logging.debug(f"Processing chunk {i+1}/{total_chunks}")
+        temp_filename = temp_files[i]
 
-        temp_filename = os.path.join(
-            os.path.dirname(path),
-            f"{os.path.splitext(os.path.basename(path))[0]}_{i}.{response_format}",
+        if i in done:
+            logging.debug(f"Chunk {i+1} restored from journal")
+            progress.start_chunk(i, len(chunk))
+            progress.add_bytes(i, os.path.getsize(temp_filename))
+            progress.finish_chunk(i)
+        elif cancel_token.is_cancelled() or not futures[i].result():
+            if cancel_token.is_cancelled():
+                logging.info(f"Render cancelled at chunk {i+1}/{total_chunks}")
+            else:
+                logging.error(f"Failed to save chunk {i+1}")
+            for future in futures.values():
+                future.cancel()
+            if normalizer:
+                normalizer.wait()
+            if writer:
+                writer.close()
+            if transcoder:
+                transcoder.close()
+            if assembler:
+                assembler.close()
+                os.remove(assembler.path)
+            # The downloaded chunks stay on disk for a later resume
+            return False
+        else:
+            if pauses and pauses[i]:
+                if not append_silence(
+                    temp_filename, pauses[i], response_format, cancel_token
+                ):
+                    logging.warning(f"Could not append the pause after chunk {i+1}")
+                    pauses[i] = 0.0
+            journal.mark_done(i)
+
+        if normalizer:
+            normalizer.submit(
+                temp_filename, on_done=partial(chunk_final, i, temp_filename)
+            )
+        else:
+            chunk_final(i, temp_filename)
+
+    if normalizer and not normalizer.wait():
+        logging.warning("Some chunks could not be loudness-normalized")
+
+    if profiler:
+        profiler.start_phase("concatenate")
+    if writer:
+        complete = writer.close()
+        if complete and text_offsets is not None:
+            align_render(
+                path,
+                chunks,
+                text_offsets,
+                temp_files,
+                to_source=source_map,
+                pauses=pauses,
+            )
+        if complete and seek_index:
+            write_seek_index(path)
+        if transcoder:
+            transcoder.join(retain_files=retain_files)
+        progress.finish()
+        logging.debug(f"Progressive audio file completed at {path}")
+        if profiler:
+            profiler.start_phase("cleanup")
+        journal.delete()
+        cleanup_files(temp_files, retain_files)
+        return complete
+
+    trims = analyze_joins(temp_files) if trim_joins else None
+    if trims and pauses:
+        # Keep the inserted pauses; only the seams without one are tightened
+        trims = [
+            (inpoint, None if pause else outpoint)
+            for (inpoint, outpoint), pause in zip(trims, pauses)
+        ]
+    crossfade = CROSSFADE_SECONDS if crossfade_joins else 0.0
+    if text_offsets is not None:
+        align_render(
+            path,
+            chunks,
+            text_offsets,
+            temp_files,
+            trims,
+            crossfade,
+            source_map,
+            pauses,
         )
-        temp_files.append(temp_filename)
-        logging.debug(f"Temporary filename: {temp_filename}")
 
-        if not save_chunk(chunk, temp_filename, model, voice, response_format, speed):
-            logging.error(f"Failed to save chunk {i+1}")
-            cleanup_files(temp_files, retain_files)
-            return
+    if transcoder:
+        encoded = transcoder.join(trims, crossfade, retain_files)
+        output = transcoder.output_path(output_format)
+        if output != path and encoded.get(output):
+            os.replace(output, path)
 
-    logging.debug("All chunks processed, concatenating audio files")
-    concatenate_audio_files(temp_files, path)
-    window.progress_updated.emit(100)
+    if assembler:
+        logging.debug("All chunks processed, finishing the assembled output")
+        if not assembler.close():
+            os.remove(assembler.path)
+    elif join_path:
+        logging.debug("All chunks processed, concatenating audio files")
+        concatenate_audio_files(temp_files, join_path, trims, crossfade, cancel_token)
+    if cancel_token.is_cancelled():
+        logging.info("Render cancelled during concatenation")
+        return False
+    if seek_index and os.path.exists(path):
+        write_seek_index(path)
+    progress.finish()
     logging.debug(f"Final audio file saved to {path}")
+    if profiler:
+        profiler.start_phase("cleanup")
+    journal.delete()
 
     if not retain_files:
         logging.debug("Cleaning up temporary files")
         cleanup_files(temp_files, retain_files)
     logging.debug("Finished process_tts function")
+    return os.path.exists(path)
+
+
+def make_progress_callback(window):
+    """
+    Builds the ProgressTracker callback that forwards coalesced updates to the GUI.
+
+    Args:
+        window (object): GUI window object exposing the progress signals, or
+            None for an unattended render.
+
+    Returns:
+        callable: A function accepting (percent, eta_seconds).
+    """
+
+    def on_update(percent, eta):
+        if window is None:
+            return
+        window.progress_updated.emit(percent)
+        window.eta_updated.emit(format_eta(eta))
+
+    return on_update
+
+
+def prewarm_connection():
+    """
+    Opens a pooled connection to the API ahead of the first request, so that DNS,
+    TCP and TLS setup are already paid when the user starts a render.
+    """
+    try:
+        response = http_session.head(SPEECH_URL, timeout=REQUEST_TIMEOUT)
+        response.close()
+        logging.debug(f"Pre-warmed API connection ({response.status_code})")
+    except requests.RequestException as e:
+        logging.debug(f"Could not pre-warm API connection: {e}")
+
+
+class SpeculativeChunk:
+    """
+    Synthesizes the first chunk of a render into the synthesis cache before the
+    render is confirmed. A confirmed render finds the chunk in the cache, or
+    waits for the request in flight; discard() cancels the request and drops
+    the result.
+
+    Nothing is requested if the chunk is cached or already being requested,
+    and only a result requested here is dropped.
+    """
+
+    def __init__(self, chunk, model, voice, response_format, speed):
+        self.key = cache_key(chunk, model, voice, speed, response_format)
+        self.cancel_token = CancelToken()
+        self.downloaded = False
+        handle, self.path = tempfile.mkstemp(suffix=f".{response_format}")
+        os.close(handle)
+        self.thread = Thread(
+            target=self._run,
+            args=(chunk, model, voice, response_format, speed),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def _run(self, chunk, model, voice, response_format, speed):
+        with log_context(chunk_id=0):
+            if synthesis_cache.get(self.key, self.path):
+                logging.debug("First chunk is cached, nothing to speculate")
+            elif in_flight.lead(self.key) is not None:
+                logging.debug("First chunk is already being synthesized")
+            else:
+                logging.debug("Speculatively synthesizing the first chunk")
+                try:
+                    self.downloaded = _download_chunk(
+                        self.key,
+                        chunk,
+                        model,
+                        voice,
+                        response_format,
+                        speed,
+                        self.path,
+                        cancel_token=self.cancel_token,
+                    )
+                finally:
+                    in_flight.land(self.key)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def discard(self):
+        """Cancels the speculative request and forgets its result."""
+        self.cancel_token.cancel()
+
+        def drop():
+            self.thread.join()
+            if self.downloaded:
+                synthesis_cache.discard(self.key)
+
+        Thread(target=drop, daemon=True).start()
+
+
+def _send_cancellable(send, cancel_token=None):
+    """
+    Runs `send` in a helper thread and waits until it returns or
+    `cancel_token` is triggered, so a cancel does not wait for a server that
+    has not answered yet. A response that arrives after the cancel is closed.
+
+    Returns:
+        The result of `send`.
+
+    Raises:
+        CancelledError: If the token was triggered first.
+    """
+    if cancel_token is None:
+        return send()
+    outcome = {}
+    lock = Lock()
+    answered = Event()
+
+    def run():
+        try:
+            result = ("response", send())
+        except Exception as e:
+            result = ("error", e)
+        with lock:
+            outcome[result[0]] = result[1]
+            abandoned = outcome.get("abandoned", False)
+        if abandoned and result[0] == "response":
+            result[1].close()
+        answered.set()
+
+    Thread(target=run, name="post", daemon=True).start()
+    handle = cancel_token.register(answered.set)
+    try:
+        answered.wait()
+    finally:
+        cancel_token.unregister(handle)
+    with lock:
+        if "response" not in outcome and "error" not in outcome:
+            outcome["abandoned"] = True
+            raise CancelledError()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["response"]
+
+
+def post_speech(payload, cancel_token=None):
+    """
+    Sends a streaming request to the speech endpoint, rotating over the key pool.
+
+    A key that is throttled (429) or rejected (401/403) is reported to the pool and
+    the request is retried immediately with the next best key.
+
+    Args:
+        payload (dict): The JSON body of the speech request.
+        cancel_token (CancelToken, optional): Aborts the request, including the
+            wait for a key and for the response headers, when triggered.
+
+    Returns:
+        requests.Response: The streaming response of the last attempt, or None if
+        no key was available.
+
+    Raises:
+        CancelledError: If the token was triggered.
+    """
+    response = None
+    for attempt in range(max(MAX_RETRIES, len(key_pool))):
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        api_key = key_pool.acquire(cancel_token=cancel_token)
+        if api_key is None:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            return response
+        try:
+            response = _send_cancellable(
+                partial(
+                    http_session.post,
+                    SPEECH_URL,
+                    headers={
+                        "Authorization": f"Bearer {api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json=payload,
+                    stream=True,
+                    timeout=REQUEST_TIMEOUT,
+                ),
+                cancel_token,
+            )
+        except (requests.RequestException, CancelledError):
+            key_pool.release(api_key)
+            raise
+        key_pool.release(api_key, response.status_code, response.headers)
+        if response.status_code not in (401, 403, 429):
+            return response
+        logging.warning(
+            f"Speech request attempt {attempt + 1} got {response.status_code}, rotating key"
+        )
+        response.close()
+    return response
 
 
 def make_api_request(api_key, data, model):
@@ -282,7 +918,18 @@ def make_api_request(api_key, data, model):
     return None
 
 
-def save_chunk(chunk, filename, model, voice, response_format, speed):
+def save_chunk(
+    chunk,
+    filename,
+    model,
+    voice,
+    response_format,
+    speed,
+    progress=None,
+    chunk_id=None,
+    cancel_token=None,
+    scheduler=None,
+):
     """
     Save a single chunk of text as an audio file using OpenAI's TTS API.
 
@@ -293,39 +940,142 @@ def save_chunk(chunk, filename, model, voice, response_format, speed):
         voice (str): Voice ID to use
         response_format (str): Audio format (mp3, wav, etc)
         speed (float): Speech speed multiplier
+        progress (ProgressTracker, optional): Tracker receiving byte counts
+        chunk_id (int, optional): Identifier of the chunk within the tracker
+        cancel_token (CancelToken, optional): Aborts the download when triggered
+        scheduler (RenderScheduler, optional): Pool the render runs on, which a
+            duplicate of a straggling request is queued on. Defaults to
+            render_scheduler.
 
     Returns:
         bool: True if successful, False otherwise
     """
+    with log_context(chunk_id=chunk_id):
+        key = cache_key(chunk, model, voice, speed, response_format)
+        while True:
+            if synthesis_cache.get(key, filename):
+                _credit_chunk(progress, chunk_id, len(chunk), filename)
+                return True
+            landed = in_flight.lead(key)
+            if landed is None:
+                break
+            # An identical request is in flight: share its result, or take over
+            # if it fails
+            logging.debug("Waiting for an identical request in flight")
+            while not landed.wait(FOLLOWER_POLL):
+                if cancel_token and cancel_token.is_cancelled():
+                    return False
+
+        request = (key, chunk, model, voice, response_format, speed)
+        try:
+            if hedger is None:
+                return _download_chunk(
+                    *request, filename, progress, chunk_id, cancel_token
+                )
+
+            root, extension = os.path.splitext(filename)
+            hedge_file = f"{root}.hedge{extension}"
+
+            def attempt(index, token):
+                if index == 0:
+                    return _download_chunk(
+                        *request, filename, progress, chunk_id, token
+                    )
+                return _download_chunk(*request, hedge_file, None, chunk_id, token)
+
+            winner = hedger.run(
+                attempt,
+                len(chunk),
+                (scheduler or render_scheduler).submit,
+                cancel_token,
+            )
+            if winner == 1:
+                os.replace(hedge_file, filename)
+                # The cancelled primary dropped its progress
+                _credit_chunk(progress, chunk_id, len(chunk), filename)
+            elif os.path.exists(hedge_file):
+                os.remove(hedge_file)
+            return winner is not None
+        finally:
+            in_flight.land(key)
+
+
+def _credit_chunk(progress, chunk_id, chars, filename):
+    """Reports a chunk that arrived without being downloaded to the tracker."""
+    if progress:
+        progress.start_chunk(chunk_id, chars)
+        progress.add_bytes(chunk_id, os.path.getsize(filename))
+        progress.finish_chunk(chunk_id)
+
+
+def _download_chunk(
+    key,
+    chunk,
+    model,
+    voice,
+    response_format,
+    speed,
+    filename,
+    progress=None,
+    chunk_id=None,
+    cancel_token=None,
+):
+    """Requests one chunk and streams it into `filename`, see save_chunk()."""
     try:
-        logging.debug(f"Sending TTS request for chunk: {chunk[:50]}...")
+        logging.debug(f"Sending TTS request for {len(chunk)} characters")
 
-        response = requests.post(
-            "https://api.openai.com/v1/audio/speech",
-            headers={
-                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                "Content-Type": "application/json",
-            },
-            json={
+        response = post_speech(
+            {
                 "model": model,
                 "input": chunk,
                 "voice": voice,
                 "response_format": response_format,
                 "speed": speed,
             },
+            cancel_token,
         )
 
+        if response is None:
+            logging.error("Failed to create TTS: no usable API key")
+            return False
         if response.status_code != 200:
             logging.error(f"Failed to create TTS: {response.status_code}")
             logging.error(response.json())
             return False
 
-        with open(filename, "wb") as f:
-            f.write(response.content)
+        if progress:
+            progress.start_chunk(chunk_id, len(chunk))
+        # Closing the response unblocks a read in progress as soon as we cancel
+        handle = cancel_token.register(response.close) if cancel_token else None
+        try:
+            with open(filename, "wb") as f:
+                for block in response.iter_content(chunk_size=8192):
+                    if cancel_token:
+                        cancel_token.raise_if_cancelled()
+                    if block:
+                        f.write(block)
+                        if progress:
+                            progress.add_bytes(chunk_id, len(block))
+        finally:
+            if cancel_token:
+                cancel_token.unregister(handle)
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        if progress:
+            progress.finish_chunk(chunk_id)
+        synthesis_cache.put(key, filename)
 
         logging.debug(f"Successfully saved chunk to {filename}")
         return True
 
     except Exception as e:
-        logging.exception(f"Error in save_chunk: {str(e)}")
+        if cancel_token and cancel_token.is_cancelled():
+            logging.debug(f"Chunk download cancelled: {filename}")
+        else:
+            logging.exception(f"Error in save_chunk: {str(e)}")
+        if progress:
+            progress.fail_chunk(chunk_id)
+        # Never leave a partial chunk behind that could be mistaken for a whole one
+        if os.path.exists(filename):
+            os.remove(filename)
         return False
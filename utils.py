@@ -12,12 +12,8 @@ TTS_PRICE_PER_1K_CHARS = Decimal("0.015")
 TTS_HD_PRICE_PER_1K_CHARS = Decimal("0.030")
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # seconds
-
-logging.basicConfig(
-    filename="tts_app.log",
-    level=logging.DEBUG,
-    format="%(asctime)s:%(levelname)s:%(message)s",
-)
+# Crossfaded seams rendered by one ffmpeg command, two inputs each
+SEAMS_PER_COMMAND = 32
 
 
 def split_text(text, chunk_size=4096):
@@ -113,6 +109,40 @@ def read_api_key():
     sys.exit(1)
 
 
+def read_api_keys():
+    """
+    Reads every configured OpenAI API key for the key pool.
+
+    Keys are collected from the OPENAI_API_KEYS (comma or whitespace separated) and
+    OPENAI_API_KEY environment variables, the .env file, and the api_keys.txt file
+    (one key per line, `#` starts a comment). Duplicates are dropped.
+
+    Returns:
+        list of str: The API keys, in configuration order. May be empty.
+    """
+    try:
+        load_dotenv()
+    except Exception as e:
+        print(f"Error loading .env file: {e}")
+
+    keys = []
+    keys.extend(os.getenv("OPENAI_API_KEYS", "").replace(",", " ").split())
+    if os.getenv("OPENAI_API_KEY"):
+        keys.append(os.getenv("OPENAI_API_KEY"))
+
+    if os.path.exists("api_keys.txt"):
+        try:
+            with open("api_keys.txt", "r") as file:
+                for line in file:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        keys.append(line)
+        except Exception as e:
+            print(f"Error reading api_keys.txt file: {e}")
+
+    return list(dict.fromkeys(keys))
+
+
 def write_api_key(api_key):
     """
     Writes the provided API key to a file. If a .env file exists, the API key is written to it.
@@ -143,38 +173,270 @@ def write_api_key(api_key):
         return False
 
 
-def concatenate_audio_files(file_list, output_file):
+def get_audio_duration(file_path):
+    """
+    Returns the duration of an audio file in seconds using ffprobe.
+
+    Args:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        float: The duration in seconds, or None if it cannot be determined.
+    """
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        file_path,
+    ]
+    try:
+        result = subprocess.run(
+            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        return float(result.stdout.decode().strip())
+    except Exception as e:
+        logging.error(f"Failed to read duration of {file_path}: {e}")
+        return None
+
+
+def get_codec(output_file):
+    """
+    Returns the ffmpeg audio codec used to encode the given output file.
+
+    Args:
+        output_file (str): Path of the output file; only its extension is used.
+
+    Returns:
+        str: The ffmpeg codec name, or "copy" to keep the input stream as is.
+    """
+    output_extension = os.path.splitext(output_file)[1].lower()
+    if output_extension == ".mp3":
+        return "libmp3lame"
+    elif output_extension == ".flac":
+        return "flac"
+    elif output_extension == ".aac":
+        return "aac"
+    elif output_extension == ".opus":
+        return "libopus"
+    elif output_extension == ".wav":
+        return "pcm_s16le"
+    return "copy"
+
+
+def can_stream_copy(file_list, output_file):
+    """
+    Tells whether the files can be joined into the output without re-encoding,
+    i.e. they all already have the output's format.
+    """
+    output_extension = os.path.splitext(output_file)[1].lower()
+    return all(
+        os.path.splitext(file_path)[1].lower() == output_extension
+        for file_path in file_list
+    )
+
+
+def _trimmed_spans(file_list, trims):
+    """
+    Returns:
+        list of tuple: (start, end) in seconds of every file once trimmed, or
+        None if the duration of a file cannot be read.
+    """
+    spans = []
+    for file_path, (inpoint, outpoint) in zip(file_list, trims):
+        end = outpoint or get_audio_duration(file_path)
+        if end is None:
+            return None
+        spans.append((inpoint or 0.0, end))
+    return spans
+
+
+def _seam_command(seams, output_file):
+    """
+    Builds an ffmpeg command that renders the crossfaded seams, each from only
+    the end of one file and the start of the next, so the audio in between is
+    never decoded.
+
+    Args:
+        seams (list of tuple): (previous file, its end, next file, its start,
+            crossfade length, seam file) per seam, in seconds.
+        output_file (str): Output the seams are joined into; selects the codec.
+    """
+    command = ["ffmpeg", "-y"]
+    filters = []
+    outputs = []
+    codec = get_codec(output_file)
+    for i, (previous, end, following, start, length, seam_file) in enumerate(seams):
+        command += ["-ss", str(round(end - length, 6)), "-to", str(end), "-i", previous]
+        command += [
+            "-ss",
+            str(start),
+            "-to",
+            str(round(start + length, 6)),
+            "-i",
+            following,
+        ]
+        filters.append(
+            f"[{2 * i}:a][{2 * i + 1}:a]acrossfade=d={length}:c1=tri:c2=tri[s{i}]"
+        )
+        outputs += ["-map", f"[s{i}]"]
+        if codec != "copy":
+            outputs += ["-c:a", codec]
+        outputs.append(seam_file)
+    return command + ["-filter_complex", ";".join(filters)] + outputs
+
+
+def _crossfade_entries(file_list, trims, crossfade, output_file, cancel_token):
+    """
+    Crossfades only the seams of the files and lays out the concat list that
+    joins the untouched middles of the files with the rendered seams.
+
+    Returns:
+        tuple: The concat entries and the seam files, or None if the seams
+        could not be rendered.
+    """
+    spans = _trimmed_spans(file_list, trims)
+    if spans is None:
+        return None
+    root, extension = os.path.splitext(output_file)
+    # A seam takes at most half of either file, so short chunks keep a middle
+    lengths = [0.0]
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        length = min(crossfade, (end - start) / 2, (next_end - next_start) / 2)
+        lengths.append(round(length, 6))
+    lengths.append(0.0)
+    seams = [
+        (
+            file_list[i - 1],
+            spans[i - 1][1],
+            file_list[i],
+            spans[i][0],
+            lengths[i],
+            f"{root}.seam{i}{extension}",
+        )
+        for i in range(1, len(file_list))
+    ]
+    seam_files = [seam[-1] for seam in seams]
+    for first in range(0, len(seams), SEAMS_PER_COMMAND):
+        batch = seams[first : first + SEAMS_PER_COMMAND]
+        try:
+            ok = _run_ffmpeg(_seam_command(batch, output_file), cancel_token)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to crossfade the seams: {e}")
+            ok = False
+        if not ok:
+            cleanup_files([path for path in seam_files if os.path.exists(path)], False)
+            return None
+
+    entries = []
+    for i, file_path in enumerate(file_list):
+        if i:
+            entries.append(f"file '{seam_files[i - 1]}'")
+        entries.append(f"file '{file_path}'")
+        inpoint = round(spans[i][0] + lengths[i], 6)
+        if inpoint:
+            entries.append(f"inpoint {inpoint}")
+        if lengths[i + 1]:
+            entries.append(f"outpoint {round(spans[i][1] - lengths[i + 1], 6)}")
+        elif trims[i][1]:
+            entries.append(f"outpoint {trims[i][1]}")
+    return entries, seam_files
+
+
+def _run_ffmpeg(command, cancel_token=None, command_input=None):
+    """
+    Runs an ffmpeg command that `cancel_token` kills when triggered.
+
+    Returns:
+        bool: True if ffmpeg succeeded.
+    """
+    logging.info(f"Running ffmpeg command: {' '.join(command)}")
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    handle = cancel_token.register(process.kill) if cancel_token else None
+    try:
+        stdout, stderr = process.communicate(command_input)
+    finally:
+        if cancel_token:
+            cancel_token.unregister(handle)
+    logging.info(stdout.decode())
+    logging.error(stderr.decode())
+    if cancel_token and cancel_token.is_cancelled():
+        return False
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return True
+
+
+def concatenate_audio_files(
+    file_list, output_file, trims=None, crossfade=0.0, cancel_token=None
+):
     """
     Concatenates multiple audio files into a single output file.
 
     Args:
         file_list (list of str): List of paths to the audio files to be concatenated.
         output_file (str): Path to the output file where the concatenated audio will be saved.
+        trims (list of tuple, optional): (inpoint, outpoint) in seconds per file, where
+            None leaves that side untouched. See joins.plan_join_trims().
+        crossfade (float, optional): Length in seconds of a crossfade applied at every
+            seam. Only the seams are decoded; the rest is joined as it is.
+        cancel_token (CancelToken, optional): Kills ffmpeg when triggered.
     """
     if len(file_list) == 1:
         os.rename(file_list[0], output_file)
         logging.info(f"Renamed single chunk to {output_file}")
         return
 
+    trims = trims or [(None, None)] * len(file_list)
+    seam_files = []
     try:
         output_dir = os.path.dirname(output_file)
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        output_extension = os.path.splitext(output_file)[1].lower()
-        if output_extension == ".mp3":
-            codec = "libmp3lame"
-        elif output_extension == ".flac":
-            codec = "flac"
-        elif output_extension == ".aac":
-            codec = "aac"
-        elif output_extension == ".opus":
-            codec = "libopus"
-        else:
-            codec = "copy"
+        existing = [
+            (file_path, trim)
+            for file_path, trim in zip(file_list, trims)
+            if os.path.exists(file_path)
+        ]
+        if not existing:
+            logging.error("No valid files to concatenate.")
+            return
+        file_list = [file_path for file_path, _ in existing]
+        trims = [trim for _, trim in existing]
+
+        concat_entries = None
+        if crossfade > 0 and len(file_list) > 1:
+            crossfaded = _crossfade_entries(
+                file_list, trims, crossfade, output_file, cancel_token
+            )
+            if crossfaded is not None:
+                concat_entries, seam_files = crossfaded
+            elif cancel_token and cancel_token.is_cancelled():
+                logging.info(f"Concatenation into {output_file} cancelled")
+                return
+            else:
+                logging.warning("Cannot crossfade the seams, joining without")
+        if concat_entries is None:
+            concat_entries = []
+            for file_path, (inpoint, outpoint) in zip(file_list, trims):
+                concat_entries.append(f"file '{file_path}'")
+                if inpoint:
+                    concat_entries.append(f"inpoint {inpoint}")
+                if outpoint:
+                    concat_entries.append(f"outpoint {outpoint}")
 
         concat_command = [
             "ffmpeg",
+            "-y",
             "-f",
             "concat",
             "-safe",
@@ -182,32 +444,25 @@ def concatenate_audio_files(file_list, output_file):
             "-i",
             "-",
             "-c:a",
-            codec,
+            (
+                "copy"
+                if can_stream_copy(file_list + seam_files, output_file)
+                else get_codec(output_file)
+            ),
             output_file,
         ]
-
-        concat_list = "\n".join(
-            f"file '{file_path}'"
-            for file_path in file_list
-            if os.path.exists(file_path)
-        )
-        if not concat_list:
-            logging.error("No valid files to concatenate.")
+        if not _run_ffmpeg(
+            concat_command, cancel_token, "\n".join(concat_entries).encode()
+        ):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            logging.info(f"Concatenation into {output_file} cancelled")
             return
-
-        logging.info(f"Running ffmpeg command: {' '.join(concat_command)}")
-        result = subprocess.run(
-            concat_command,
-            input=concat_list.encode(),
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        logging.info(result.stdout.decode())
-        logging.error(result.stderr.decode())
         logging.info(f"Concatenated audio files into {output_file}")
     except Exception as e:
         logging.error(f"Error in concatenating audio files: {e}")
+    finally:
+        cleanup_files(seam_files, False)
 
 
 def cleanup_files(file_list, retain_files):
@@ -236,12 +491,22 @@ def cleanup_files(file_list, retain_files):
                 )
 
 
-def play_audio(file_path):
-    """Play audio file from path using ffpyplayer (ffmpeg `ffplay` wrapper)."""
-    player = MediaPlayer(file_path)
-    while True:
-        frame, val = player.get_frame()
-        if val == "eof":
-            break
-        elif frame is None:
-            time.sleep(0.01)
+def play_audio(file_path, start=0.0, stop_event=None):
+    """
+    Play audio file from path using ffpyplayer (ffmpeg `ffplay` wrapper).
+
+    Args:
+        file_path (str): Path to the audio file.
+        start (float, optional): Position in seconds to start playing from.
+        stop_event (threading.Event, optional): Stops playback when set.
+    """
+    player = MediaPlayer(file_path, ff_opts={"ss": start} if start else {})
+    try:
+        while not (stop_event and stop_event.is_set()):
+            frame, val = player.get_frame()
+            if val == "eof":
+                break
+            elif frame is None:
+                time.sleep(0.01)
+    finally:
+        player.close_player()
@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Linux only; without it the watched folders are polled
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+from tts import render_text, key_pool
+from scheduler import RenderScheduler, REQUESTS_PER_MINUTE
+from normalize import normalize_text
+from cancel import CancelToken
+from log_setup import log_context
+
+MANIFEST_SUFFIX = ".manifest.json"
+WATCHED_EXTENSIONS = (".txt", ".md")
+# A file is rendered once its size and mtime have not changed for this long
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 2.0
+# Documents grouped into one render batch
+MAX_BATCH_DOCUMENTS = 16
+# Batches rendered at the same time; their requests share one scheduler
+MAX_CONCURRENT_BATCHES = 2
+
+
+def manifest_path(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def read_manifest(output_path):
+    """
+    Returns:
+        dict: The manifest written for `output_path`, or None.
+    """
+    try:
+        with open(manifest_path(output_path), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(output_path, manifest):
+    """Writes the manifest next to the output, atomically."""
+    path = manifest_path(output_path)
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logging.error(f"Failed to write manifest {path}: {e}")
+
+
+def _is_candidate(path):
+    """Skips hidden, editor backup and partial-download files."""
+    name = os.path.basename(path)
+    if name.startswith(".") or name.endswith("~"):
+        return False
+    return name.lower().endswith(WATCHED_EXTENSIONS)
+
+
+def _signature(path):
+    """Returns (size, mtime_ns) of a regular file, or None."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_tree(root):
+    """Yields every candidate file below `root`."""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+        for name in files:
+            path = os.path.join(directory, name)
+            if _is_candidate(path):
+                yield path
+
+
+class _PollingMonitor:
+    """Reports every file of the watched trees once per interval."""
+
+    def __init__(self, roots, interval=POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+
+    def changes(self, cancel_token):
+        if cancel_token.wait(self.interval):
+            return []
+        return [path for root in self.roots for path in scan_tree(root)]
+
+    def close(self):
+        pass
+
+
+class _InotifyMonitor:
+    """
+    Reports files as the kernel announces them, so nothing is scanned while
+    the folders are idle. inotify is not recursive: every subdirectory gets
+    its own watch, including the ones created later.
+    """
+
+    def __init__(self, roots, timeout=1.0):
+        self.inotify = INotify()
+        self.mask = (
+            flags.CREATE
+            | flags.CLOSE_WRITE
+            | flags.MOVED_TO
+            | flags.DELETE_SELF
+            | flags.MOVE_SELF
+        )
+        self.timeout = timeout
+        self.roots = roots
+        self.directories = {}  # watch descriptor -> directory
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch_tree(self, root):
+        """Watches `root` and its subdirectories; returns the files already there."""
+        found = []
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+            try:
+                wd = self.inotify.add_watch(directory, self.mask)
+            except OSError as e:
+                logging.warning(f"Cannot watch {directory}: {e}")
+                continue
+            self.directories[wd] = directory
+            found += [os.path.join(directory, name) for name in files]
+        return [path for path in found if _is_candidate(path)]
+
+    def changes(self, cancel_token):
+        if cancel_token.is_cancelled():
+            return []
+        paths = []
+        for event in self.inotify.read(timeout=int(self.timeout * 1000)):
+            if event.mask & flags.Q_OVERFLOW:
+                logging.warning("inotify queue overflowed, rescanning")
+                paths += [path for root in self.roots for path in scan_tree(root)]
+                continue
+            if event.mask & (flags.DELETE_SELF | flags.MOVE_SELF | flags.IGNORED):
+                self.directories.pop(event.wd, None)
+                continue
+            directory = self.directories.get(event.wd)
+            if directory is None or not event.name:
+                continue
+            path = os.path.join(directory, event.name)
+            if event.mask & flags.ISDIR:
+                if not event.name.startswith("."):
+                    # Files may land in a new directory before it is watched
+                    paths += self._watch_tree(path)
+            elif _is_candidate(path):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        self.inotify.close()
+
+
+class WatchDaemon:
+    """
+    Renders every text file dropped into the watched folders, unattended.
+
+    Files are debounced until their size and mtime settle, so documents that
+    are still being written or copied are not picked up half-way. Settled
+    files are grouped into batches, and all chunk requests of all batches run
+    on one shared RenderScheduler, i.e. under one concurrency and rate budget.
+    Every output lands in a mirror of the input tree, next to a
+    `<output>.manifest.json` describing what was rendered from which source.
+
+    A file whose manifest matches its content and settings is not rendered
+    again, so the daemon can be restarted at any time; a file that changes is
+    rendered anew.
+    """
+
+    def __init__(
+        self,
+        roots,
+        output_root,
+        model="tts-1",
+        voice="alloy",
+        response_format="mp3",
+        speed=1.0,
+        normalize=False,
+        normalize_loudness=False,
+        insert_pauses=False,
+        settle=SETTLE_SECONDS,
+        batch_size=MAX_BATCH_DOCUMENTS,
+        max_batches=MAX_CONCURRENT_BATCHES,
+        use_inotify=None,
+        scheduler=None,
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.output_root = os.path.abspath(output_root)
+        self.settings = {
+            "model": model,
+            "voice": voice,
+            "format": response_format,
+            "speed": float(speed),
+            "normalize": normalize,
+            "normalize_loudness": normalize_loudness,
+            "insert_pauses": insert_pauses,
+        }
+        self.settle = settle
+        self.batch_size = batch_size
+        self.use_inotify = INotify is not None if use_inotify is None else use_inotify
+        self.cancel_token = CancelToken()
+        self.scheduler = scheduler or RenderScheduler(
+            requests_per_minute=REQUESTS_PER_MINUTE * max(len(key_pool), 1)
+        )
+        self.batches = ThreadPoolExecutor(
+            max_workers=max_batches, thread_name_prefix="watch-batch"
+        )
+        self.lock = threading.Lock()
+        self.pending = {}  # path -> (signature, time the signature was seen)
+        self.handled = {}  # path -> signature it was last queued with
+        self.in_flight = set()
+
+    def output_path(self, source):
+        """Mirrors `source` into the output tree, with the output extension."""
+        root = next(r for r in self.roots if os.path.commonpath([r, source]) == r)
+        relative = os.path.splitext(os.path.relpath(source, root))[0]
+        base = self.output_root
+        if len(self.roots) > 1:
+            base = os.path.join(base, os.path.basename(root))
+        return os.path.join(base, f"{relative}.{self.settings['format']}")
+
+    def _touch(self, path, now):
+        signature = _signature(path)
+        if signature is None or self.handled.get(path) == signature:
+            self.pending.pop(path, None)
+            return
+        previous = self.pending.get(path)
+        if previous is None or previous[0] != signature:
+            self.pending[path] = (signature, now)
+
+    def _settled(self, now):
+        """Returns the pending files that have not changed for `settle` seconds."""
+        ready = []
+        for path, (signature, seen) in list(self.pending.items()):
+            current = _signature(path)
+            if current is None:
+                del self.pending[path]
+            elif current != signature:
+                self.pending[path] = (current, now)
+            elif now - seen >= self.settle:
+                with self.lock:
+                    busy = path in self.in_flight
+                if not busy:
+                    ready.append(path)
+        return sorted(ready)
+
+    def run(self):
+        """Watches until stop() is called or the process is interrupted."""
+        for root in self.roots:
+            os.makedirs(root, exist_ok=True)
+        if self.use_inotify:
+            monitor = _InotifyMonitor(self.roots)
+        else:
+            monitor = _PollingMonitor(self.roots)
+        logging.info(
+            f"Watching {', '.join(self.roots)} with "
+            f"{'inotify' if self.use_inotify else 'polling'}, "
+            f"writing to {self.output_root}"
+        )
+        now = time.monotonic()
+        for root in self.roots:
+            for path in scan_tree(root):
+                self._touch(path, now)
+        try:
+            while not self.cancel_token.is_cancelled():
+                changed = monitor.changes(self.cancel_token)
+                now = time.monotonic()
+                for path in changed:
+                    self._touch(path, now)
+                ready = self._settled(now)
+                for start in range(0, len(ready), self.batch_size):
+                    self._queue_batch(ready[start : start + self.batch_size])
+        except KeyboardInterrupt:
+            logging.info("Watch interrupted")
+            self.cancel_token.cancel()
+        finally:
+            monitor.close()
+            self.batches.shutdown(wait=True, cancel_futures=True)
+            self.scheduler.shutdown(wait=False)
+
+    def stop(self):
+        """Stops watching and aborts the batches still running."""
+        self.cancel_token.cancel()
+
+    def _queue_batch(self, paths):
+        with self.lock:
+            self.in_flight.update(paths)
+        for path in paths:
+            self.handled[path] = self.pending.pop(path)[0]
+        logging.info(f"Queued a batch of {len(paths)} documents")
+        self.batches.submit(self._run_batch, paths)
+
+    def _run_batch(self, paths):
+        try:
+            render_documents(
+                [(path, self.output_path(path)) for path in paths],
+                self.settings,
+                self.scheduler,
+                self.cancel_token,
+            )
+        except Exception as e:
+            logging.exception(f"Batch failed: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.difference_update(paths)
+
+
+def _source_digest(text, settings):
+    digest = hashlib.sha256(text.encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _render_document(source, output, text, settings, scheduler, cancel_token):
+    """Returns (True if the output was written, seconds it took)."""
+    started = time.monotonic()
+    with log_context(job_id=os.path.basename(output)):
+        logging.info(f"Rendering {source}")
+        try:
+            ok = render_text(text, output, settings, scheduler, cancel_token, output)
+        except Exception as e:
+            logging.exception(f"Render of {source} failed: {e}")
+            ok = False
+    return ok, time.monotonic() - started
+
+
+def render_documents(documents, settings, scheduler, cancel_token=None):
+    """
+    Renders a batch of documents, each into its own output and manifest.
+
+    Every document goes through tts.render_text(), i.e. the pipeline of the
+    app, with its chunks queued on `scheduler` up front, so the batch keeps
+    the shared request budget busy. An interrupted document is resumed from
+    its journal.
+
+    Args:
+        documents (list of tuple): (source path, output path) pairs.
+        settings (dict): model, voice, format, speed and normalize, and
+            optionally normalize_loudness and insert_pauses.
+        scheduler (RenderScheduler): Shared pool the requests run on.
+        cancel_token (CancelToken, optional): Aborts the batch.
+
+    Returns:
+        dict: Output path -> "done", "skipped" or "failed".
+    """
+    cancel_token = cancel_token or CancelToken()
+    renders = []
+    results = {}
+    for source, output in documents:
+        try:
+            with open(source, "r", encoding="utf-8", errors="replace") as file:
+                text = file.read()
+        except OSError as e:
+            logging.error(f"Cannot read {source}: {e}")
+            results[output] = "failed"
+            continue
+        digest = _source_digest(text, settings)
+        manifest = read_manifest(output)
+        if (
+            manifest
+            and manifest.get("source_digest") == digest
+            and manifest.get("status") == "done"
+            and os.path.exists(output)
+        ):
+            logging.debug(f"{output} is up to date")
+            results[output] = "skipped"
+            continue
+        if settings["normalize"]:
+            text = normalize_text(text).text
+        text = text.strip()
+        if not text:
+            logging.info(f"Skipping empty document {source}")
+            results[output] = "skipped"
+            continue
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        manifest = {
+            "source": source,
+            "source_digest": digest,
+            "output": os.path.basename(output),
+            "model": settings["model"],
+            "voice": settings["voice"],
+            "format": settings["format"],
+            "speed": settings["speed"],
+            "normalized": settings["normalize"],
+            "loudness_normalized": settings.get("normalize_loudness", False),
+            "pauses": settings.get("insert_pauses", False),
+            "characters": len(text),
+        }
+        renders.append((source, output, text, manifest))
+
+    # Every document queues all of its chunks on the shared scheduler at once
+    # and is concatenated as soon as its own chunks are done
+    with ThreadPoolExecutor(
+        max_workers=max(len(renders), 1), thread_name_prefix="watch-document"
+    ) as pool:
+        futures = [
+            pool.submit(
+                _render_document,
+                source,
+                output,
+                text,
+                settings,
+                scheduler,
+                cancel_token,
+            )
+            for source, output, text, _ in renders
+        ]
+    for (source, output, _, manifest), future in zip(renders, futures):
+        ok, seconds = future.result()
+        if cancel_token.is_cancelled():
+            # No manifest: the render is resumed from its journal after a restart
+            continue
+        manifest["status"] = "done" if ok else "failed"
+        manifest["seconds"] = round(seconds, 3)
+        manifest["rendered_at"] = datetime.now(timezone.utc).isoformat(
+            timespec="seconds"
+        )
+        write_manifest(output, manifest)
+        results[output] = manifest["status"]
+        if ok:
+            logging.info(f"Rendered {output}")
+        else:
+            logging.error(f"Failed to render {source}")
+    return results
@@ -0,0 +1,181 @@
+import os
+import time
+import socket
+import logging
+import threading
+
+from job_store import JobStore, LEASE_SECONDS
+from tts import save_chunk
+from utils import split_text, concatenate_audio_files
+from log_setup import log_context
+
+# Seconds an idle worker waits before asking the store for work again
+POLL_INTERVAL = 2.0
+
+
+def default_worker_id():
+    """Returns an identifier that is unique across hosts and processes."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _keep_lease(store, task, worker_id, stop_event):
+    """Renews the lease of a task until stop_event is set."""
+    while not stop_event.wait(LEASE_SECONDS / 3):
+        if not store.heartbeat(task["job_id"], task["idx"], worker_id):
+            logging.warning(
+                f"Lost lease on task {task['job_id']}/{task['idx']}, another worker took over"
+            )
+            return
+
+
+def process_task(store, task, worker_id):
+    """
+    Renders one claimed task into its segment file on shared storage.
+
+    The audio is written to a temporary name and atomically renamed, so a
+    worker dying mid-download never leaves a partial segment behind.
+
+    Returns:
+        bool: True if the task was completed.
+    """
+    segment = os.path.join(
+        task["segment_dir"],
+        f"{task['job_id']}_{task['idx']:05d}.{task['response_format']}",
+    )
+    partial = f"{segment}.{worker_id.replace(':', '_')}.part"
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(
+        target=_keep_lease, args=(store, task, worker_id, stop_event), daemon=True
+    )
+    heartbeat.start()
+    try:
+        if not save_chunk(
+            task["text"],
+            partial,
+            task["model"],
+            task["voice"],
+            task["response_format"],
+            task["speed"],
+        ):
+            store.release_task(task["job_id"], task["idx"], worker_id)
+            return False
+        os.replace(partial, segment)
+        return store.complete_task(task["job_id"], task["idx"], worker_id, segment)
+    finally:
+        stop_event.set()
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def run_worker(store_path, worker_id=None, exit_when_idle=False):
+    """
+    Pulls chunk tasks from a shared job store until interrupted.
+
+    Args:
+        store_path (str): Path to the shared SQLite job store.
+        worker_id (str, optional): Identifier of this worker.
+        exit_when_idle (bool, optional): Return once no task is left to claim.
+    """
+    store = JobStore(store_path)
+    worker_id = worker_id or default_worker_id()
+    logging.info(f"Worker {worker_id} started on {store_path}")
+    task = None
+    try:
+        while True:
+            task = store.claim_task(worker_id)
+            if task is None:
+                if exit_when_idle:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            logging.debug(f"Worker {worker_id} claimed {task['job_id']}/{task['idx']}")
+            with log_context(job_id=task["job_id"], chunk_id=task["idx"]):
+                process_task(store, task, worker_id)
+            task = None
+    except KeyboardInterrupt:
+        if task is not None:
+            store.release_task(task["job_id"], task["idx"], worker_id)
+        logging.info(f"Worker {worker_id} stopped")
+
+
+def submit_job(store_path, text, output_path, model, voice, response_format, speed):
+    """
+    Splits a text and queues it as a distributed job.
+
+    Returns:
+        str: The job ID.
+
+    Raises:
+        ValueError: If the text is empty.
+    """
+    store = JobStore(store_path)
+    chunks = [chunk for chunk in split_text(text) if chunk.strip()]
+    return store.submit_job(chunks, output_path, model, voice, response_format, speed)
+
+
+def run_coordinator(store_path, job_id, poll_interval=POLL_INTERVAL):
+    """
+    Waits for every task of a job and concatenates the segments, which are
+    deleted once the output is written. An empty job, or one whose segments
+    cannot be joined, is marked failed.
+
+    Args:
+        store_path (str): Path to the shared SQLite job store.
+        job_id (str): The job to finish.
+        poll_interval (float, optional): Seconds between progress checks.
+
+    Returns:
+        bool: True if the final output was written.
+    """
+    store = JobStore(store_path)
+    job = store.get_job(job_id)
+    if job is None:
+        logging.error(f"Unknown job {job_id}")
+        return False
+
+    output = job["output_path"]
+    if job["status"] == "done" and os.path.exists(output):
+        logging.info(f"Job {job_id} already written to {output}")
+        return True
+
+    while True:
+        counts = store.job_progress(job_id)
+        total = sum(counts.values())
+        done = counts.get("done", 0)
+        if not total:
+            logging.error(f"Job {job_id} has no tasks")
+            store.set_job_status(job_id, "failed")
+            return False
+        if counts.get("failed") or store.get_job(job_id)["status"] == "failed":
+            logging.error(f"Job {job_id} failed")
+            return False
+        if done == total:
+            break
+        logging.debug(f"Job {job_id}: {done}/{total} tasks done")
+        time.sleep(poll_interval)
+
+    segments = store.segment_paths(job_id)
+    # A stale output must not pass for the result of a failed join
+    if os.path.exists(output):
+        os.remove(output)
+    concatenate_audio_files(segments, output)
+    if not os.path.exists(output):
+        logging.error(f"Job {job_id}: joining the segments into {output} failed")
+        store.set_job_status(job_id, "failed")
+        return False
+    store.set_job_status(job_id, "done")
+    _remove_segments(segments, job["segment_dir"])
+    logging.info(f"Job {job_id} written to {output}")
+    return True
+
+
+def _remove_segments(segments, segment_dir):
+    """Deletes the segments of a finished job, and their folder once empty."""
+    for segment in segments:
+        if os.path.exists(segment):
+            os.remove(segment)
+    try:
+        os.rmdir(segment_dir)
+    except OSError:
+        # Still shared with other jobs
+        pass